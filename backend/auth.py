@@ -0,0 +1,147 @@
+"""Password hashing, signed session tokens and the in-process user cache.
+
+Tokens are ``<payload>.<signature>`` where the payload is base64url JSON
+carrying the user id, role and expiry, and the signature is an HMAC-SHA256
+of the payload. They can be verified without touching the database.
+
+Passwords are stored as argon2id hashes. Hashing and verifying are
+deliberately slow and blocking, so callers run them in a worker pool.
+"""
+import base64
+import hashlib
+import hmac
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from argon2 import PasswordHasher
+from argon2.exceptions import InvalidHashError, VerificationError
+
+
+class InvalidToken(Exception):
+    pass
+
+
+password_hasher = PasswordHasher()
+
+# Verified against when the username doesn't exist, so a miss costs the same
+# as a wrong password
+_DUMMY_HASH = password_hasher.hash("not-a-real-password")
+
+
+def is_password_hash(stored: str) -> bool:
+    return stored.startswith("$argon2")
+
+
+def hash_password(password: str) -> str:
+    return password_hasher.hash(password)
+
+
+def verify_password(stored: Optional[str], password: str) -> Tuple[bool, bool]:
+    """Return (matches, needs_rehash) for a stored hash or legacy plaintext.
+
+    A missing stored value still performs a full verification.
+    """
+    if stored is None:
+        try:
+            password_hasher.verify(_DUMMY_HASH, password)
+        except VerificationError:
+            pass
+        return False, False
+
+    if not is_password_hash(stored):
+        # Stored before hashing was introduced; upgrade on successful login
+        return hmac.compare_digest(stored.encode(), password.encode()), True
+
+    try:
+        password_hasher.verify(stored, password)
+    except (VerificationError, InvalidHashError):
+        return False, False
+    return True, password_hasher.check_needs_rehash(stored)
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def sign_token(claims: Dict[str, Any], secret: str, ttl_seconds: int) -> str:
+    payload = dict(claims, exp=int(time.time()) + ttl_seconds)
+    encoded = _b64encode(json.dumps(payload, separators=(",", ":")).encode())
+    signature = hmac.new(secret.encode(), encoded.encode(), hashlib.sha256).digest()
+    return f"{encoded}.{_b64encode(signature)}"
+
+
+def verify_token(token: str, secret: str) -> Dict[str, Any]:
+    """Return the token's claims, raising InvalidToken if forged or expired."""
+    try:
+        encoded, signature = token.split(".")
+        expected = hmac.new(secret.encode(), encoded.encode(), hashlib.sha256).digest()
+        if not hmac.compare_digest(expected, _b64decode(signature)):
+            raise InvalidToken("Bad signature")
+        claims = json.loads(_b64decode(encoded))
+    except (ValueError, TypeError) as e:
+        raise InvalidToken(str(e))
+
+    if not isinstance(claims, dict) or "id" not in claims:
+        raise InvalidToken("Malformed claims")
+    if claims.get("exp", 0) < time.time():
+        raise InvalidToken("Token expired")
+    return claims
+
+
+class UserCache:
+    """Bounded LRU of user documents with a per-entry TTL.
+
+    The TTL only bounds staleness from writes made outside this process;
+    routes that modify a user call invalidate_employee() themselves.
+    """
+
+    def __init__(self, max_size: int = 10000, ttl_seconds: float = 300):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # user id -> (expires_at, user)
+        self._employee_ids = {}  # employee ID -> user id, for invalidate_employee()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, user_id: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        expires_at, user = entry
+        if expires_at < time.monotonic():
+            self._drop(user_id)
+            return None
+        self._entries.move_to_end(user_id)
+        return user
+
+    def put(self, user: Dict[str, Any]):
+        self._drop(user["id"])
+        self._entries[user["id"]] = (time.monotonic() + self.ttl_seconds, user)
+        if user.get("employee_id") is not None:
+            self._employee_ids[user["employee_id"]] = user["id"]
+        while len(self._entries) > self.max_size:
+            self._drop(next(iter(self._entries)))
+
+    def invalidate_employee(self, employee_id: str):
+        """Drop a user by employee ID, which is how the HR routes address them."""
+        user_id = self._employee_ids.get(employee_id)
+        if user_id is not None:
+            self._drop(user_id)
+
+    def clear(self):
+        self._entries.clear()
+        self._employee_ids.clear()
+
+    def _drop(self, user_id: str):
+        entry = self._entries.pop(user_id, None)
+        employee_id = entry[1].get("employee_id") if entry else None
+        # The ID may since have been cached for another user
+        if self._employee_ids.get(employee_id) == user_id:
+            del self._employee_ids[employee_id]
@@ -0,0 +1,126 @@
+"""Data versions, ETags and a small response cache for the read endpoints.
+
+Every write route bumps the version of the data scopes it touches. A read
+endpoint's ETag is a hash of the versions of the scopes it reads plus the
+request it answers, so it changes exactly when the response could.
+DataVersions live in this process only; the random epoch keeps ETags from
+a previous process (or another worker) from ever matching. With several
+workers, SharedDataVersions keeps the versions in step through Mongo.
+"""
+import asyncio
+import hashlib
+import uuid
+from collections import OrderedDict, defaultdict
+from typing import Any, Iterable, Optional, Set
+
+# Scopes bumped by the write routes
+SUBMISSIONS = "submissions"
+USERS = "users"
+SETTINGS = "settings"  # Leave quotas and regional calendars
+
+
+class DataVersions:
+    def __init__(self):
+        self.epoch = uuid.uuid4().hex
+        self._versions = defaultdict(int)
+
+    def bump(self, *scopes: str):
+        for scope in scopes:
+            self._versions[scope] += 1
+
+    def version(self, scope: str) -> int:
+        return self._versions[scope]
+
+    def etag(self, scopes: Iterable[str], *parts: Any) -> str:
+        key = "|".join(
+            [self.epoch]
+            + [f"{scope}={self._versions[scope]}" for scope in sorted(scopes)]
+            + [str(part) for part in parts]
+        )
+        return '"' + hashlib.sha256(key.encode()).hexdigest()[:32] + '"'
+
+
+# The shared versions are one document in the collection handed to SharedDataVersions
+VERSIONS_DOCUMENT_ID = "data_versions"
+
+
+class SharedDataVersions(DataVersions):
+    """DataVersions kept in step across worker processes through Mongo.
+
+    bump() applies locally at once and $inc's the shared counters in the
+    background; sync() adopts the shared counters, picking up other
+    workers' bumps. Until its own bumps are in the shared document a worker
+    tags with its process epoch, so its ETags can't collide with another
+    worker's for different data.
+    """
+
+    def __init__(self, collection):
+        super().__init__()
+        self.collection = collection
+        self.process_epoch = self.epoch
+        self._shared = {}
+        self._generation = 0
+        self._publishing = set()
+
+    def bump(self, *scopes: str):
+        super().bump(*scopes)
+        self.epoch = self.process_epoch
+        self._generation += 1
+        task = asyncio.get_running_loop().create_task(self.collection.update_one(
+            {"_id": VERSIONS_DOCUMENT_ID}, {"$inc": {scope: 1 for scope in scopes}}, upsert=True
+        ))
+        self._publishing.add(task)
+        task.add_done_callback(self._publishing.discard)
+
+    async def new_epoch(self):
+        """Start a new shared epoch, so ETags from before this start never match."""
+        await self.collection.update_one(
+            {"_id": VERSIONS_DOCUMENT_ID}, {"$set": {"epoch": uuid.uuid4().hex}}, upsert=True
+        )
+
+    async def sync(self) -> Set[str]:
+        """Adopt the shared versions; return the scopes changed since the last sync."""
+        generation = self._generation
+        if self._publishing:
+            await asyncio.gather(*self._publishing, return_exceptions=True)
+        document = await self.collection.find_one({"_id": VERSIONS_DOCUMENT_ID}) or {}
+        shared = {scope: value for scope, value in document.items() if scope not in ("_id", "epoch")}
+        changed = {scope for scope in shared.keys() | self._shared.keys()
+                   if shared.get(scope) != self._shared.get(scope)}
+        self._shared = shared
+        # Bumps made while we were reading aren't in the document yet
+        if "epoch" in document and self._generation == generation:
+            self._versions = defaultdict(int, shared)
+            self.epoch = document["epoch"]
+        return changed
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    # Weak comparison, as RFC 9110 requires for If-None-Match
+    return "*" in candidates or etag in [candidate.removeprefix("W/") for candidate in candidates]
+
+
+class ResponseCache:
+    """LRU of response bodies keyed by ETag; a new version simply misses."""
+
+    def __init__(self, max_size: int = 256):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, etag: str):
+        body = self._entries.get(etag)
+        if body is not None:
+            self._entries.move_to_end(etag)
+        return body
+
+    def put(self, etag: str, body: Any):
+        self._entries[etag] = body
+        self._entries.move_to_end(etag)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
@@ -0,0 +1,43 @@
+"""31-bit day masks for the date lists of a monthly submission.
+
+Every date in a submission lies in one month, so a set of dates fits in an
+int where bit (day - 1) is set for each day. Overlap is a bitwise AND and
+Mongo can match single days with $bitsAllSet.
+
+Day counts stay with the lists ($size and len()): Mongo aggregations have no
+popcount, and rollups kept incrementally in Python must agree with the ones
+rebuilt by aggregation.
+"""
+from typing import Iterable
+
+# Submission date list -> mask field stored alongside it
+MASK_FIELDS = {
+    "monthly_leave_dates": "monthly_leave_mask",
+    "optional_leave_dates": "optional_leave_mask",
+    "wfh_dates": "wfh_mask",
+    "total_days_off_dates": "total_days_off_mask",
+}
+
+
+def day_bit(day: int) -> int:
+    return 1 << (day - 1)
+
+
+def dates_to_mask(dates: Iterable[str], year: int, month: int) -> int:
+    """Mask of the YYYY-MM-DD dates that fall in year/month; others are ignored."""
+    prefix = f"{year:04d}-{month:02d}-"
+    mask = 0
+    for value in dates:
+        if value.startswith(prefix):
+            day = value[len(prefix):len(prefix) + 2]
+            if day.isdigit() and 1 <= int(day) <= 31:
+                mask |= day_bit(int(day))
+    return mask
+
+
+def submission_masks(submission) -> dict:
+    """Mask fields for a submission document or request; missing lists are empty."""
+    return {
+        mask_field: dates_to_mask(submission.get(dates_field) or [], submission["year"], submission["month"])
+        for dates_field, mask_field in MASK_FIELDS.items()
+    }
@@ -0,0 +1,86 @@
+"""In-process event bus and the Server-Sent Events stream for HR clients.
+
+Write routes publish on an ``EventBus``; every connected client has its own
+bounded queue. A client that falls that far behind is dropped rather than
+letting its queue grow; the browser reconnects and refetches.
+
+The bus only hears about writes made by its own process. With several
+workers, or writes from outside the API, ``watch_submissions`` feeds it from
+a Mongo change stream instead (this needs a replica set).
+"""
+import asyncio
+import itertools
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional
+
+import orjson
+
+# Comment lines keep proxies from closing an idle stream
+HEARTBEAT_SECONDS = 15
+# Tells EventSource how long to wait before reconnecting, in milliseconds
+RETRY_MS = 3000
+
+CHANGE_STREAM_ACTIONS = {"insert": "created", "update": "updated", "replace": "updated", "delete": "deleted"}
+
+
+class EventBus:
+    def __init__(self, max_queue: int = 100):
+        self.max_queue = max_queue
+        self._subscribers = set()
+        self._ids = itertools.count(1)
+
+    def __len__(self):
+        return len(self._subscribers)
+
+    def subscribe(self) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.max_queue)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self._subscribers.discard(queue)
+
+    def publish(self, event_type: str, data: Dict[str, Any]):
+        """Queue an event for every subscriber; never waits."""
+        event = (next(self._ids), event_type, data)
+        for queue in list(self._subscribers):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # Make room for the end-of-stream marker and forget the client
+                self._subscribers.discard(queue)
+                queue.get_nowait()
+                queue.put_nowait(None)
+
+
+def format_event(event_id: int, event_type: str, data: Dict[str, Any]) -> bytes:
+    return b"id: %d\nevent: %s\ndata: %s\n\n" % (event_id, event_type.encode(), orjson.dumps(data))
+
+
+async def event_stream(bus: EventBus, heartbeat_seconds: float = HEARTBEAT_SECONDS) -> AsyncIterator[bytes]:
+    """SSE body for one client; the subscription ends when the client goes away."""
+    queue = bus.subscribe()
+    try:
+        yield b"retry: %d\n\n" % RETRY_MS
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), heartbeat_seconds)
+            except asyncio.TimeoutError:
+                yield b": keepalive\n\n"
+                continue
+            if event is None:
+                return
+            yield format_event(*event)
+    finally:
+        bus.unsubscribe(queue)
+
+
+async def watch_submissions(collection, on_change: Callable[[str, Optional[Dict[str, Any]]], Awaitable[None]]):
+    """Call on_change(action, submission) for every change to the collection.
+
+    Deletes only name the removed document's _id, so they pass None.
+    """
+    async with collection.watch(full_document="updateLookup") as stream:
+        async for change in stream:
+            action = CHANGE_STREAM_ACTIONS.get(change["operationType"])
+            if action:
+                await on_change(action, change.get("fullDocument"))
@@ -0,0 +1,290 @@
+"""Incremental writers for the leave submissions export.
+
+Each writer is fed submissions one batch at a time and hands back encoded
+bytes as soon as they exist, so an export never holds more than a batch of
+rows in memory. All methods are blocking and meant to run in a worker thread.
+"""
+import csv
+import io
+import json
+import tempfile
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional
+
+from openpyxl import Workbook
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # The columnar formats are optional
+    pa = None
+
+# Spreadsheet columns, in order, and how each is read from a submission
+EXPORT_COLUMNS = [
+    ("Employee Name", lambda sub: sub["employee_name"]),
+    ("Employee ID", lambda sub: sub["employee_id"]),
+    ("Month", lambda sub: sub["month"]),
+    ("Year", lambda sub: sub["year"]),
+    ("Monthly Leave Dates", lambda sub: ", ".join(sub["monthly_leave_dates"])),
+    ("Optional Leave Dates", lambda sub: ", ".join(sub["optional_leave_dates"])),
+    ("Work From Home Dates", lambda sub: ", ".join(sub["wfh_dates"])),
+    ("Additional Hours", lambda sub: sub["additional_hours"]),
+    ("Pending Leaves", lambda sub: sub["pending_leaves"]),
+    ("Total Days Off", lambda sub: ", ".join(sub["total_days_off_dates"])),
+    ("Submitted At", lambda sub: sub["submitted_at"]),
+]
+EXPORT_HEADERS = [header for header, _ in EXPORT_COLUMNS]
+
+CHUNK_SIZE = 64 * 1024
+
+def export_row(submission: Dict[str, Any]) -> List[Any]:
+    return [read(submission) for _, read in EXPORT_COLUMNS]
+
+
+class CsvExportWriter:
+    media_type = "text/csv"
+    extension = "csv"
+
+    def __init__(self):
+        self._buffer = io.StringIO()
+        self._csv = csv.writer(self._buffer)
+        self._csv.writerow(EXPORT_HEADERS)
+
+    def _drain(self) -> bytes:
+        data = self._buffer.getvalue().encode("utf-8")
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        return data
+
+    def write_rows(self, submissions: List[Dict[str, Any]]) -> bytes:
+        self._csv.writerows(export_row(sub) for sub in submissions)
+        return self._drain()
+
+    def close(self):
+        pass
+
+    def read_chunk(self) -> bytes:
+        return self._drain()
+
+    def discard(self):
+        pass
+
+
+class NdjsonExportWriter:
+    """One raw submission document per line, for machine consumers."""
+    media_type = "application/x-ndjson"
+    extension = "ndjson"
+
+    def write_rows(self, submissions: List[Dict[str, Any]]) -> bytes:
+        return "".join(json.dumps(sub, default=str) + "\n" for sub in submissions).encode("utf-8")
+
+    def close(self):
+        pass
+
+    def read_chunk(self) -> bytes:
+        return b""
+
+    def discard(self):
+        pass
+
+
+class XlsxExportWriter:
+    """Write-only openpyxl workbook; rows go straight to openpyxl's temp files.
+
+    An xlsx is a zip archive, so nothing can be sent until close() has saved
+    it; read_chunk() then streams the saved file back.
+    """
+    media_type = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    extension = "xlsx"
+
+    def __init__(self):
+        self._workbook = Workbook(write_only=True)
+        self._sheet = self._workbook.create_sheet("Leave Submissions")
+        self._sheet.append(EXPORT_HEADERS)
+        self._file = None
+
+    def write_rows(self, submissions: List[Dict[str, Any]]) -> bytes:
+        for sub in submissions:
+            self._sheet.append(export_row(sub))
+        return b""
+
+    def close(self):
+        self._file = tempfile.TemporaryFile()
+        self._workbook.save(self._file)
+        self._file.seek(0)
+
+    def read_chunk(self) -> bytes:
+        if self._file is None:
+            return b""
+        chunk = self._file.read(CHUNK_SIZE)
+        if not chunk:
+            self.discard()
+        return chunk
+
+    def discard(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+# Columnar exports keep the date lists as list<date32> and carry the day
+# counts precomputed, so payroll and BI jobs don't re-derive them
+DATE_LIST_FIELDS = ("monthly_leave_dates", "optional_leave_dates", "wfh_dates", "total_days_off_dates")
+# Parquet row groups much smaller than this make readers slow
+PARQUET_ROW_GROUP_SIZE = 10_000
+
+
+def _parse_date(value: str) -> Optional[date]:
+    try:
+        return date.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _parse_timestamp(value: str) -> Optional[datetime]:
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+
+
+if pa is not None:
+    ARROW_SCHEMA = pa.schema([
+        ("id", pa.string()),
+        ("user_id", pa.string()),
+        ("employee_name", pa.string()),
+        ("employee_id", pa.string()),
+        ("department", pa.string()),
+        ("year", pa.int16()),
+        ("month", pa.int8()),
+        *[(field, pa.list_(pa.date32())) for field in DATE_LIST_FIELDS],
+        ("monthly_leave_days", pa.int16()),
+        ("optional_leave_days", pa.int16()),
+        ("wfh_days", pa.int16()),
+        ("total_days_off", pa.int16()),
+        ("leave_days", pa.int16()),  # monthly + optional + total days off, as in the rollups
+        ("additional_hours", pa.string()),
+        ("pending_leaves", pa.int32()),
+        ("submitted_at", pa.timestamp("us")),
+    ])
+
+
+def arrow_batch(submissions: List[Dict[str, Any]]):
+    """One record batch of ARROW_SCHEMA built column by column."""
+    columns = {
+        field: [sub.get(field) for sub in submissions]
+        for field in ("id", "user_id", "employee_name", "employee_id", "department",
+                      "year", "month", "additional_hours", "pending_leaves")
+    }
+    for field in DATE_LIST_FIELDS:
+        columns[field] = [[_parse_date(day) for day in sub.get(field) or []] for sub in submissions]
+    columns["monthly_leave_days"] = [len(days) for days in columns["monthly_leave_dates"]]
+    columns["optional_leave_days"] = [len(days) for days in columns["optional_leave_dates"]]
+    columns["wfh_days"] = [len(days) for days in columns["wfh_dates"]]
+    columns["total_days_off"] = [len(days) for days in columns["total_days_off_dates"]]
+    columns["leave_days"] = [
+        monthly + optional + off for monthly, optional, off in zip(
+            columns["monthly_leave_days"], columns["optional_leave_days"], columns["total_days_off"]
+        )
+    ]
+    columns["submitted_at"] = [_parse_timestamp(sub.get("submitted_at")) for sub in submissions]
+    return pa.record_batch(
+        [pa.array(columns[field.name], type=field.type) for field in ARROW_SCHEMA],
+        schema=ARROW_SCHEMA,
+    )
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that hands back whatever was written since the last drain."""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+class ArrowStreamExportWriter:
+    """Arrow IPC stream: every batch goes out as soon as it is written."""
+    media_type = "application/vnd.apache.arrow.stream"
+    extension = "arrows"
+
+    def __init__(self):
+        self._sink = _ChunkSink()
+        self._writer = pa.ipc.new_stream(self._sink, ARROW_SCHEMA)
+
+    def write_rows(self, submissions: List[Dict[str, Any]]) -> bytes:
+        self._writer.write_batch(arrow_batch(submissions))
+        return self._sink.drain()
+
+    def close(self):
+        self._writer.close()
+
+    def read_chunk(self) -> bytes:
+        return self._sink.drain()
+
+    def discard(self):
+        pass
+
+
+class ParquetExportWriter:
+    """Parquet, written a row group at a time.
+
+    Batches are held until they make up a row group, so memory stays bounded
+    by PARQUET_ROW_GROUP_SIZE rows; the footer follows on close().
+    """
+    media_type = "application/vnd.apache.parquet"
+    extension = "parquet"
+
+    def __init__(self):
+        self._sink = _ChunkSink()
+        self._writer = pq.ParquetWriter(self._sink, ARROW_SCHEMA, compression="zstd")
+        self._pending = []
+        self._pending_rows = 0
+
+    def _write_row_group(self):
+        if self._pending:
+            table = pa.Table.from_batches(self._pending)
+            self._writer.write_table(table, row_group_size=table.num_rows)
+            self._pending = []
+            self._pending_rows = 0
+
+    def write_rows(self, submissions: List[Dict[str, Any]]) -> bytes:
+        batch = arrow_batch(submissions)
+        self._pending.append(batch)
+        self._pending_rows += batch.num_rows
+        if self._pending_rows >= PARQUET_ROW_GROUP_SIZE:
+            self._write_row_group()
+        return self._sink.drain()
+
+    def close(self):
+        self._write_row_group()
+        self._writer.close()
+
+    def read_chunk(self) -> bytes:
+        return self._sink.drain()
+
+    def discard(self):
+        self._pending = []
+
+
+EXPORT_WRITERS = {
+    writer.extension: writer
+    for writer in (XlsxExportWriter, CsvExportWriter, NdjsonExportWriter)
+}
+if pa is not None:
+    EXPORT_WRITERS.update({writer.extension: writer for writer in (ParquetExportWriter, ArrowStreamExportWriter)})
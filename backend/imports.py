@@ -0,0 +1,95 @@
+"""Parsing and validation for the bulk employee import.
+
+Rows are numbered as a spreadsheet user sees them: the header is row 1 and
+the first employee is row 2. Everything here is blocking and meant to run
+in a worker thread.
+"""
+import csv
+import io
+from typing import Any, Dict, List, Tuple
+
+from openpyxl import load_workbook
+
+EMPLOYEE_IMPORT_COLUMNS = ("name", "username", "employee_id", "password", "department")
+REQUIRED_IMPORT_COLUMNS = ("name", "username", "employee_id", "password")
+
+
+class ImportFileError(ValueError):
+    """The upload as a whole cannot be read."""
+
+
+def _normalise_header(value: Any) -> str:
+    return str(value or "").strip().lower().replace(" ", "_")
+
+
+def _rows_from_csv(content: bytes) -> List[List[Any]]:
+    try:
+        text = content.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise ImportFileError("CSV file must be UTF-8 encoded")
+    return list(csv.reader(io.StringIO(text)))
+
+
+def _rows_from_xlsx(content: bytes) -> List[List[Any]]:
+    try:
+        workbook = load_workbook(io.BytesIO(content), read_only=True, data_only=True)
+    except Exception:
+        raise ImportFileError("Could not read XLSX file")
+    try:
+        return [list(row) for row in workbook.worksheets[0].iter_rows(values_only=True)]
+    finally:
+        workbook.close()
+
+
+def parse_employee_file(filename: str, content: bytes) -> List[Tuple[int, Dict[str, str]]]:
+    """Return (row number, employee fields) for every non-blank data row."""
+    extension = filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
+    if extension == "csv":
+        rows = _rows_from_csv(content)
+    elif extension == "xlsx":
+        rows = _rows_from_xlsx(content)
+    else:
+        raise ImportFileError("Only .csv and .xlsx files are supported")
+
+    if not rows:
+        raise ImportFileError("File is empty")
+
+    header = [_normalise_header(cell) for cell in rows[0]]
+    missing = [column for column in REQUIRED_IMPORT_COLUMNS if column not in header]
+    if missing:
+        raise ImportFileError(f"Missing columns: {', '.join(missing)}")
+
+    positions = {column: header.index(column) for column in EMPLOYEE_IMPORT_COLUMNS if column in header}
+    parsed = []
+    for row_number, row in enumerate(rows[1:], start=2):
+        values = {
+            column: str(row[position]).strip() if position < len(row) and row[position] is not None else ""
+            for column, position in positions.items()
+        }
+        if any(values.values()):
+            parsed.append((row_number, values))
+    return parsed
+
+
+def validate_employee_rows(rows: List[Tuple[int, Dict[str, str]]]):
+    """Split rows into valid ones and per-row errors, including in-file duplicates."""
+    valid, errors = [], []
+    seen_usernames, seen_employee_ids = {}, {}
+
+    for row_number, values in rows:
+        missing = [column for column in REQUIRED_IMPORT_COLUMNS if not values.get(column)]
+        if missing:
+            errors.append({"row": row_number, "error": f"Missing {', '.join(missing)}"})
+            continue
+        if values["username"] in seen_usernames:
+            errors.append({"row": row_number, "error": f"Duplicate username in file (row {seen_usernames[values['username']]})"})
+            continue
+        if values["employee_id"] in seen_employee_ids:
+            errors.append({"row": row_number, "error": f"Duplicate employee ID in file (row {seen_employee_ids[values['employee_id']]})"})
+            continue
+
+        seen_usernames[values["username"]] = row_number
+        seen_employee_ids[values["employee_id"]] = row_number
+        valid.append((row_number, values))
+
+    return valid, errors
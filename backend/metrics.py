@@ -0,0 +1,205 @@
+"""Prometheus metrics for HTTP requests and the Mongo driver.
+
+``PrometheusMiddleware`` times every request under its route template
+(``/api/leave-stats/{user_id}``, never the concrete path) so the label set
+stays bounded. The pymongo listeners are handed to the motor client through
+``event_listeners`` and run on the driver's worker threads; the
+prometheus_client metrics are thread-safe, so they record directly. With
+several workers (PROMETHEUS_MULTIPROC_DIR set) the gauges report the sum
+over the live processes.
+"""
+import contextvars
+import threading
+import time
+
+from prometheus_client import Counter, Gauge, Histogram
+from pymongo import monitoring
+from starlette.routing import Match
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency, until the last body chunk is sent",
+    ["method", "route", "status"],
+)
+HTTP_REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress",
+    "HTTP requests currently being handled",
+    ["method", "route"],
+    multiprocess_mode="livesum",
+)
+
+MONGO_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+MONGO_COMMAND_DURATION = Histogram(
+    "mongodb_command_duration_seconds",
+    "Mongo command round trips as reported by the driver",
+    ["command", "collection", "outcome"],
+    buckets=MONGO_BUCKETS,
+)
+
+MONGO_POOL_MAX_SIZE = Gauge(
+    "mongodb_pool_max_size",
+    "Configured maximum connections per server",
+    multiprocess_mode="livesum",
+)
+MONGO_POOL_CONNECTIONS = Gauge(
+    "mongodb_pool_connections",
+    "Open connections in the pool",
+    ["address"],
+    multiprocess_mode="livesum",
+)
+MONGO_POOL_CHECKED_OUT = Gauge(
+    "mongodb_pool_checked_out_connections",
+    "Connections currently checked out by an operation",
+    ["address"],
+    multiprocess_mode="livesum",
+)
+MONGO_POOL_CHECKOUT_WAIT = Histogram(
+    "mongodb_pool_checkout_wait_seconds",
+    "Time spent waiting for a pooled connection",
+    ["address"],
+    buckets=MONGO_BUCKETS,
+)
+MONGO_POOL_CHECKOUT_FAILURES = Counter(
+    "mongodb_pool_checkout_failures_total",
+    "Connection checkouts that failed",
+    ["address", "reason"],
+)
+MONGO_POOL_CLEARED = Counter(
+    "mongodb_pool_cleared_total",
+    "Times the pool was cleared after a network error or failover",
+    ["address"],
+)
+
+UNMATCHED_ROUTE = "<unmatched>"
+
+# "GET /api/hr/analytics" while a request is being handled. Motor copies the
+# context into its executor threads, so driver listeners can read it too.
+current_route = contextvars.ContextVar("current_route", default=None)
+
+
+def route_template(scope) -> str:
+    """The path template of the route that will handle ``scope``."""
+    partial = None
+    for route in scope["app"].router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+        if match == Match.PARTIAL and partial is None:
+            partial = route.path  # Path matched, method didn't: a 405
+    return partial or UNMATCHED_ROUTE
+
+
+class PrometheusMiddleware:
+    """Pure ASGI middleware, so streamed bodies are timed to the end."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        route = route_template(scope)
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        in_progress = HTTP_REQUESTS_IN_PROGRESS.labels(method, route)
+        in_progress.inc()
+        route_token = current_route.set(f"{method} {route}")
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_REQUEST_DURATION.labels(method, route, str(status)).observe(time.perf_counter() - started)
+            in_progress.dec()
+            current_route.reset(route_token)
+
+
+def command_collection(event) -> str:
+    target = event.command.get(event.command_name)
+    if isinstance(target, str):
+        return target
+    # getMore carries the cursor id under its own name
+    collection = event.command.get("collection")
+    return collection if isinstance(collection, str) else ""
+
+
+class CommandMetrics(monitoring.CommandListener):
+    def __init__(self):
+        # Only the started event carries the command document
+        self._collections = {}
+
+    def started(self, event):
+        self._collections[(event.request_id, event.connection_id)] = command_collection(event)
+
+    def succeeded(self, event):
+        self._observe(event, "success")
+
+    def failed(self, event):
+        self._observe(event, "failure")
+
+    def _observe(self, event, outcome):
+        collection = self._collections.pop((event.request_id, event.connection_id), "")
+        MONGO_COMMAND_DURATION.labels(event.command_name, collection, outcome).observe(
+            event.duration_micros / 1_000_000
+        )
+
+
+def _address(event) -> str:
+    host, port = event.address
+    return f"{host}:{port}"
+
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    def __init__(self):
+        # A checkout starts and finishes on the same driver thread
+        self._local = threading.local()
+
+    def pool_created(self, event):
+        MONGO_POOL_CONNECTIONS.labels(_address(event)).set(0)
+        MONGO_POOL_CHECKED_OUT.labels(_address(event)).set(0)
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        MONGO_POOL_CLEARED.labels(_address(event)).inc()
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        MONGO_POOL_CONNECTIONS.labels(_address(event)).inc()
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        MONGO_POOL_CONNECTIONS.labels(_address(event)).dec()
+
+    def connection_check_out_started(self, event):
+        self._local.started = time.perf_counter()
+
+    def connection_check_out_failed(self, event):
+        MONGO_POOL_CHECKOUT_FAILURES.labels(_address(event), str(event.reason)).inc()
+        self._observe_wait(event)
+
+    def connection_checked_out(self, event):
+        MONGO_POOL_CHECKED_OUT.labels(_address(event)).inc()
+        self._observe_wait(event)
+
+    def connection_checked_in(self, event):
+        MONGO_POOL_CHECKED_OUT.labels(_address(event)).dec()
+
+    def _observe_wait(self, event):
+        started = getattr(self._local, "started", None)
+        if started is not None:
+            MONGO_POOL_CHECKOUT_WAIT.labels(_address(event)).observe(time.perf_counter() - started)
+            self._local.started = None
@@ -0,0 +1,196 @@
+"""Opt-in request profiling and the slow-query log.
+
+A request carrying ``X-Profile: 1`` from an HR token is run under a
+pyinstrument sampling profiler in async mode, so time spent awaiting Mongo
+is attributed to the awaiting line. The response gets an ``X-Profile-Id``
+header. The session is saved to a Mongo collection, so any worker can
+render it on demand, as HTML or text.
+
+``SlowQueryLog`` is a pymongo command listener. It logs every command slower
+than its threshold together with the route that issued it (see
+``metrics.current_route``) and holds the entries until ``drain()`` hands
+them over to be saved for the HR endpoint.
+"""
+import asyncio
+import json
+import logging
+import uuid
+import zlib
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from pymongo import monitoring
+from pyinstrument import Profiler
+from pyinstrument.renderers import ConsoleRenderer, HTMLRenderer
+from pyinstrument.session import Session
+
+from metrics import command_collection, current_route
+
+logger = logging.getLogger("slow_queries")
+profile_logger = logging.getLogger("profiles")
+
+PROFILE_HEADER = b"x-profile"
+PROFILE_ID_HEADER = b"x-profile-id"
+PROFILE_INTERVAL = 0.001
+
+
+def _pack_session(session: Session) -> bytes:
+    return zlib.compress(json.dumps(session.to_json()).encode())
+
+
+def _render_session(packed: bytes, output: str) -> str:
+    session = Session.from_json(json.loads(zlib.decompress(packed)))
+    if output == "text":
+        return ConsoleRenderer(unicode=True, color=False, show_all=False).render(session)
+    return HTMLRenderer().render(session)
+
+
+class ProfileStore:
+    """Sessions in a Mongo collection, compressed, readable for ``ttl_seconds``.
+
+    The collection's TTL index on created_at deletes them for good.
+    """
+
+    def __init__(self, collection, ttl_seconds: float):
+        self.collection = collection
+        self.ttl_seconds = ttl_seconds
+
+    async def put(self, profile_id: str, session: Session):
+        packed = await asyncio.to_thread(_pack_session, session)
+        await self.collection.insert_one({"id": profile_id, "session": packed, "created_at": datetime.utcnow()})
+
+    async def render(self, profile_id: str, output: str = "html") -> Optional[str]:
+        profile = await self.collection.find_one(
+            {"id": profile_id, "created_at": {"$gt": datetime.utcnow() - timedelta(seconds=self.ttl_seconds)}},
+            {"_id": 0, "session": 1}
+        )
+        if profile is None:
+            return None
+        return await asyncio.to_thread(_render_session, profile["session"], output)
+
+
+def bearer_token(scope) -> Optional[str]:
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            return token if scheme.lower() == "bearer" else None
+    return None
+
+
+class ProfilingMiddleware:
+    """Profiles requests that ask for it when ``await authorize(token)`` allows.
+
+    ``authorize`` only sees the bearer token; the route still authenticates
+    the request as usual, and fetching the profile goes through the normal
+    HR checks.
+    """
+
+    def __init__(self, app, store: ProfileStore, authorize: Callable[[Optional[str]], Awaitable[bool]]):
+        self.app = app
+        self.store = store
+        self.authorize = authorize
+
+    async def wants_profile(self, scope) -> bool:
+        if scope["type"] != "http":
+            return False
+        requested = dict(scope["headers"]).get(PROFILE_HEADER, b"").lower()
+        if requested not in (b"1", b"true", b"yes"):
+            return False
+        return await self.authorize(bearer_token(scope))
+
+    async def __call__(self, scope, receive, send):
+        if not await self.wants_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = uuid.uuid4().hex
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(PROFILE_ID_HEADER, profile_id.encode())]
+            await send(message)
+
+        profiler = Profiler(interval=PROFILE_INTERVAL, async_mode="enabled")
+        profiler.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            session = profiler.stop()
+            try:
+                await self.store.put(profile_id, session)
+            except Exception as e:
+                # The response has gone out already; only the profile is lost
+                profile_logger.warning("saving profile %s failed: %s", profile_id, e)
+
+
+# Only these parts of a command are logged; documents being written can
+# carry password hashes and aren't what makes a command slow anyway
+LOGGED_COMMAND_FIELDS = ("filter", "sort", "pipeline", "hint", "limit")
+MAX_LOGGED_COMMAND = 1000
+
+
+def command_summary(command) -> str:
+    summary = {field: command[field] for field in LOGGED_COMMAND_FIELDS if field in command}
+    text = repr(summary)
+    return text if len(text) <= MAX_LOGGED_COMMAND else text[:MAX_LOGGED_COMMAND] + "..."
+
+
+class SlowQueryLog(monitoring.CommandListener):
+    """Slow commands, held until drained; at most ``max_entries`` wait at once.
+
+    Commands on ``ignored_collections`` aren't watched, so saving the log
+    doesn't feed it.
+    """
+
+    def __init__(self, threshold_ms: float, max_entries: int = 200, ignored_collections=()):
+        self.threshold_ms = threshold_ms
+        self.ignored_collections = set(ignored_collections)
+        self._pending = {}
+        self._unsaved = deque(maxlen=max_entries)
+
+    def started(self, event):
+        if command_collection(event) in self.ignored_collections:
+            return
+        self._pending[(event.request_id, event.connection_id)] = (
+            current_route.get(),
+            command_collection(event),
+            event.command,
+        )
+
+    def succeeded(self, event):
+        self._finish(event, "success")
+
+    def failed(self, event):
+        self._finish(event, "failure")
+
+    def _finish(self, event, outcome):
+        pending = self._pending.pop((event.request_id, event.connection_id), None)
+        duration_ms = event.duration_micros / 1000
+        if pending is None or duration_ms < self.threshold_ms:
+            return
+
+        route, collection, command = pending
+        entry = {
+            "at": datetime.utcnow(),
+            "route": route,
+            "command": event.command_name,
+            "collection": collection,
+            "duration_ms": round(duration_ms, 1),
+            "outcome": outcome,
+            "summary": command_summary(command),
+        }
+        self._unsaved.append(entry)
+        logger.warning(
+            "slow %s on %s took %.1fms (%s) route=%s %s",
+            event.command_name, collection, duration_ms, outcome, route or "-", entry["summary"]
+        )
+
+    def drain(self) -> List[Dict]:
+        """Take the entries logged since the last drain, oldest first."""
+        entries = []
+        while True:
+            try:
+                entries.append(self._unsaved.popleft())
+            except IndexError:
+                return entries
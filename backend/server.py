@@ -1,24 +1,88 @@
-from fastapi import FastAPI, HTTPException, Depends, Response
+from fastapi import FastAPI, HTTPException, Depends, Request, Response, Query, UploadFile, File
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from fastapi.responses import StreamingResponse
+from fastapi.responses import FileResponse, HTMLResponse, ORJSONResponse, PlainTextResponse, StreamingResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
 import os
-import motor.motor_asyncio
+import re
+from pymongo import IndexModel, ReplaceOne, UpdateOne, ReturnDocument, ASCENDING, DESCENDING
+from pymongo.errors import CollectionInvalid, DuplicateKeyError, OperationFailure
+from bson import ObjectId
+from bson.errors import InvalidId
 import uuid
 from datetime import datetime, timedelta
-import pandas as pd
-from io import BytesIO
 import json
+import base64
+import secrets
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 import calendar
+import socket
+import tempfile
+
+from auth import InvalidToken, UserCache, hash_password, sign_token, verify_password, verify_token
+from caching import SETTINGS, SUBMISSIONS, USERS, DataVersions, ResponseCache, SharedDataVersions, etag_matches
+from exports import EXPORT_WRITERS
+from imports import ImportFileError, parse_employee_file, validate_employee_rows
+from workcalendar import DEFAULT_WEEKMASK, month_calendar, valid_weekmask
+from daymask import MASK_FIELDS, submission_masks
+from events import EventBus, event_stream, watch_submissions
+from metrics import MONGO_POOL_MAX_SIZE, CommandMetrics, PoolMetrics, PrometheusMiddleware
+from profiling import ProfileStore, ProfilingMiddleware, SlowQueryLog
+from storage import (
+    LEAVE_DAYS_EXPR, STORAGE_BACKENDS, TREND_COUNTERS, array_size, create_client, month_range_filter, open_storage,
+    SEARCH_FIELDS, search_terms, trend_by_month,
+)
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, generate_latest, multiprocess
 
 # Database setup
+# STORAGE_BACKEND=memory keeps everything in process and is for tests and
+# local development only (see storage.py)
+STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'mongo')
+if STORAGE_BACKEND not in STORAGE_BACKENDS:
+    raise RuntimeError(f"STORAGE_BACKEND must be one of {', '.join(STORAGE_BACKENDS)}")
+# Worker processes `python server.py` starts; see Leader election
+WORKERS = int(os.environ.get('WORKERS', 1))
+if WORKERS > 1 and STORAGE_BACKEND == "memory":
+    raise RuntimeError("STORAGE_BACKEND=memory keeps data in each process; run a single worker")
 MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
-client = motor.motor_asyncio.AsyncIOMotorClient(MONGO_URL)
-db = client.leave_management
+DB_NAME = os.environ.get('DB_NAME', 'leave_management')
+# Commands slower than this are logged with the route that issued them and
+# saved to slow_queries every SLOW_QUERY_SAVE_SECONDS, so every worker's
+# entries show up in /api/hr/slow-queries
+SLOW_QUERY_SAVE_SECONDS = 5
+SLOW_QUERY_TTL_SECONDS = int(os.environ.get('SLOW_QUERY_TTL_SECONDS', 7 * 24 * 60 * 60))
+slow_query_log = SlowQueryLog(
+    threshold_ms=float(os.environ.get('SLOW_QUERY_MS', 100)), ignored_collections=["slow_queries"]
+)
+if STORAGE_BACKEND == "mongo":
+    client = create_client(
+        STORAGE_BACKEND, MONGO_URL, event_listeners=[CommandMetrics(), PoolMetrics(), slow_query_log]
+    )
+    MONGO_POOL_MAX_SIZE.set(client.options.pool_options.max_pool_size)
+else:
+    client = create_client(STORAGE_BACKEND, MONGO_URL)
+db = client[DB_NAME]
+# Routes read and write users and submissions through store.users and
+# store.submissions; the other collections are used through db directly
+store = open_storage(STORAGE_BACKEND, db)
+
+def use_database(database, backend: str = STORAGE_BACKEND):
+    """Point the app at another database; tests and the benchmark use this."""
+    global db, store
+    db = database
+    store = open_storage(backend, database)
+    profile_store.collection = database.profiles
+    if isinstance(data_versions, SharedDataVersions):
+        data_versions.collection = database.data_versions
 
-app = FastAPI(title="Leave Management System")
+# orjson for every route; routes that return an ORJSONResponse themselves also
+# skip FastAPI's jsonable_encoder pass, which plain Mongo dicts don't need
+app = FastAPI(title="Leave Management System", default_response_class=ORJSONResponse)
 
 # CORS middleware
 app.add_middleware(
@@ -29,8 +93,81 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Response compression: brotli when the client accepts it and brotli-asgi is
+# installed, gzip otherwise. Small bodies aren't worth the CPU. Event streams
+# are left alone: the compressors buffer, and each event must go out at once.
+COMPRESSION_MINIMUM_SIZE = int(os.environ.get('COMPRESSION_MINIMUM_SIZE', 1024))
+UNCOMPRESSED_PATHS = [r"^/api/hr/events$"]
+try:
+    from brotli_asgi import BrotliMiddleware
+    app.add_middleware(
+        BrotliMiddleware, quality=4, minimum_size=COMPRESSION_MINIMUM_SIZE, gzip_fallback=True,
+        excluded_handlers=UNCOMPRESSED_PATHS
+    )
+except ImportError:
+    class SelectiveGZipMiddleware(GZipMiddleware):
+        async def __call__(self, scope, receive, send):
+            if scope["type"] == "http" and any(re.search(path, scope["path"]) for path in UNCOMPRESSED_PATHS):
+                await self.app(scope, receive, send)
+                return
+            await super().__call__(scope, receive, send)
+    
+    app.add_middleware(SelectiveGZipMiddleware, minimum_size=COMPRESSION_MINIMUM_SIZE)
+
 security = HTTPBearer()
 
+# Tokens signed with a per-process random secret stop verifying on restart,
+# so deployments are expected to set TOKEN_SECRET. `python server.py` hands
+# its workers one secret either way.
+TOKEN_SECRET = os.environ.get('TOKEN_SECRET') or secrets.token_urlsafe(32)
+TOKEN_TTL_SECONDS = int(os.environ.get('TOKEN_TTL_SECONDS', 12 * 60 * 60))
+# argon2 runs in C with the GIL released, so a thread pool gives real
+# parallelism while keeping the event loop free during a login storm
+password_pool = ThreadPoolExecutor(
+    max_workers=int(os.environ.get('PASSWORD_HASH_WORKERS', os.cpu_count() or 1)),
+    thread_name_prefix="password"
+)
+
+# Bulk imports hash thousands of passwords; they get a smaller pool of their
+# own so logins never queue behind them
+import_password_pool = ThreadPoolExecutor(
+    max_workers=int(os.environ.get('IMPORT_HASH_WORKERS', max(1, (os.cpu_count() or 1) // 2))),
+    thread_name_prefix="import-password"
+)
+
+async def run_password_task(func, *args, pool: ThreadPoolExecutor = password_pool):
+    return await asyncio.get_running_loop().run_in_executor(pool, func, *args)
+
+# Scrapers send this as a bearer token; unset leaves /api/metrics open
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+user_cache = UserCache(
+    max_size=int(os.environ.get('USER_CACHE_SIZE', 10000)),
+    ttl_seconds=float(os.environ.get('USER_CACHE_TTL_SECONDS', 300)),
+)
+
+# HR users can send X-Profile: 1 to have a request profiled; the response's
+# X-Profile-Id names the profile to fetch from /api/hr/profiles. Profiles are
+# kept in Mongo, so any worker can serve them.
+PROFILE_TTL_SECONDS = int(os.environ.get('PROFILE_TTL_SECONDS', 60 * 60))
+profile_store = ProfileStore(db.profiles, ttl_seconds=PROFILE_TTL_SECONDS)
+
+async def can_profile(token: Optional[str]) -> bool:
+    if not token:
+        return False
+    try:
+        claims = verify_token(token, TOKEN_SECRET)
+    except InvalidToken:
+        return False
+    # The role comes from the user record, as in get_current_user, not from the token
+    user = await load_user(claims["id"])
+    return bool(user) and user.get("active", True) and user["role"] == "hr"
+
+app.add_middleware(ProfilingMiddleware, store=profile_store, authorize=can_profile)
+
+# Outermost, so request timings include compression and streamed bodies
+app.add_middleware(PrometheusMiddleware)
+
 # Pydantic models
 class User(BaseModel):
     id: str
@@ -41,6 +178,8 @@ class User(BaseModel):
     role: str  # 'employee' or 'hr'
     department: Optional[str] = None
     active: bool = True
+    optional_leave_quota: Optional[int] = None  # Overrides the department/default quota
+    region: Optional[str] = None  # Working-day calendar; DEFAULT_REGION when unset
 
 class CreateEmployeeRequest(BaseModel):
     name: str
@@ -48,6 +187,8 @@ class CreateEmployeeRequest(BaseModel):
     employee_id: str
     password: str
     department: Optional[str] = None
+    optional_leave_quota: Optional[int] = None
+    region: Optional[str] = None
 
 class CreateHRRequest(BaseModel):
     name: str
@@ -62,6 +203,25 @@ class UpdateEmployeeRequest(BaseModel):
     password: Optional[str] = None
     department: Optional[str] = None
     active: Optional[bool] = None
+    optional_leave_quota: Optional[int] = None
+    region: Optional[str] = None
+
+class DepartmentQuotaRequest(BaseModel):
+    optional_leave_quota: int
+
+class Holiday(BaseModel):
+    date: str  # YYYY-MM-DD
+    name: str = ""
+
+class CalendarRegionRequest(BaseModel):
+    weekmask: str = DEFAULT_WEEKMASK  # Monday first, 1 = working day
+    holidays: List[Holiday] = []
+
+class ExportJobRequest(BaseModel):
+    format: str = "xlsx"
+    month: Optional[int] = None
+    year: Optional[int] = None
+    department: Optional[str] = None
 
 class LoginRequest(BaseModel):
     username: str  # Changed from employee_id to username
@@ -81,6 +241,13 @@ class LeaveSubmission(BaseModel):
     pending_leaves: int
     total_days_off_dates: List[str]
     submitted_at: str
+    department: Optional[str] = None
+    region: Optional[str] = None  # The submitter's calendar region when they submitted
+    # Day masks of the date lists above, bit (day - 1) set per date
+    monthly_leave_mask: int = 0
+    optional_leave_mask: int = 0
+    wfh_mask: int = 0
+    total_days_off_mask: int = 0
 
 class LeaveSubmissionRequest(BaseModel):
     month: int
@@ -93,23 +260,676 @@ class LeaveSubmissionRequest(BaseModel):
     total_days_off_dates: List[str]
 
 # Authentication dependency
+async def load_user(user_id: str) -> Optional[Dict[str, Any]]:
+    user = user_cache.get(user_id)
+    if user is None:
+        user = await store.users.get(user_id)
+        if user:
+            user_cache.put(user)
+    return user
+
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    token = credentials.credentials
     try:
-        # In a real app, you'd verify JWT tokens. For MVP, we'll use simple session-like approach
-        user_data = json.loads(token)
-        user = await db.users.find_one({"id": user_data["id"]})
-        if not user:
-            raise HTTPException(status_code=401, detail="Invalid token")
-        return user
-    except:
+        claims = verify_token(credentials.credentials, TOKEN_SECRET)
+    except InvalidToken:
         raise HTTPException(status_code=401, detail="Invalid token")
+    
+    user = await load_user(claims["id"])
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    
+    # Revoked users are rejected even though their token is still validly signed
+    if not user.get("active", True):
+        raise HTTPException(status_code=401, detail="Account is deactivated")
+    return user
+
+# Index management
+# Every query in the routes below is expected to be served by one of these
+# indexes. ensure_indexes() creates what is missing, rebuilds indexes whose
+# definition changed and reports anything present in Mongo but not declared here.
+INDEX_SPECS = {
+    "users": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("username", ASCENDING)], name="username_unique", unique=True),
+        IndexModel([("employee_id", ASCENDING)], name="employee_id_unique", unique=True),
+        IndexModel([("role", ASCENDING), ("active", ASCENDING)], name="role_active"),
+        # HR employee list: keyset pages in employee ID order, optionally per department
+        IndexModel([("role", ASCENDING), ("employee_id", ASCENDING)], name="role_employee_id"),
+        IndexModel(
+            [("role", ASCENDING), ("department", ASCENDING), ("employee_id", ASCENDING)],
+            name="role_department_employee_id"
+        ),
+        # Multikey; anchored prefix searches become index range scans
+        IndexModel([("search_terms", ASCENDING)], name="search_terms"),
+    ],
+    "leave_submissions": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel(
+            [("user_id", ASCENDING), ("year", ASCENDING), ("month", ASCENDING)],
+            name="user_year_month_unique",
+            unique=True,
+        ),
+        # _id is the keyset tie-breaker for the paginated submission lists
+        IndexModel([("year", ASCENDING), ("month", ASCENDING), ("_id", ASCENDING)], name="year_month_id"),
+        IndexModel([("employee_id", ASCENDING)], name="employee_id"),
+    ],
+    "department_settings": [
+        IndexModel([("department", ASCENDING)], name="department_unique", unique=True),
+    ],
+    "calendar_regions": [
+        IndexModel([("region", ASCENDING)], name="region_unique", unique=True),
+    ],
+    "monthly_rollups": [
+        # region joined the key later; the name is kept so the index is rebuilt in place
+        IndexModel(
+            [("year", ASCENDING), ("month", ASCENDING), ("department", ASCENDING), ("region", ASCENDING)],
+            name="year_month_department_unique",
+            unique=True,
+        ),
+    ],
+    # Only what the export, analytics and delete paths need for archived months
+    "leave_submissions_archive": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel(
+            [("user_id", ASCENDING), ("year", ASCENDING), ("month", ASCENDING)],
+            name="user_year_month_unique",
+            unique=True,
+        ),
+        IndexModel([("year", ASCENDING), ("month", ASCENDING), ("_id", ASCENDING)], name="year_month_id"),
+        IndexModel([("employee_id", ASCENDING)], name="employee_id"),
+    ],
+    "archived_months": [
+        IndexModel([("year", ASCENDING), ("month", ASCENDING)], name="year_month_unique", unique=True),
+    ],
+    "export_jobs": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        # Workers claim the oldest queued job
+        IndexModel([("status", ASCENDING), ("created_at", ASCENDING)], name="status_created"),
+        IndexModel([("created_by", ASCENDING), ("created_at", DESCENDING)], name="created_by_created"),
+        IndexModel([("expires_at", ASCENDING)], name="expires_at"),
+    ],
+    "import_jobs": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+    "profiles": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("created_at", ASCENDING)], name="created_at_ttl", expireAfterSeconds=PROFILE_TTL_SECONDS),
+    ],
+    # Newest first for the HR endpoint; Mongo deletes entries past their TTL
+    "slow_queries": [
+        IndexModel([("at", ASCENDING)], name="at_ttl", expireAfterSeconds=SLOW_QUERY_TTL_SECONDS),
+    ],
+}
+
+# Index options that change query semantics; anything else (v, ns, ...) is ignored
+# when comparing a declared index against the one found in Mongo.
+INDEX_COMPARED_OPTIONS = ("unique", "sparse", "partialFilterExpression", "expireAfterSeconds")
+
+def _index_signature(spec: Dict[str, Any]):
+    key = [(field, direction) for field, direction in spec["key"].items()] \
+        if isinstance(spec["key"], dict) else [tuple(k) for k in spec["key"]]
+    options = {opt: spec[opt] for opt in INDEX_COMPARED_OPTIONS if spec.get(opt)}
+    return key, options
+
+# Mongo refuses a second index on an existing key pattern with these codes
+INDEX_CONFLICT_CODES = (85, 86)  # IndexOptionsConflict, IndexKeySpecsConflict
+
+async def _find_unique_violation(collection, wanted: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """A key value shared by several documents that a unique build would reject, if any."""
+    keys = list(wanted["key"])
+    pipeline = []
+    if wanted.get("partialFilterExpression"):
+        pipeline.append({"$match": wanted["partialFilterExpression"]})
+    elif wanted.get("sparse"):
+        pipeline.append({"$match": {"$or": [{key: {"$exists": True}} for key in keys]}})
+    pipeline += [
+        {"$group": {"_id": {key.replace(".", "_"): f"${key}" for key in keys}, "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}},
+        {"$limit": 1},
+    ]
+    duplicates = await collection.aggregate(pipeline).to_list(length=1)
+    return duplicates[0]["_id"] if duplicates else None
+
+async def _rebuild_index(collection, model: IndexModel):
+    """Replace a changed index; any failure leaves the old one in place.
+
+    When the key pattern changed, the new index is first built under a
+    temporary name and covers queries while the old one is swapped out.
+    Mongo won't build a second index on the same keys, so an options-only
+    change is checked for unique violations up front instead.
+    """
+    wanted = model.document
+    name = wanted["name"]
+    if wanted.get("unique"):
+        duplicate = await _find_unique_violation(collection, wanted)
+        if duplicate is not None:
+            raise OperationFailure(f"Duplicate key {duplicate} blocks unique index {name}")
+    
+    options = {option: value for option, value in wanted.items() if option not in ("key", "name")}
+    temporary = IndexModel(list(wanted["key"].items()), name=f"{name}_rebuild", **options)
+    try:
+        await collection.create_indexes([temporary])
+    except OperationFailure as e:
+        if e.code not in INDEX_CONFLICT_CODES:
+            raise
+        temporary = None
+    await collection.drop_index(name)
+    await collection.create_indexes([model])
+    if temporary:
+        await collection.drop_index(temporary.document["name"])
+
+async def ensure_indexes(database, apply: bool = True) -> Dict[str, Any]:
+    """Reconcile INDEX_SPECS against the database and return a drift report.
+
+    With apply=False nothing is changed and the report only lists what would be.
+    """
+    report = {"missing": [], "changed": [], "undeclared": [], "errors": []}
+
+    for collection_name, models in INDEX_SPECS.items():
+        collection = database[collection_name]
+        existing = await collection.index_information()
+
+        for model in models:
+            wanted = model.document
+            name = wanted["name"]
+            qualified = f"{collection_name}.{name}"
+            try:
+                if name not in existing:
+                    report["missing"].append(qualified)
+                    if apply:
+                        await collection.create_indexes([model])
+                elif _index_signature(existing[name]) != _index_signature(wanted):
+                    report["changed"].append(qualified)
+                    if apply:
+                        await _rebuild_index(collection, model)
+            except OperationFailure as e:
+                # Most likely existing duplicates blocking a unique index; keep
+                # serving and surface it instead of failing startup.
+                report["errors"].append({"index": qualified, "error": str(e)})
+
+        declared = {model.document["name"] for model in models}
+        for name in existing:
+            if name != "_id_" and name not in declared:
+                report["undeclared"].append(f"{collection_name}.{name}")
+
+    return report
+
+# Submission list pagination
+# Lists are ordered newest month first (SUBMISSION_SORT) with _id as tie-breaker so
+# every document has a unique position; the cursor carries the sort key of the last row served.
+# Archived months are listed only with include_archived=true.
+SUBMISSION_PAGE_SIZE = 100
+MAX_SUBMISSION_PAGE_SIZE = 500
+SUBMISSION_FIELDS = set(LeaveSubmission.model_fields) | {"calculated_total_days_off"}
+# Always returned so rows stay identifiable and the cursor can be built
+SUBMISSION_KEY_FIELDS = ("id", "year", "month")
+
+def encode_cursor(submission: Dict[str, Any]) -> str:
+    payload = json.dumps([submission["year"], submission["month"], str(submission["_id"])])
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+def decode_cursor(cursor: str):
+    try:
+        year, month, object_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return int(year), int(month), ObjectId(object_id)
+    except (ValueError, TypeError, InvalidId):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def submission_projection(fields: Optional[str]) -> Optional[Dict[str, int]]:
+    if not fields:
+        return None
+    requested = {field.strip() for field in fields.split(",") if field.strip()}
+    unknown = requested - SUBMISSION_FIELDS
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+    return {field: 1 for field in requested.union(SUBMISSION_KEY_FIELDS)}
+
+async def fetch_submission_page(filter_query: Dict[str, Any], limit: int, cursor: Optional[str], fields: Optional[str],
+                                include_archived: bool = False):
+    projection = submission_projection(fields)
+    after = decode_cursor(cursor) if cursor else None
+    
+    # One extra row tells us whether another page exists
+    submissions = await store.submissions.page(filter_query, limit + 1, after, projection, include_archived)
+    next_cursor = encode_cursor(submissions[limit - 1]) if len(submissions) > limit else None
+    submissions = submissions[:limit]
+    for submission in submissions:
+        submission.pop("_id", None)  # Remove MongoDB ObjectId
+    
+    return {"submissions": submissions, "next_cursor": next_cursor}
+
+# Monthly rollups
+# monthly_rollups holds one document per (year, month, department, region)
+# with the counters HR analytics needs; region is the submitter's calendar
+# region, so working days can be counted per region. Write routes keep it
+# current with $inc deltas; rebuild_rollups() recomputes it from
+# leave_submissions when it drifts. A delta landing between the rebuild's
+# aggregation and its writes would be lost or counted twice, so the rebuild
+# holds the rollups lock and write routes refuse the months it covers.
+ROLLUP_COUNTERS = ("submissions", "leave_days", "optional_leave_days", "wfh_days")
+ROLLUP_LOCK = "rollups"
+ROLLUP_LOCK_TTL_SECONDS = 60
+# Writes that checked the lock just before it was taken finish within this
+ROLLUP_REBUILD_SETTLE_SECONDS = float(os.environ.get('ROLLUP_REBUILD_SETTLE_SECONDS', 2))
+
+def rollup_counts(submission: Dict[str, Any]) -> Dict[str, int]:
+    return {
+        "submissions": 1,
+        "leave_days": len(submission.get("monthly_leave_dates", []))
+            + len(submission.get("optional_leave_dates", []))
+            + len(submission.get("total_days_off_dates", [])),
+        "optional_leave_days": len(submission.get("optional_leave_dates", [])),
+        "wfh_days": len(submission.get("wfh_dates", [])),
+    }
+
+# Submission fields a rollup is keyed by, besides year and month, stamped
+# from the submitter's user record when they submit
+ROLLUP_USER_FIELDS = ("department", "region")
+
+def rollup_key(submission: Dict[str, Any]) -> tuple:
+    return submission["year"], submission["month"], submission.get("department"), submission.get("region")
+
+def rollup_updates(removed: List[Dict[str, Any]] = (), added: List[Dict[str, Any]] = ()) -> List[UpdateOne]:
+    """Net $inc updates for submissions leaving and entering the rollups."""
+    deltas = {}
+    for submissions, sign in ((removed, -1), (added, 1)):
+        for submission in submissions:
+            counters = deltas.setdefault(rollup_key(submission), dict.fromkeys(ROLLUP_COUNTERS, 0))
+            for name, value in rollup_counts(submission).items():
+                counters[name] += sign * value
+    
+    return [
+        UpdateOne(
+            {"year": year, "month": month, "department": department, "region": region},
+            {"$inc": counters},
+            upsert=True,
+        )
+        for (year, month, department, region), counters in deltas.items()
+        if any(counters.values())
+    ]
+
+async def apply_rollup_updates(database, removed=(), added=()):
+    updates = rollup_updates(removed, added)
+    if updates:
+        await database.monthly_rollups.bulk_write(updates, ordered=False)
+
+async def check_rollups_writable(year: Optional[int] = None, month: Optional[int] = None):
+    """Refuse a write that would move rollups a running rebuild covers; None matches any month."""
+    lock = await db.locks.find_one(
+        {"_id": ROLLUP_LOCK, "expires_at": {"$gt": datetime.utcnow()}}, {"year": 1, "month": 1}
+    )
+    if lock and all(
+        scope is None or wanted is None or scope == wanted
+        for scope, wanted in ((lock.get("year"), year), (lock.get("month"), month))
+    ):
+        raise HTTPException(
+            status_code=503, detail="Monthly totals are being rebuilt; try again shortly",
+            headers={"Retry-After": str(ROLLUP_LOCK_TTL_SECONDS // 6)}
+        )
+
+async def rebuild_rollups(database, year: Optional[int] = None, month: Optional[int] = None) -> int:
+    """Recompute rollups from leave_submissions and the archive for everything or one year/month.
+    
+    Holds the rollups lock, which stops write routes for the months it
+    covers, for the whole rebuild.
+    """
+    owner = f"{WORKER_ID}:{uuid.uuid4().hex[:8]}"
+    while not await acquire_lock(database, ROLLUP_LOCK, owner, ROLLUP_LOCK_TTL_SECONDS, year=year, month=month):
+        await asyncio.sleep(STARTUP_LOCK_POLL_SECONDS)
+    renewal = asyncio.create_task(keep_lock(database, ROLLUP_LOCK, owner, ROLLUP_LOCK_TTL_SECONDS))
+    try:
+        await asyncio.sleep(ROLLUP_REBUILD_SETTLE_SECONDS)
+        return await recompute_rollups(database, year, month)
+    finally:
+        renewal.cancel()
+        await release_lock(database, ROLLUP_LOCK, owner)
+
+async def recompute_rollups(database, year: Optional[int], month: Optional[int]) -> int:
+    match = {}
+    if year:
+        match["year"] = year
+    if month:
+        match["month"] = month
+    
+    merged = {}
+    for collection in (database.leave_submissions, database.leave_submissions_archive):
+        # Submissions from before department or region was recorded get the user's current one
+        for field in ROLLUP_USER_FIELDS:
+            missing = {**match, field: {"$exists": False}}
+            user_ids = await collection.distinct("user_id", missing)
+            async for user in database.users.find({"id": {"$in": user_ids}}, {"id": 1, field: 1}):
+                await collection.update_many(
+                    {**missing, "user_id": user["id"]},
+                    {"$set": {field: user.get(field)}}
+                )
+        
+        async for group in collection.aggregate([
+            {"$match": match},
+            {"$group": {
+                "_id": {
+                    "year": "$year",
+                    "month": "$month",
+                    **{field: {"$ifNull": [f"${field}", None]} for field in ROLLUP_USER_FIELDS},
+                },
+                "submissions": {"$sum": 1},
+                "leave_days": {"$sum": LEAVE_DAYS_EXPR},
+                "optional_leave_days": {"$sum": array_size("optional_leave_dates")},
+                "wfh_days": {"$sum": array_size("wfh_dates")},
+            }},
+        ]):
+            key = group.pop("_id")
+            rollup = merged.setdefault(
+                (key["year"], key["month"], key["department"], key["region"]),
+                {**key, **{name: 0 for name in ROLLUP_COUNTERS}}
+            )
+            for name in ROLLUP_COUNTERS:
+                rollup[name] += group[name]
+    
+    # Each rollup is replaced in place, so readers never see the months empty
+    rollups = list(merged.values())
+    key_fields = {"year": 1, "month": 1, **{field: 1 for field in ROLLUP_USER_FIELDS}}
+    stale = [
+        rollup["_id"] async for rollup in database.monthly_rollups.find(match, key_fields)
+        if rollup_key(rollup) not in merged
+    ]
+    if rollups:
+        await database.monthly_rollups.bulk_write([
+            ReplaceOne(
+                {"year": rollup["year"], "month": rollup["month"], "department": rollup["department"],
+                 "region": rollup["region"]},
+                rollup,
+                upsert=True
+            )
+            for rollup in rollups
+        ], ordered=False)
+    if stale:
+        await database.monthly_rollups.delete_many({"_id": {"$in": stale}})
+    return len(rollups)
+
+# Archive
+# Past months can be moved out of leave_submissions into
+# leave_submissions_archive, a collection created with stronger block
+# compression. archived_months records which months live there, so the
+# export and analytics paths, and the submission lists when asked, know
+# when to read the archive as well.
+# Rollups cover archived months too and are left untouched.
+# The in-memory backend has no storage engine options
+ARCHIVE_COMPRESSOR = os.environ.get('ARCHIVE_COMPRESSOR', 'zstd' if STORAGE_BACKEND == "mongo" else '')
+ARCHIVE_BATCH_SIZE = int(os.environ.get('ARCHIVE_BATCH_SIZE', 500))
+# Pause between batches so archiving doesn't starve the live query paths
+ARCHIVE_BATCH_PAUSE_SECONDS = float(os.environ.get('ARCHIVE_BATCH_PAUSE_SECONDS', 0.1))
+
+async def ensure_archive_collection(database):
+    """Create the archive collection with its compressor before anything else can."""
+    if "leave_submissions_archive" in await database.list_collection_names():
+        return
+    options = {}
+    if ARCHIVE_COMPRESSOR:
+        options["storageEngine"] = {"wiredTiger": {"configString": f"block_compressor={ARCHIVE_COMPRESSOR}"}}
+    try:
+        await database.create_collection("leave_submissions_archive", **options)
+    except CollectionInvalid:
+        pass  # Created concurrently
+
+async def move_month(source, target, year: int, month: int, batch_size: int, pause: float) -> int:
+    moved = 0
+    while True:
+        batch = await source.find({"year": year, "month": month}) \
+            .sort("_id", ASCENDING).limit(batch_size).to_list(length=batch_size)
+        if not batch:
+            return moved
+        
+        # Copy by _id first, so a rerun after an interruption picks up where it stopped
+        await target.bulk_write(
+            [ReplaceOne({"_id": submission["_id"]}, submission, upsert=True) for submission in batch],
+            ordered=False
+        )
+        await source.delete_many({"_id": {"$in": [submission["_id"] for submission in batch]}})
+        moved += len(batch)
+        await asyncio.sleep(pause)
+
+async def archive_month(database, year: int, month: int) -> int:
+    # Marked first: submits to the month stop and readers include the archive
+    await database.archived_months.update_one(
+        {"year": year, "month": month},
+        {"$set": {"status": "archiving", "started_at": datetime.utcnow()}},
+        upsert=True
+    )
+    await ensure_archive_collection(database)
+    moved = await move_month(
+        database.leave_submissions, database.leave_submissions_archive, year, month,
+        ARCHIVE_BATCH_SIZE, ARCHIVE_BATCH_PAUSE_SECONDS
+    )
+    await database.archived_months.update_one(
+        {"year": year, "month": month},
+        {"$set": {
+            "status": "archived",
+            "archived_at": datetime.utcnow(),
+            "submissions": await database.leave_submissions_archive.count_documents({"year": year, "month": month}),
+        }}
+    )
+    return moved
+
+async def restore_month(database, year: int, month: int) -> int:
+    await database.archived_months.update_one(
+        {"year": year, "month": month}, {"$set": {"status": "restoring"}}
+    )
+    moved = await move_month(
+        database.leave_submissions_archive, database.leave_submissions, year, month,
+        ARCHIVE_BATCH_SIZE, ARCHIVE_BATCH_PAUSE_SECONDS
+    )
+    await database.archived_months.delete_one({"year": year, "month": month})
+    return moved
+
+# Working-day calendar
+# Each region has a weekmask and a holiday list in calendar_regions. Region
+# settings are cached briefly per process; the day counts themselves are
+# memoised in workcalendar.
+DEFAULT_REGION = os.environ.get('DEFAULT_REGION', 'default')
+REGION_CACHE_TTL_SECONDS = 60
+region_settings_cache = {}  # region -> (loaded_at, weekmask, holiday dates)
+
+async def region_settings(region: str):
+    cached = region_settings_cache.get(region)
+    if cached and time.monotonic() - cached[0] < REGION_CACHE_TTL_SECONDS:
+        return cached[1], cached[2]
+    
+    settings = await db.calendar_regions.find_one({"region": region}, {"_id": 0}) or {}
+    weekmask = settings.get("weekmask", DEFAULT_WEEKMASK)
+    holidays = [holiday["date"] for holiday in settings.get("holidays", [])]
+    region_settings_cache[region] = (time.monotonic(), weekmask, holidays)
+    return weekmask, holidays
+
+async def working_calendar(year: int, month: int, region: Optional[str] = None):
+    weekmask, holidays = await region_settings(region or DEFAULT_REGION)
+    return month_calendar(year, month, weekmask, holidays)
+
+async def rollup_working_days(year: int, month: int, rollups: List[Dict[str, Any]]) -> int:
+    """Working days owed by the submitters in a month's rollups, each on their region's calendar."""
+    total = 0
+    for rollup in rollups:
+        total += (await working_calendar(year, month, rollup.get("region"))).working_days * rollup["submissions"]
+    return total
+
+# Conditional GET
+# Write routes bump data_versions for the scopes they change; read routes
+# answer If-None-Match with 304 while their scopes are unchanged, and the
+# hottest views also keep the rendered body in response_cache. With several
+# workers the versions are shared through Mongo and synced every
+# DATA_VERSION_SYNC_SECONDS, which bounds how long another worker's write
+# can go unnoticed.
+DATA_VERSION_SYNC_SECONDS = float(os.environ.get('DATA_VERSION_SYNC_SECONDS', 1))
+data_versions = SharedDataVersions(db.data_versions) if WORKERS > 1 else DataVersions()
+data_version_tasks = []
+response_cache = ResponseCache(max_size=int(os.environ.get('RESPONSE_CACHE_SIZE', 256)))
+
+async def conditional_get(request: Request, scopes: List[str], viewer: str, compute, cache: bool = False,
+                          parts: tuple = ()):
+    """Return 304, a cached body or compute() depending on the request's ETag.
+
+    viewer identifies whose view this is: the role for HR-wide data, the user
+    id for personal data. parts carries anything else the body depends on
+    that the query string doesn't pin down, such as defaults taken from today.
+    """
+    etag = data_versions.etag(scopes, request.url.path, request.url.query, viewer, *parts)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    
+    body = response_cache.get(etag) if cache else None
+    if body is None:
+        body = await compute()
+        if cache:
+            response_cache.put(etag, body)
+    return ORJSONResponse(body, headers=headers)
+
+async def sync_data_versions():
+    while True:
+        await asyncio.sleep(DATA_VERSION_SYNC_SECONDS)
+        try:
+            changed = await data_versions.sync()
+        except Exception as e:
+            print(f"Syncing data versions failed: {e}")
+            continue
+        # Another worker changed users or settings this process may have cached
+        if USERS in changed:
+            user_cache.clear()
+        if SETTINGS in changed:
+            region_settings_cache.clear()
+
+async def start_data_version_sync():
+    if isinstance(data_versions, SharedDataVersions):
+        await data_versions.sync()
+        data_version_tasks.append(asyncio.create_task(sync_data_versions()))
+
+# Slow-query log
+monitoring_tasks = []
+
+async def save_slow_queries(database) -> int:
+    entries = slow_query_log.drain()
+    if entries:
+        await database.slow_queries.insert_many(entries)
+    return len(entries)
+
+async def keep_saving_slow_queries():
+    while True:
+        await asyncio.sleep(SLOW_QUERY_SAVE_SECONDS)
+        try:
+            await save_slow_queries(db)
+        except Exception as e:
+            print(f"Saving slow queries failed: {e}")
+
+# Day mask migration
+async def backfill_day_masks(database, batch_size: int = 1000) -> int:
+    """Add day masks to submissions stored before they existed."""
+    projection = {"year": 1, "month": 1, **{field: 1 for field in MASK_FIELDS}}
+    cursor = database.leave_submissions.find({"wfh_mask": {"$exists": False}}, projection).batch_size(batch_size)
+    updated = 0
+    while True:
+        batch = await cursor.to_list(length=batch_size)
+        if not batch:
+            break
+        await database.leave_submissions.bulk_write([
+            UpdateOne({"_id": submission["_id"]}, {"$set": submission_masks(submission)})
+            for submission in batch
+        ], ordered=False)
+        updated += len(batch)
+    return updated
+
+# Search terms migration
+async def backfill_search_terms(database, batch_size: int = 1000) -> int:
+    """Add search_terms to users stored before employee search existed."""
+    projection = {field: 1 for field in SEARCH_FIELDS}
+    cursor = database.users.find({"search_terms": {"$exists": False}}, projection).batch_size(batch_size)
+    updated = 0
+    while True:
+        batch = await cursor.to_list(length=batch_size)
+        if not batch:
+            break
+        await database.users.bulk_write([
+            UpdateOne({"_id": user["_id"]}, {"$set": {"search_terms": search_terms(user)}})
+            for user in batch
+        ], ordered=False)
+        updated += len(batch)
+    return updated
+
+# Leader election
+# Workers started together take turns holding the startup lock, a document in
+# the locks collection. The first runs the migrations and seeding and records
+# its startup round; the rest find the round done and skip straight to
+# serving. `python server.py` gives the workers it starts one round; a
+# process started any other way is a round of its own, so it runs the
+# (idempotent) startup tasks itself.
+STARTUP_LOCK = "startup"
+STARTUP_LOCK_TTL_SECONDS = 60
+STARTUP_LOCK_POLL_SECONDS = 0.5
+STARTUP_ROUND = os.environ.get('STARTUP_ROUND') or uuid.uuid4().hex
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+async def acquire_lock(database, name: str, owner: str, ttl_seconds: float, **fields) -> bool:
+    """Take (or extend) the lock unless another owner holds an unexpired one; fields are stored on it."""
+    now = datetime.utcnow()
+    try:
+        await database.locks.update_one(
+            {"_id": name, "$or": [{"owner": owner}, {"expires_at": {"$lte": now}}]},
+            {"$set": {"owner": owner, "expires_at": now + timedelta(seconds=ttl_seconds), **fields}},
+            upsert=True
+        )
+        return True
+    except DuplicateKeyError:
+        # The lock exists and the filter didn't match it: someone else holds it
+        return False
+
+async def release_lock(database, name: str, owner: str, **fields):
+    await database.locks.update_one(
+        {"_id": name, "owner": owner},
+        {"$set": {"expires_at": datetime.utcnow(), **fields}}
+    )
+
+async def keep_lock(database, name: str, owner: str, ttl_seconds: float):
+    """Renew a held lock until cancelled, so long migrations don't lose it."""
+    while True:
+        await asyncio.sleep(ttl_seconds / 3)
+        if not await acquire_lock(database, name, owner, ttl_seconds):
+            print(f"Lost the {name} lock")
+            return
 
 # Initialize sample data
-@app.on_event("startup")
-async def startup_event():
+async def run_startup_tasks():
+    """Migrations and seeding; safe to run again or from several processes."""
+    if STORAGE_BACKEND == "memory":
+        print("STORAGE_BACKEND=memory is for tests and local development only: "
+              "queries scan whole collections on the event loop and data is lost on restart")
+    await ensure_archive_collection(db)
+    index_report = await ensure_indexes(db)
+    if index_report["missing"]:
+        print(f"Indexes created: {', '.join(index_report['missing'])}")
+    if index_report["changed"]:
+        print(f"Indexes rebuilt: {', '.join(index_report['changed'])}")
+    if index_report["undeclared"]:
+        print(f"Undeclared indexes found: {', '.join(index_report['undeclared'])}")
+    for error in index_report["errors"]:
+        print(f"Index {error['index']} could not be built: {error['error']}")
+    
+    backfilled = await backfill_day_masks(db)
+    if backfilled:
+        print(f"Day masks added to {backfilled} submissions")
+    backfilled = await backfill_search_terms(db)
+    if backfilled:
+        print(f"Search terms added to {backfilled} users")
+    
+    # First start after rollups were introduced, or after they were split by
+    # region: derive them from the submissions, stamping the missing regions
+    unrolled = await db.monthly_rollups.estimated_document_count() == 0 \
+        and await db.leave_submissions.estimated_document_count() > 0
+    if unrolled or await db.leave_submissions.find_one({"region": {"$exists": False}}, {"_id": 1}) \
+            or await db.leave_submissions_archive.find_one({"region": {"$exists": False}}, {"_id": 1}):
+        rebuilt = await rebuild_rollups(db)
+        print(f"Monthly rollups rebuilt: {rebuilt} documents")
+
     # Check if HR user already exists
-    existing_hr = await db.users.count_documents({"role": "hr"})
+    existing_hr = await store.users.count_hr()
     if existing_hr == 0:
         # Create only the HR admin user
         hr_user = {
@@ -117,19 +937,61 @@ async def startup_event():
             "name": "HR Admin",
             "username": "tejasartificial",  # Username for login
             "employee_id": "HR001",  # Separate employee ID
-            "password": "Tejas#2377",
+            "password": await run_password_task(hash_password, "Tejas#2377"),
             "role": "hr",
             "department": "Human Resources",
             "active": True
         }
-        await db.users.insert_one(hr_user)
-        print("HR admin user created successfully!")
+        try:
+            await store.users.insert(hr_user)
+            print("HR admin user created successfully!")
+        except DuplicateKeyError:
+            pass  # Created concurrently
     else:
         # Update existing HR users to have username field if they don't
-        await db.users.update_many(
-            {"role": "hr", "username": {"$exists": False}},
-            {"$set": {"username": "tejasartificial"}}
-        )
+        await store.users.backfill_hr_usernames("tejasartificial")
+    
+    if isinstance(data_versions, SharedDataVersions):
+        await data_versions.new_epoch()
+
+@app.on_event("startup")
+async def startup_event():
+    while not await acquire_lock(db, STARTUP_LOCK, WORKER_ID, STARTUP_LOCK_TTL_SECONDS):
+        await asyncio.sleep(STARTUP_LOCK_POLL_SECONDS)
+    renewal = asyncio.create_task(keep_lock(db, STARTUP_LOCK, WORKER_ID, STARTUP_LOCK_TTL_SECONDS))
+    completed = {}
+    try:
+        lock = await db.locks.find_one({"_id": STARTUP_LOCK}, {"round": 1})
+        if lock.get("round") != STARTUP_ROUND:
+            await run_startup_tasks()
+        completed = {"round": STARTUP_ROUND}
+    finally:
+        renewal.cancel()
+        # A failed start leaves the round open for the next worker to retry
+        await release_lock(db, STARTUP_LOCK, WORKER_ID, **completed)
+    
+    await start_data_version_sync()
+    monitoring_tasks.append(asyncio.create_task(keep_saving_slow_queries()))
+    start_export_workers()
+    if EVENT_SOURCE == "changestream":
+        event_tasks.append(asyncio.create_task(follow_submission_changes()))
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await stop_export_workers()
+    # An import cut off here is reported as interrupted once its heartbeat goes stale
+    for tasks in (data_version_tasks, event_tasks, monitoring_tasks, import_job_tasks):
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        tasks.clear()
+    try:
+        await save_slow_queries(db)
+    except Exception as e:
+        print(f"Saving slow queries failed: {e}")
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        multiprocess.mark_process_dead(os.getpid())
 
 # Routes
 @app.get("/api/")
@@ -138,24 +1000,24 @@ async def root():
 
 @app.post("/api/login")
 async def login(request: LoginRequest):
-    user = await db.users.find_one({
-        "username": request.username,  # Changed to use username
-        "password": request.password,
-        "active": True  # Only allow active users to login
-    })
+    # Only active users can log in
+    user = await store.users.get_active_by_username(request.username)
     
-    if not user:
+    matches, needs_rehash = await run_password_task(
+        verify_password, user["password"] if user else None, request.password
+    )
+    if not user or not matches:
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
-    # Create a simple token (in production, use proper JWT)
-    token = json.dumps({
-        "id": user["id"],
-        "name": user["name"],
-        "username": user["username"],  # Include username in token
-        "employee_id": user["employee_id"],
-        "role": user["role"],
-        "department": user.get("department")
-    })
+    if needs_rehash:
+        # Transparent migration of plaintext (or outdated) passwords; the
+        # filter skips it if the password changed since we read it
+        new_hash = await run_password_task(hash_password, request.password)
+        await store.users.replace_password(user["id"], user["password"], new_hash)
+        user["password"] = new_hash
+    
+    user_cache.put(user)
+    token = sign_token({"id": user["id"], "role": user["role"]}, TOKEN_SECRET, TOKEN_TTL_SECONDS)
     
     return {
         "token": token,
@@ -177,23 +1039,30 @@ async def submit_leave(request: LeaveSubmissionRequest, current_user: dict = Dep
     if not current_user.get("active", True):
         raise HTTPException(status_code=403, detail="Account is deactivated")
     
+    masks = submission_masks(request.model_dump())
+    if masks["monthly_leave_mask"] & masks["optional_leave_mask"]:
+        raise HTTPException(status_code=400, detail="A date cannot be both monthly and optional leave")
+    if (masks["monthly_leave_mask"] | masks["optional_leave_mask"]) & masks["wfh_mask"]:
+        raise HTTPException(status_code=400, detail="A date cannot be both leave and work from home")
+    
+    if await store.submissions.is_archived(request.year, request.month):
+        raise HTTPException(status_code=409, detail="This month has been archived and can no longer be changed")
+    await check_rollups_writable(request.year, request.month)
+    
     # Calculate total days off as sum of monthly leaves and optional leaves
     calculated_total_days_off = len(request.monthly_leave_dates) + len(request.optional_leave_dates)
     
-    # Check if submission already exists for this month/year
-    existing = await db.leave_submissions.find_one({
+    submission_key = {
         "user_id": current_user["id"],
         "month": request.month,
         "year": request.year
-    })
-    
+    }
     submission_data = {
-        "id": str(uuid.uuid4()),
-        "user_id": current_user["id"],
+        **submission_key,
         "employee_name": current_user["name"],
         "employee_id": current_user["employee_id"],
-        "month": request.month,
-        "year": request.year,
+        "department": current_user.get("department"),
+        "region": current_user.get("region"),
         "monthly_leave_dates": request.monthly_leave_dates,
         "optional_leave_dates": request.optional_leave_dates,
         "wfh_dates": request.wfh_dates,
@@ -201,27 +1070,35 @@ async def submit_leave(request: LeaveSubmissionRequest, current_user: dict = Dep
         "pending_leaves": request.pending_leaves,
         "total_days_off_dates": request.total_days_off_dates,
         "calculated_total_days_off": calculated_total_days_off,  # Auto-calculated field
+        **masks,
         "submitted_at": datetime.now().isoformat()
     }
+    new_id = str(uuid.uuid4())
     
-    if existing:
-        # Update existing submission
-        await db.leave_submissions.update_one(
-            {"_id": existing["_id"]},
-            {"$set": submission_data}
-        )
-        message = "Leave submission updated successfully"
-    else:
-        # Create new submission
-        await db.leave_submissions.insert_one(submission_data)
-        message = "Leave submission created successfully"
+    # The replaced submission tells us whether it was created and what to
+    # take out of the rollups
+    existing = await store.submissions.upsert_month(submission_key, submission_data, new_id)
     
-    # Remove MongoDB _id field before returning
-    submission_data.pop("_id", None)
-    return {"message": message, "submission": submission_data}
+    submission_data["id"] = existing["id"] if existing else new_id
+    message = "Leave submission updated successfully" if existing else "Leave submission created successfully"
+    
+    await apply_rollup_updates(db, removed=[existing] if existing else [], added=[submission_data])
+    data_versions.bump(SUBMISSIONS)
+    await notify_submissions("updated" if existing else "created", [submission_data])
+    
+    return {"message": message, "created": existing is None, "submission": submission_data}
 
 @app.get("/api/my-submissions")
-async def get_my_submissions(month: Optional[int] = None, year: Optional[int] = None, current_user: dict = Depends(get_current_user)):
+async def get_my_submissions(
+    request: Request,
+    month: Optional[int] = None,
+    year: Optional[int] = None,
+    limit: int = Query(SUBMISSION_PAGE_SIZE, ge=1, le=MAX_SUBMISSION_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    include_archived: bool = False,
+    current_user: dict = Depends(get_current_user)
+):
     if current_user["role"] != "employee":
         raise HTTPException(status_code=403, detail="Only employees can view their submissions")
     
@@ -231,15 +1108,22 @@ async def get_my_submissions(month: Optional[int] = None, year: Optional[int] =
     if year:
         filter_query["year"] = year
     
-    submissions = []
-    async for submission in db.leave_submissions.find(filter_query).sort("year", -1).sort("month", -1):
-        submission.pop("_id", None)  # Remove MongoDB ObjectId
-        submissions.append(submission)
-    
-    return {"submissions": submissions}
+    return await conditional_get(
+        request, [SUBMISSIONS], current_user["id"],
+        lambda: fetch_submission_page(filter_query, limit, cursor, fields, include_archived)
+    )
 
 @app.get("/api/all-submissions")
-async def get_all_submissions(month: Optional[int] = None, year: Optional[int] = None, current_user: dict = Depends(get_current_user)):
+async def get_all_submissions(
+    request: Request,
+    month: Optional[int] = None,
+    year: Optional[int] = None,
+    limit: int = Query(SUBMISSION_PAGE_SIZE, ge=1, le=MAX_SUBMISSION_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    include_archived: bool = False,
+    current_user: dict = Depends(get_current_user)
+):
     if current_user["role"] != "hr":
         raise HTTPException(status_code=403, detail="Only HR can view all submissions")
     
@@ -249,171 +1133,586 @@ async def get_all_submissions(month: Optional[int] = None, year: Optional[int] =
     if year:
         filter_query["year"] = year
     
-    submissions = []
-    async for submission in db.leave_submissions.find(filter_query).sort("year", -1).sort("month", -1):
-        submission.pop("_id", None)  # Remove MongoDB ObjectId
-        submissions.append(submission)
-    
-    return {"submissions": submissions}
+    return await conditional_get(
+        request, [SUBMISSIONS], current_user["role"],
+        lambda: fetch_submission_page(filter_query, limit, cursor, fields, include_archived),
+        cache=True
+    )
 
 @app.delete("/api/delete-submission/{submission_id}")
 async def delete_submission(submission_id: str, current_user: dict = Depends(get_current_user)):
     if current_user["role"] != "hr":
         raise HTTPException(status_code=403, detail="Only HR can delete submissions")
     
-    result = await db.leave_submissions.delete_one({"id": submission_id})
+    await check_rollups_writable()
+    deleted = await store.submissions.delete(submission_id)
     
-    if result.deleted_count == 0:
+    if not deleted:
         raise HTTPException(status_code=404, detail="Submission not found")
     
+    await apply_rollup_updates(db, removed=[deleted])
+    data_versions.bump(SUBMISSIONS)
+    await notify_submissions("deleted", [deleted])
+    
     return {"message": "Submission deleted successfully"}
 
-@app.get("/api/export-excel")
-async def export_excel(month: Optional[int] = None, year: Optional[int] = None, current_user: dict = Depends(get_current_user)):
+# Live updates
+# HR clients keep /api/hr/events open and get a "submission" event, with the
+# month's new totals, whenever a submission is created, updated or deleted.
+# EVENT_SOURCE=routes publishes from the write routes, which only reach
+# clients of the same process; EVENT_SOURCE=changestream follows
+# leave_submissions instead, for several workers or outside writers. The
+# default is routes for one worker and changestream for several.
+EVENT_SOURCE = os.environ.get('EVENT_SOURCE', 'changestream' if WORKERS > 1 else 'routes')
+if EVENT_SOURCE not in ("routes", "changestream"):
+    raise RuntimeError("EVENT_SOURCE must be routes or changestream")
+if WORKERS > 1 and EVENT_SOURCE == "routes":
+    raise RuntimeError("EVENT_SOURCE=routes misses writes handled by other workers; use changestream")
+EVENT_STREAM_RETRY_SECONDS = 5
+event_bus = EventBus(max_queue=int(os.environ.get('EVENT_QUEUE_SIZE', 100)))
+event_tasks = []
+
+# Submission fields sent to clients; the day masks are internal
+EVENT_SUBMISSION_FIELDS = SUBMISSION_FIELDS - set(MASK_FIELDS.values())
+
+async def month_totals(year: int, month: int) -> Dict[str, int]:
+    rollups = await db.monthly_rollups.find({"year": year, "month": month}, {"_id": 0}).to_list(length=None)
+    return {
+        "year": year,
+        "month": month,
+        "employees_submitted": sum(rollup["submissions"] for rollup in rollups),
+        "total_leave_days": sum(rollup["leave_days"] for rollup in rollups),
+        "total_wfh_days": sum(rollup["wfh_days"] for rollup in rollups),
+    }
+
+async def publish_submission_events(action: str, submissions: List[Dict[str, Any]]):
+    if not len(event_bus):
+        return
+    totals = {}
+    for submission in submissions:
+        key = (submission["year"], submission["month"])
+        if key not in totals:
+            totals[key] = await month_totals(*key)
+        event_bus.publish("submission", {
+            "action": action,
+            "submission": {field: value for field, value in submission.items() if field in EVENT_SUBMISSION_FIELDS},
+            "totals": totals[key],
+        })
+
+async def notify_submissions(action: str, submissions: List[Dict[str, Any]]):
+    # A change stream reports the route's writes itself
+    if EVENT_SOURCE == "routes":
+        await publish_submission_events(action, submissions)
+
+async def on_submission_change(action: str, submission: Optional[Dict[str, Any]]):
+    if submission:
+        await publish_submission_events(action, [submission])
+    elif len(event_bus):
+        event_bus.publish("submission", {"action": action, "submission": None, "totals": None})
+
+async def follow_submission_changes():
+    while True:
+        try:
+            await watch_submissions(db.leave_submissions, on_submission_change)
+        except Exception as e:
+            print(f"Submission change stream failed: {e}")
+        await asyncio.sleep(EVENT_STREAM_RETRY_SECONDS)
+
+@app.get("/api/hr/events")
+async def hr_events(current_user: dict = Depends(get_current_user)):
     if current_user["role"] != "hr":
-        raise HTTPException(status_code=403, detail="Only HR can export data")
+        raise HTTPException(status_code=403, detail="Only HR can follow live updates")
     
+    return StreamingResponse(
+        event_stream(event_bus),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# Rows fetched from Mongo and handed to the export writer per step
+EXPORT_BATCH_SIZE = 500
+
+async def open_export_cursor(filter_query: Dict[str, Any], month: Optional[int], year: Optional[int]):
+    """A sorted cursor over the live and, if needed, archived submissions, and its first batch."""
+    cursor = await store.submissions.export_cursor(filter_query, year, month, EXPORT_BATCH_SIZE)
+    first_batch = await cursor.to_list(length=EXPORT_BATCH_SIZE)
+    if not first_batch:
+        await cursor.close()
+    return cursor, first_batch
+
+async def stream_export(cursor, first_batch: List[Dict[str, Any]], writer, on_batch=None):
+    """Feed cursor batches through an export writer off the event loop.
+    
+    first_batch has already been fetched from the cursor. on_batch, if
+    given, is awaited with the row count of each batch written.
+    """
+    try:
+        batch = first_batch
+        while batch:
+            chunk = await run_in_threadpool(writer.write_rows, batch)
+            if on_batch:
+                await on_batch(len(batch))
+            if chunk:
+                yield chunk
+            batch = await cursor.to_list(length=EXPORT_BATCH_SIZE)
+        
+        await run_in_threadpool(writer.close)
+        while True:
+            chunk = await run_in_threadpool(writer.read_chunk)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        writer.discard()
+        await cursor.close()
+
+def export_filter(month: Optional[int], year: Optional[int], department: Optional[str] = None) -> Dict[str, Any]:
     filter_query = {}
     if month:
         filter_query["month"] = month
     if year:
         filter_query["year"] = year
-    
-    submissions = []
-    async for submission in db.leave_submissions.find(filter_query).sort("year", -1).sort("month", -1):
-        submission.pop("_id", None)  # Remove MongoDB ObjectId
-        submissions.append(submission)
-    
-    if not submissions:
-        raise HTTPException(status_code=404, detail="No submissions found")
-    
-    # Create DataFrame
-    df_data = []
-    for sub in submissions:
-        df_data.append({
-            "Employee Name": sub["employee_name"],
-            "Employee ID": sub["employee_id"],
-            "Month": sub["month"],
-            "Year": sub["year"],
-            "Monthly Leave Dates": ", ".join(sub["monthly_leave_dates"]),
-            "Optional Leave Dates": ", ".join(sub["optional_leave_dates"]),
-            "Work From Home Dates": ", ".join(sub["wfh_dates"]),
-            "Additional Hours": sub["additional_hours"],
-            "Pending Leaves": sub["pending_leaves"],
-            "Total Days Off": ", ".join(sub["total_days_off_dates"]),
-            "Submitted At": sub["submitted_at"]
-        })
-    
-    df = pd.DataFrame(df_data)
-    
-    # Create Excel file in memory
-    output = BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df.to_excel(writer, sheet_name='Leave Submissions', index=False)
-    
-    output.seek(0)
-    
+    if department:
+        filter_query["department"] = department
+    return filter_query
+
+def export_filename(month: Optional[int], year: Optional[int], extension: str) -> str:
     filename = f"leave_submissions"
     if month and year:
         filename += f"_{year}_{month:02d}"
     elif year:
         filename += f"_{year}"
-    filename += ".xlsx"
+    return f"{filename}.{extension}"
+
+@app.get("/api/export-excel")
+async def export_excel(
+    month: Optional[int] = None,
+    year: Optional[int] = None,
+    export_format: str = Query("xlsx", alias="format"),
+    current_user: dict = Depends(get_current_user)
+):
+    if current_user["role"] != "hr":
+        raise HTTPException(status_code=403, detail="Only HR can export data")
+    
+    writer_class = EXPORT_WRITERS.get(export_format)
+    if not writer_class:
+        raise HTTPException(status_code=400, detail=f"Unsupported export format: {export_format}")
+    
+    cursor, first_batch = await open_export_cursor(export_filter(month, year), month, year)
+    if not first_batch:
+        raise HTTPException(status_code=404, detail="No submissions found")
+    
+    filename = export_filename(month, year, writer_class.extension)
     
     return StreamingResponse(
-        BytesIO(output.read()),
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        stream_export(cursor, first_batch, writer_class()),
+        media_type=writer_class.media_type,
         headers={"Content-Disposition": f"attachment; filename={filename}"}
     )
 
+# Export jobs: big exports are rendered in the background by a small pool of
+# worker tasks and downloaded once finished. Jobs live in Mongo, so a worker
+# in any process can claim them; artifacts are files in EXPORT_JOB_DIR.
+EXPORT_JOB_DIR = os.environ.get('EXPORT_JOB_DIR') or os.path.join(tempfile.gettempdir(), "leave-exports")
+EXPORT_JOB_WORKERS = int(os.environ.get('EXPORT_JOB_WORKERS', 2))
+EXPORT_JOB_TTL_SECONDS = int(os.environ.get('EXPORT_JOB_TTL_SECONDS', 60 * 60))
+EXPORT_JOB_POLL_SECONDS = 5
+# A running job whose heartbeat is older than this was orphaned by a crash
+EXPORT_JOB_STALE_SECONDS = 5 * 60
+EXPORT_JOB_HEARTBEAT_SECONDS = EXPORT_JOB_STALE_SECONDS / 10
+EXPORT_JOB_SWEEP_SECONDS = 60
+
+export_job_tasks: List[asyncio.Task] = []
+export_job_wakeup: Optional[asyncio.Event] = None
+
+def export_job_path(job: Dict[str, Any], suffix: str = "") -> str:
+    return os.path.join(EXPORT_JOB_DIR, f"{job['id']}.{EXPORT_WRITERS[job['format']].extension}{suffix}")
+
+def export_job_view(job: Dict[str, Any]) -> Dict[str, Any]:
+    view = {key: value for key, value in job.items() if key not in ("_id", "created_by", "heartbeat_at", "claim")}
+    view["progress"] = round(job["processed"] / job["total"], 4) if job.get("total") else None
+    if job["status"] == "done":
+        view["download_url"] = f"/api/export-jobs/{job['id']}/download"
+    return view
+
+async def claim_export_job() -> Optional[Dict[str, Any]]:
+    now = datetime.utcnow()
+    return await db.export_jobs.find_one_and_update(
+        {"$or": [
+            {"status": "queued"},
+            {"status": "running", "heartbeat_at": {"$lt": now - timedelta(seconds=EXPORT_JOB_STALE_SECONDS)}},
+        ]},
+        # claim tells this run apart from a later one that takes over a stale job
+        {"$set": {"status": "running", "claim": uuid.uuid4().hex, "started_at": now, "heartbeat_at": now,
+                  "processed": 0}},
+        sort=[("created_at", ASCENDING)],
+        return_document=ReturnDocument.AFTER
+    )
+
+async def keep_heartbeat(collection, owned: Dict[str, Any], label: str):
+    """Stamp heartbeat_at on the job matching owned until cancelled."""
+    # Runs for the whole job, so slow queries and file writes don't look orphaned
+    while True:
+        await asyncio.sleep(EXPORT_JOB_HEARTBEAT_SECONDS)
+        try:
+            await collection.update_one(owned, {"$set": {"heartbeat_at": datetime.utcnow()}})
+        except Exception as e:
+            print(f"{label} heartbeat failed: {e}")
+
+async def run_export_job(job: Dict[str, Any]):
+    writer_class = EXPORT_WRITERS[job["format"]]
+    filters = job["filters"]
+    filter_query = export_filter(filters.get("month"), filters.get("year"), filters.get("department"))
+    owned = {"id": job["id"], "claim": job["claim"]}
+    partial_path = export_job_path(job, f".{job['claim']}.part")
+    
+    async def report_progress(rows: int):
+        await db.export_jobs.update_one(owned, {"$inc": {"processed": rows}})
+    
+    heartbeat = asyncio.create_task(keep_heartbeat(db.export_jobs, owned, f"Export job {job['id']}"))
+    try:
+        total = await store.submissions.count(filter_query, filters.get("year"), filters.get("month"))
+        await db.export_jobs.update_one(owned, {"$set": {"total": total}})
+        
+        cursor, first_batch = await open_export_cursor(filter_query, filters.get("month"), filters.get("year"))
+        
+        await run_in_threadpool(os.makedirs, EXPORT_JOB_DIR, exist_ok=True)
+        artifact = await run_in_threadpool(open, partial_path, "wb")
+        try:
+            async for chunk in stream_export(cursor, first_batch, writer_class(), on_batch=report_progress):
+                await run_in_threadpool(artifact.write, chunk)
+        finally:
+            await run_in_threadpool(artifact.close)
+        if not await db.export_jobs.find_one(owned, {"_id": 1}):
+            # Another worker took the job over; its artifact is the one to keep
+            print(f"Export job {job['id']} was claimed by another worker")
+            await run_in_threadpool(os.remove, partial_path)
+            return
+        await run_in_threadpool(os.replace, partial_path, export_job_path(job))
+        size = await run_in_threadpool(os.path.getsize, export_job_path(job))
+        outcome = {"status": "done", "size": size}
+    except Exception as e:
+        print(f"Export job {job['id']} failed: {e}")
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        outcome = {"status": "failed", "error": str(e)}
+    finally:
+        heartbeat.cancel()
+    
+    finished_at = datetime.utcnow()
+    await db.export_jobs.update_one(
+        owned,
+        {"$set": {
+            **outcome,
+            "finished_at": finished_at,
+            "expires_at": finished_at + timedelta(seconds=EXPORT_JOB_TTL_SECONDS),
+        }}
+    )
+
+async def export_job_worker():
+    while True:
+        try:
+            job = await claim_export_job()
+            if job:
+                await run_export_job(job)
+                continue
+        except Exception as e:
+            # Keep the worker alive; a job it lost goes stale and is claimed again
+            print(f"Export job worker failed: {e}")
+            await asyncio.sleep(EXPORT_JOB_POLL_SECONDS)
+            continue
+        
+        try:
+            await asyncio.wait_for(export_job_wakeup.wait(), timeout=EXPORT_JOB_POLL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+        export_job_wakeup.clear()
+
+async def expire_export_jobs() -> int:
+    """Delete finished jobs past their TTL along with their files."""
+    expired = await db.export_jobs.find(
+        {"expires_at": {"$lt": datetime.utcnow()}}, {"_id": 0, "id": 1, "format": 1}
+    ).to_list(length=None)
+    for job in expired:
+        path = export_job_path(job)
+        if os.path.exists(path):
+            await run_in_threadpool(os.remove, path)
+    if expired:
+        await db.export_jobs.delete_many({"id": {"$in": [job["id"] for job in expired]}})
+    return len(expired)
+
+async def export_job_sweeper():
+    while True:
+        try:
+            await expire_export_jobs()
+        except Exception as e:
+            print(f"Expiring export jobs failed: {e}")
+        await asyncio.sleep(EXPORT_JOB_SWEEP_SECONDS)
+
+def start_export_workers():
+    global export_job_wakeup
+    export_job_wakeup = asyncio.Event()
+    export_job_tasks.extend(asyncio.create_task(export_job_worker()) for _ in range(EXPORT_JOB_WORKERS))
+    export_job_tasks.append(asyncio.create_task(export_job_sweeper()))
+
+async def stop_export_workers():
+    for task in export_job_tasks:
+        task.cancel()
+    await asyncio.gather(*export_job_tasks, return_exceptions=True)
+    export_job_tasks.clear()
+
+@app.post("/api/export-jobs", status_code=202)
+async def create_export_job(request: ExportJobRequest, current_user: dict = Depends(get_current_user)):
+    if current_user["role"] != "hr":
+        raise HTTPException(status_code=403, detail="Only HR can export data")
+    
+    writer_class = EXPORT_WRITERS.get(request.format)
+    if not writer_class:
+        raise HTTPException(status_code=400, detail=f"Unsupported export format: {request.format}")
+    
+    job = {
+        "id": str(uuid.uuid4()),
+        "status": "queued",
+        "format": request.format,
+        "filters": {"month": request.month, "year": request.year, "department": request.department},
+        "filename": export_filename(request.month, request.year, writer_class.extension),
+        "created_by": current_user["id"],
+        "created_at": datetime.utcnow(),
+        "total": None,
+        "processed": 0,
+    }
+    await db.export_jobs.insert_one(job)
+    if export_job_wakeup:
+        export_job_wakeup.set()
+    
+    return export_job_view(job)
+
+@app.get("/api/export-jobs")
+async def list_export_jobs(current_user: dict = Depends(get_current_user)):
+    if current_user["role"] != "hr":
+        raise HTTPException(status_code=403, detail="Only HR can export data")
+    
+    jobs = await db.export_jobs.find({"created_by": current_user["id"]}, {"_id": 0}) \
+        .sort("created_at", DESCENDING).to_list(length=50)
+    return {"jobs": [export_job_view(job) for job in jobs]}
+
+async def get_own_export_job(job_id: str, current_user: dict) -> Dict[str, Any]:
+    if current_user["role"] != "hr":
+        raise HTTPException(status_code=403, detail="Only HR can export data")
+    
+    job = await db.export_jobs.find_one({"id": job_id, "created_by": current_user["id"]}, {"_id": 0})
+    if not job:
+        raise HTTPException(status_code=404, detail="Export job not found")
+    return job
+
+@app.get("/api/export-jobs/{job_id}")
+async def get_export_job(job_id: str, current_user: dict = Depends(get_current_user)):
+    return export_job_view(await get_own_export_job(job_id, current_user))
+
+@app.get("/api/export-jobs/{job_id}/download")
+async def download_export_job(job_id: str, current_user: dict = Depends(get_current_user)):
+    job = await get_own_export_job(job_id, current_user)
+    if job["status"] != "done":
+        raise HTTPException(status_code=409, detail=f"Export job is {job['status']}")
+    
+    path = export_job_path(job)
+    if job["expires_at"] < datetime.utcnow() or not os.path.exists(path):
+        raise HTTPException(status_code=410, detail="Export has expired")
+    
+    return FileResponse(path, media_type=EXPORT_WRITERS[job["format"]].media_type, filename=job["filename"])
+
+# Optional leave quota: the employee's own value, else their department's
+# (department_settings), else this default.
+DEFAULT_OPTIONAL_LEAVE_QUOTA = int(os.environ.get('OPTIONAL_LEAVE_QUOTA', 6))
+
+async def optional_leave_quotas(users: List[Dict[str, Any]]) -> Dict[str, int]:
+    departments = {user.get("department") for user in users if user.get("optional_leave_quota") is None}
+    department_quotas = {}
+    if departments:
+        async for setting in db.department_settings.find({"department": {"$in": list(departments)}}):
+            department_quotas[setting["department"]] = setting["optional_leave_quota"]
+    
+    return {
+        user["id"]: user["optional_leave_quota"] if user.get("optional_leave_quota") is not None
+        else department_quotas.get(user.get("department"), DEFAULT_OPTIONAL_LEAVE_QUOTA)
+        for user in users
+    }
+
+def leave_stats_entry(totals: Optional[Dict[str, int]], quota: int) -> Dict[str, int]:
+    totals = totals or {}
+    used = totals.get("optional_leaves_used", 0)
+    return {
+        "total_optional_leaves_used": used,
+        "remaining_optional_leaves": max(0, quota - used),
+        "optional_leave_quota": quota,
+        "monthly_leave_days": totals.get("monthly_leave_days", 0),
+        "total_leave_days": totals.get("total_leave_days", 0),
+        "wfh_days": totals.get("wfh_days", 0),
+        "submissions_count": totals.get("submissions_count", 0)
+    }
+
 @app.get("/api/leave-stats/{user_id}")
 async def get_leave_stats(user_id: str, year: int, current_user: dict = Depends(get_current_user)):
     # Calculate yearly leave statistics
-    submissions = []
-    async for submission in db.leave_submissions.find({"user_id": user_id, "year": year}):
-        submissions.append(submission)
+    user = user_cache.get(user_id) or await store.users.get(user_id)
+    quotas = await optional_leave_quotas([user]) if user else {}
+    totals = await store.submissions.yearly_totals(year, [user_id])
     
-    total_optional_leaves = sum(len(sub["optional_leave_dates"]) for sub in submissions)
-    remaining_optional_leaves = max(0, 6 - total_optional_leaves)
+    return leave_stats_entry(totals.get(user_id), quotas.get(user_id, DEFAULT_OPTIONAL_LEAVE_QUOTA))
+
+async def all_leave_stats(year: int, department: Optional[str], employee_ids: Optional[str], active: Optional[bool]) -> Dict[str, Any]:
+    employee_id_list = [value.strip() for value in employee_ids.split(",") if value.strip()] if employee_ids else None
+    filtered = bool(department or employee_id_list or active is not None)
+    
+    users = await store.users.find_employees(
+        department, employee_id_list, active,
+        fields=["id", "name", "employee_id", "department", "active", "optional_leave_quota"]
+    )
+    
+    quotas = await optional_leave_quotas(users)
+    # Unfiltered requests aggregate the whole year rather than shipping every user id back
+    totals = await store.submissions.yearly_totals(year, [user["id"] for user in users] if filtered else None)
     
     return {
-        "total_optional_leaves_used": total_optional_leaves,
-        "remaining_optional_leaves": remaining_optional_leaves,
-        "submissions_count": len(submissions)
+        "year": year,
+        "employees": [
+            {
+                "user_id": user["id"],
+                "name": user["name"],
+                "employee_id": user["employee_id"],
+                "department": user.get("department"),
+                "active": user.get("active", True),
+                **leave_stats_entry(totals.get(user["id"]), quotas[user["id"]])
+            }
+            for user in users
+        ]
     }
 
+@app.get("/api/hr/leave-stats")
+async def get_all_leave_stats(
+    request: Request,
+    year: int,
+    department: Optional[str] = None,
+    employee_ids: Optional[str] = None,
+    active: Optional[bool] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    if current_user["role"] != "hr":
+        raise HTTPException(status_code=403, detail="Only HR can view leave statistics for all employees")
+    
+    return await conditional_get(
+        request, [SUBMISSIONS, USERS, SETTINGS], current_user["role"],
+        lambda: all_leave_stats(year, department, employee_ids, active)
+    )
+
 @app.get("/api/analytics/{user_id}")
 async def get_analytics(user_id: str, month: int, year: int, current_user: dict = Depends(get_current_user)):
     # Get submission for specific month
-    submission = await db.leave_submissions.find_one({
-        "user_id": user_id,
-        "month": month,
-        "year": year
-    })
+    submission = await store.submissions.get_month(user_id, year, month)
+    
+    user = user_cache.get(user_id) or await store.users.get(user_id, ["region"]) or {}
+    month_days = await working_calendar(year, month, user.get("region"))
     
     if not submission:
         # Return default data for months without submissions
-        days_in_month = calendar.monthrange(year, month)[1]
         return {
-            "working_days": days_in_month - 8,  # Assuming ~8 weekends
+            "working_days": month_days.working_days,
             "leave_days": 0,
             "wfh_days": 0,
-            "total_days": days_in_month,
+            "total_days": month_days.days_in_month,
             "month_name": calendar.month_name[month],
             "year": year,
+            "weekends": month_days.weekend_days,
+            "holidays": month_days.holidays,
             "calculated_total_days_off": 0
         }
     
-    # Calculate days
-    days_in_month = calendar.monthrange(year, month)[1]
-    weekends = sum(1 for i in range(1, days_in_month + 1) 
-                   if datetime(year, month, i).weekday() >= 5)
-    
     # Use the calculated total days off
     calculated_total_days_off = len(submission["monthly_leave_dates"]) + len(submission["optional_leave_dates"])
     total_leave_days = calculated_total_days_off + len(submission["total_days_off_dates"])
     wfh_days = len(submission["wfh_dates"])
-    working_days = days_in_month - weekends - total_leave_days
+    working_days = month_days.working_days - total_leave_days
     
     return {
         "working_days": max(0, working_days),
         "leave_days": total_leave_days,
         "wfh_days": wfh_days,
-        "total_days": days_in_month,
+        "total_days": month_days.days_in_month,
         "month_name": calendar.month_name[month],
         "year": year,
-        "weekends": weekends,
+        "weekends": month_days.weekend_days,
+        "holidays": month_days.holidays,
         "calculated_total_days_off": calculated_total_days_off
     }
 
-@app.get("/api/hr-analytics")
-async def get_hr_analytics(month: int, year: int, current_user: dict = Depends(get_current_user)):
+@app.get("/api/hr/day-status")
+async def get_day_status(date: str, current_user: dict = Depends(get_current_user)):
     if current_user["role"] != "hr":
-        raise HTTPException(status_code=403, detail="Only HR can view analytics")
+        raise HTTPException(status_code=403, detail="Only HR can view day status")
     
-    # Get all submissions for the month
-    submissions = []
-    async for submission in db.leave_submissions.find({"month": month, "year": year}):
-        submissions.append(submission)
-    
-    # Calculate overall statistics
-    total_employees = await db.users.count_documents({"role": "employee", "active": True})
-    employees_submitted = len(set(sub["user_id"] for sub in submissions))
+    try:
+        day = datetime.strptime(date, "%Y-%m-%d")
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Date must be YYYY-MM-DD")
     
-    total_leave_days = sum(
-        len(sub["monthly_leave_dates"]) + len(sub["optional_leave_dates"]) + len(sub["total_days_off_dates"])
-        for sub in submissions
-    )
+    result = await store.submissions.day_status(day.year, day.month, day.day)
     
-    total_wfh_days = sum(len(sub["wfh_dates"]) for sub in submissions)
+    return {"date": date, **result}
+
+async def hr_analytics(month: int, year: int, top: int) -> Dict[str, Any]:
+    # Month totals are read from the per-department, per-region rollups
+    rollups = await db.monthly_rollups.find({"year": year, "month": month}, {"_id": 0}).to_list(length=None)
+    employees_submitted = sum(rollup["submissions"] for rollup in rollups)
+    total_leave_days = sum(rollup["leave_days"] for rollup in rollups)
+    total_wfh_days = sum(rollup["wfh_days"] for rollup in rollups)
+    
+    # Working days are owed per submitter, on the calendar of their region
+    working_days_possible = await rollup_working_days(year, month, rollups)
+    actual_working_days = working_days_possible - total_leave_days
     
-    # Days in month calculation
-    days_in_month = calendar.monthrange(year, month)[1]
-    weekends = sum(1 for i in range(1, days_in_month + 1) 
-                   if datetime(year, month, i).weekday() >= 5)
+    top_leave_takers = await store.submissions.top_leave_takers(year, month, top) if top > 0 else []
+    
+    # Active headcount overall and per department
+    headcount = await store.users.headcount_by_department()
+    total_employees = sum(headcount.values())
+    
+    by_department = {}
+    for rollup in rollups:
+        by_department.setdefault(rollup["department"], []).append(rollup)
+    
+    departments = []
+    for department, department_rollups in by_department.items():
+        submitted = sum(rollup["submissions"] for rollup in department_rollups)
+        if submitted <= 0:
+            continue
+        leave_days = sum(rollup["leave_days"] for rollup in department_rollups)
+        department_employees = headcount.get(department, 0)
+        departments.append({
+            "department": department,
+            "employees_submitted": submitted,
+            "total_leave_days": leave_days,
+            "total_wfh_days": sum(rollup["wfh_days"] for rollup in department_rollups),
+            "total_employees": department_employees,
+            "working_days": max(0, await rollup_working_days(year, month, department_rollups) - leave_days),
+            "submission_rate": round(
+                (submitted / department_employees) * 100, 1
+            ) if department_employees > 0 else 0,
+        })
     
-    working_days_possible = (days_in_month - weekends) * employees_submitted
-    actual_working_days = working_days_possible - total_leave_days
+    # Departments where nobody has submitted yet still show up, with zeros
+    reported = {department["department"] for department in departments}
+    for name, count in headcount.items():
+        if name not in reported:
+            departments.append({
+                "department": name,
+                "employees_submitted": 0,
+                "total_leave_days": 0,
+                "total_wfh_days": 0,
+                "total_employees": count,
+                "working_days": 0,
+                "submission_rate": 0,
+            })
+    departments.sort(key=lambda department: department["department"] or "")
     
     return {
         "total_employees": total_employees,
@@ -423,9 +1722,135 @@ async def get_hr_analytics(month: int, year: int, current_user: dict = Depends(g
         "working_days": max(0, actual_working_days),
         "month_name": calendar.month_name[month],
         "year": year,
-        "submission_rate": round((employees_submitted / total_employees) * 100, 1) if total_employees > 0 else 0
+        "submission_rate": round((employees_submitted / total_employees) * 100, 1) if total_employees > 0 else 0,
+        "departments": departments,
+        "top_leave_takers": top_leave_takers
     }
 
+@app.get("/api/hr-analytics")
+async def get_hr_analytics(
+    request: Request,
+    month: int,
+    year: int,
+    top: int = Query(5, ge=0, le=50),
+    current_user: dict = Depends(get_current_user)
+):
+    if current_user["role"] != "hr":
+        raise HTTPException(status_code=403, detail="Only HR can view analytics")
+    
+    return await conditional_get(
+        request, [SUBMISSIONS, USERS, SETTINGS], current_user["role"],
+        lambda: hr_analytics(month, year, top),
+        cache=True
+    )
+
+# Trends
+# Per-month counts over a range of months in one aggregation: over the user's
+# submissions, or over the monthly rollups for a department or the company.
+MAX_TREND_MONTHS = 60
+
+def parse_month(value: str, name: str):
+    try:
+        parsed = datetime.strptime(value, "%Y-%m")
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"{name} must be YYYY-MM")
+    return parsed.year, parsed.month
+
+# Months counted from year 0, so ranges are plain integer ranges
+def month_number(year_month) -> int:
+    return year_month[0] * 12 + year_month[1] - 1
+
+def year_month(number: int) -> tuple:
+    return number // 12, number % 12 + 1
+
+def month_span(start, end) -> List[tuple]:
+    """(year, month) for every month from start to end, inclusive."""
+    return [year_month(number) for number in range(month_number(start), month_number(end) + 1)]
+
+async def rollup_trend(start, end, department: Optional[str]):
+    """TREND_COUNTERS per (year, month), and the month's rollups summed per region."""
+    match = month_range_filter(start, end)
+    if department:
+        match = {**match, "department": department}
+    groups = await db.monthly_rollups.aggregate([
+        {"$match": match},
+        {"$group": {
+            "_id": {"year": "$year", "month": "$month", "region": "$region"},
+            **{name: {"$sum": f"${name}"} for name in TREND_COUNTERS},
+        }},
+    ]).to_list(length=None)
+    
+    regions = {}
+    for group in groups:
+        key = group["_id"]
+        regions.setdefault((key["year"], key["month"]), []).append({"region": key.get("region"), **group})
+    return trend_by_month(groups), regions
+
+async def trend_analytics(start, end, user_id: Optional[str], department: Optional[str]) -> Dict[str, Any]:
+    region = None  # Groups report the default calendar as calendar_working_days
+    if user_id:
+        user = user_cache.get(user_id) or await store.users.get(user_id, ["region"]) or {}
+        region = user.get("region")
+        counts = await store.submissions.monthly_trend(user_id, start, end)
+    else:
+        counts, month_regions = await rollup_trend(start, end, department)
+    
+    months = []
+    for year, month in month_span(start, end):
+        month_counts = counts.get((year, month), dict.fromkeys(TREND_COUNTERS, 0))
+        month_days = await working_calendar(year, month, region)
+        # A user without a submission worked every working day, as in get_analytics;
+        # groups count working days only for those who submitted, each on their
+        # own region's calendar, as in hr_analytics
+        if user_id:
+            working_days_owed = month_days.working_days
+        else:
+            working_days_owed = await rollup_working_days(year, month, month_regions.get((year, month), []))
+        months.append({
+            "year": year,
+            "month": month,
+            "month_name": calendar.month_name[month],
+            "calendar_working_days": month_days.working_days,
+            "working_days": max(0, working_days_owed - month_counts["leave_days"]),
+            **month_counts,
+        })
+    
+    scope = "user" if user_id else "department" if department else "company"
+    return {"scope": scope, "user_id": user_id, "department": department, "months": months}
+
+@app.get("/api/trend-analytics")
+async def get_trend_analytics(
+    request: Request,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    user_id: Optional[str] = None,
+    department: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    if current_user["role"] != "hr":
+        if department or (user_id and user_id != current_user["id"]):
+            raise HTTPException(status_code=403, detail="Employees can only view their own trend")
+        user_id = current_user["id"]
+    if user_id and department:
+        raise HTTPException(status_code=400, detail="Choose either a user or a department")
+    
+    # Default to the twelve months ending with the current one
+    today = datetime.now()
+    end_month = parse_month(end, "end") if end else (today.year, today.month)
+    start_month = parse_month(start, "start") if start else year_month(month_number(end_month) - 11)
+    span = month_number(end_month) - month_number(start_month) + 1
+    if span < 1:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+    if span > MAX_TREND_MONTHS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_TREND_MONTHS} months per request")
+    
+    viewer = current_user["role"] if current_user["role"] == "hr" else current_user["id"]
+    return await conditional_get(
+        request, [SUBMISSIONS, USERS, SETTINGS], viewer,
+        lambda: trend_analytics(start_month, end_month, user_id, department),
+        parts=(start_month, end_month)
+    )
+
 # HR Management Endpoints
 @app.post("/api/hr/create-employee")
 async def create_employee(request: CreateEmployeeRequest, current_user: dict = Depends(get_current_user)):
@@ -433,12 +1858,12 @@ async def create_employee(request: CreateEmployeeRequest, current_user: dict = D
         raise HTTPException(status_code=403, detail="Only HR can create employees")
     
     # Check if username already exists
-    existing_username = await db.users.find_one({"username": request.username})
+    existing_username = await store.users.get_by_username(request.username)
     if existing_username:
         raise HTTPException(status_code=400, detail="Username already exists")
     
     # Check if employee ID already exists
-    existing_employee_id = await db.users.find_one({"employee_id": request.employee_id})
+    existing_employee_id = await store.users.get_by_employee_id(request.employee_id)
     if existing_employee_id:
         raise HTTPException(status_code=400, detail="Employee ID already exists")
     
@@ -447,30 +1872,213 @@ async def create_employee(request: CreateEmployeeRequest, current_user: dict = D
         "name": request.name,
         "username": request.username,  # Add username field
         "employee_id": request.employee_id,
-        "password": request.password,
+        "password": await run_password_task(hash_password, request.password),
         "role": "employee",
         "department": request.department,
-        "active": True
+        "active": True,
+        "optional_leave_quota": request.optional_leave_quota,
+        "region": request.region
     }
     
-    await db.users.insert_one(employee_data)
-    employee_data.pop("_id", None)
+    await store.users.insert(employee_data)
+    data_versions.bump(USERS)
     employee_data.pop("password", None)  # Don't return password
     
     return {"message": "Employee created successfully", "employee": employee_data}
 
+# Employee import jobs
+# Hashing thousands of passwords takes minutes, so a real import is checked
+# in the request and then hashed and inserted in batches by a background
+# task that HR polls at /api/hr/import-jobs/{id}. It shares the export jobs'
+# heartbeat, but the plaintext passwords only ever live in that task's
+# memory, so a job whose process dies is reported as interrupted instead of
+# being claimed again by another worker.
+MAX_IMPORT_ROWS = int(os.environ.get('MAX_IMPORT_ROWS', 20000))
+IMPORT_BATCH_SIZE = 200
+IMPORT_JOB_TTL_SECONDS = int(os.environ.get('IMPORT_JOB_TTL_SECONDS', 24 * 60 * 60))
+
+import_job_tasks = set()
+
+def import_job_view(job: Dict[str, Any]) -> Dict[str, Any]:
+    view = {key: value for key, value in job.items() if key not in ("_id", "created_by", "heartbeat_at", "expires_at")}
+    stale_before = datetime.utcnow() - timedelta(seconds=EXPORT_JOB_STALE_SECONDS)
+    if job["status"] == "running" and job["heartbeat_at"] < stale_before:
+        view["status"] = "failed"
+        view["error"] = "The import was interrupted; rows it had not reached were not imported"
+    view["progress"] = round(job["processed"] / job["total"], 4) if job["total"] else 1.0
+    view["errors"] = sorted(job["errors"], key=lambda error: error["row"])
+    return view
+
+async def run_import_job(job: Dict[str, Any], to_insert: List[tuple]):
+    owned = {"id": job["id"]}
+    heartbeat = asyncio.create_task(keep_heartbeat(db.import_jobs, owned, f"Import job {job['id']}"))
+    try:
+        for start in range(0, len(to_insert), IMPORT_BATCH_SIZE):
+            batch = to_insert[start:start + IMPORT_BATCH_SIZE]
+            # Hashes are computed in parallel across the import pool, leaving the login pool free
+            hashes = await asyncio.gather(*(
+                run_password_task(hash_password, employee["password"], pool=import_password_pool)
+                for _, employee in batch
+            ))
+            for (_, employee), password_hash in zip(batch, hashes):
+                employee["password"] = password_hash
+            
+            # Rows that lost a race with a concurrent create hit the unique indexes
+            rejected = await store.users.insert_many([employee for _, employee in batch])
+            await db.import_jobs.update_one(owned, {
+                "$inc": {"processed": len(batch), "created": len(batch) - len(rejected)},
+                "$push": {"errors": {"$each": [
+                    {"row": batch[index][0], "error": "Username or employee ID already exists"} for index in rejected
+                ]}},
+            })
+            data_versions.bump(USERS)
+        outcome = {"status": "done"}
+    except Exception as e:
+        print(f"Import job {job['id']} failed: {e}")
+        outcome = {"status": "failed", "error": str(e)}
+    finally:
+        heartbeat.cancel()
+    
+    finished_at = datetime.utcnow()
+    await db.import_jobs.update_one(
+        owned,
+        {"$set": {
+            **outcome,
+            "finished_at": finished_at,
+            "expires_at": finished_at + timedelta(seconds=IMPORT_JOB_TTL_SECONDS),
+        }}
+    )
+
+def start_import_job(job: Dict[str, Any], to_insert: List[tuple]):
+    task = asyncio.create_task(run_import_job(job, to_insert))
+    import_job_tasks.add(task)
+    task.add_done_callback(import_job_tasks.discard)
+
+@app.post("/api/hr/import-employees")
+async def import_employees(file: UploadFile = File(...), dry_run: bool = False, current_user: dict = Depends(get_current_user)):
+    """Check an employee file; unless dry_run, start an import job and answer 202 with it."""
+    if current_user["role"] != "hr":
+        raise HTTPException(status_code=403, detail="Only HR can import employees")
+    
+    content = await file.read()
+    try:
+        rows = await run_in_threadpool(parse_employee_file, file.filename or "", content)
+    except ImportFileError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if len(rows) > MAX_IMPORT_ROWS:
+        raise HTTPException(status_code=400, detail=f"Import files may hold at most {MAX_IMPORT_ROWS} employees")
+    
+    valid, errors = validate_employee_rows(rows)
+    
+    # One query for every username and employee ID that is already taken
+    taken_usernames, taken_employee_ids = set(), set()
+    if valid:
+        taken_usernames, taken_employee_ids = await store.users.taken(
+            [values["username"] for _, values in valid],
+            [values["employee_id"] for _, values in valid]
+        )
+    
+    to_insert = []
+    for row_number, values in valid:
+        if values["username"] in taken_usernames:
+            errors.append({"row": row_number, "error": "Username already exists"})
+        elif values["employee_id"] in taken_employee_ids:
+            errors.append({"row": row_number, "error": "Employee ID already exists"})
+        else:
+            to_insert.append((row_number, {
+                "id": str(uuid.uuid4()),
+                "name": values["name"],
+                "username": values["username"],
+                "employee_id": values["employee_id"],
+                "password": values["password"],
+                "role": "employee",
+                "department": values.get("department") or None,
+                "active": True
+            }))
+    
+    errors.sort(key=lambda error: error["row"])
+    if dry_run:
+        return {
+            "message": f"Would import {len(to_insert)} of {len(rows)} employees",
+            "total_rows": len(rows),
+            "created": len(to_insert),
+            "dry_run": True,
+            "errors": errors
+        }
+    
+    now = datetime.utcnow()
+    job = {
+        "id": str(uuid.uuid4()),
+        "status": "running",
+        "created_by": current_user["id"],
+        "created_at": now,
+        "heartbeat_at": now,
+        # Pushed back when the job finishes
+        "expires_at": now + timedelta(seconds=IMPORT_JOB_TTL_SECONDS),
+        "total_rows": len(rows),
+        "total": len(to_insert),
+        "processed": 0,
+        "created": 0,
+        "errors": errors,
+    }
+    await db.import_jobs.insert_one(job)
+    start_import_job(job, to_insert)
+    
+    return ORJSONResponse(
+        import_job_view(job), status_code=202, headers={"Location": f"/api/hr/import-jobs/{job['id']}"}
+    )
+
+@app.get("/api/hr/import-jobs/{job_id}")
+async def get_import_job(job_id: str, current_user: dict = Depends(get_current_user)):
+    if current_user["role"] != "hr":
+        raise HTTPException(status_code=403, detail="Only HR can import employees")
+    
+    job = await db.import_jobs.find_one({"id": job_id, "created_by": current_user["id"]}, {"_id": 0})
+    if not job:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    return import_job_view(job)
+
+# Employee list pagination
+# Employees are ordered by their unique employee ID, so the cursor is just the
+# last ID served.
+EMPLOYEE_PAGE_SIZE = 100
+MAX_EMPLOYEE_PAGE_SIZE = 500
+
+def decode_employee_cursor(cursor: str) -> str:
+    try:
+        return base64.b64decode(cursor.encode(), altchars=b"-_", validate=True).decode()
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+async def fetch_employee_page(q: Optional[str], department: Optional[str], active: Optional[bool],
+                              limit: int, cursor: Optional[str]) -> Dict[str, Any]:
+    after = decode_employee_cursor(cursor) if cursor else None
+    
+    # One extra row tells us whether another page exists; passwords are never returned
+    employees = await store.users.search_employees(q, department, active, limit + 1, after)
+    next_cursor = None
+    if len(employees) > limit:
+        next_cursor = base64.urlsafe_b64encode(employees[limit - 1]["employee_id"].encode()).decode()
+    return {"employees": employees[:limit], "next_cursor": next_cursor}
+
 @app.get("/api/hr/employees")
-async def get_employees(current_user: dict = Depends(get_current_user)):
+async def get_employees(
+    request: Request,
+    q: Optional[str] = None,
+    department: Optional[str] = None,
+    active: Optional[bool] = None,
+    limit: int = Query(EMPLOYEE_PAGE_SIZE, ge=1, le=MAX_EMPLOYEE_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
     if current_user["role"] != "hr":
         raise HTTPException(status_code=403, detail="Only HR can view employees")
     
-    employees = []
-    async for employee in db.users.find({"role": "employee"}):
-        employee.pop("_id", None)
-        employee.pop("password", None)  # Don't return passwords
-        employees.append(employee)
-    
-    return {"employees": employees}
+    return await conditional_get(
+        request, [USERS], current_user["role"],
+        lambda: fetch_employee_page(q, department, active, limit, cursor),
+        cache=True
+    )
 
 @app.post("/api/hr/create-hr")
 async def create_hr(request: CreateHRRequest, current_user: dict = Depends(get_current_user)):
@@ -478,12 +2086,12 @@ async def create_hr(request: CreateHRRequest, current_user: dict = Depends(get_c
         raise HTTPException(status_code=403, detail="Only HR can create other HR users")
     
     # Check if username already exists
-    existing_username = await db.users.find_one({"username": request.username})
+    existing_username = await store.users.get_by_username(request.username)
     if existing_username:
         raise HTTPException(status_code=400, detail="Username already exists")
     
     # Check if employee ID already exists
-    existing_employee_id = await db.users.find_one({"employee_id": request.employee_id})
+    existing_employee_id = await store.users.get_by_employee_id(request.employee_id)
     if existing_employee_id:
         raise HTTPException(status_code=400, detail="Employee ID already exists")
     
@@ -492,14 +2100,14 @@ async def create_hr(request: CreateHRRequest, current_user: dict = Depends(get_c
         "name": request.name,
         "username": request.username,
         "employee_id": request.employee_id,
-        "password": request.password,
+        "password": await run_password_task(hash_password, request.password),
         "role": "hr",  # Create HR user instead of employee
         "department": request.department or "Human Resources",
         "active": True
     }
     
-    await db.users.insert_one(hr_data)
-    hr_data.pop("_id", None)
+    await store.users.insert(hr_data)
+    data_versions.bump(USERS)
     hr_data.pop("password", None)  # Don't return password
     
     return {"message": "HR user created successfully", "hr_user": hr_data}
@@ -514,28 +2122,29 @@ async def update_employee(employee_id: str, request: UpdateEmployeeRequest, curr
         update_data["name"] = request.name
     if request.username:
         # Check if new username already exists
-        existing_username = await db.users.find_one({"username": request.username})
+        existing_username = await store.users.get_by_username(request.username)
         if existing_username and existing_username["employee_id"] != employee_id:
             raise HTTPException(status_code=400, detail="Username already exists")
         update_data["username"] = request.username
     if request.password:
-        update_data["password"] = request.password
+        update_data["password"] = await run_password_task(hash_password, request.password)
     if request.department:
         update_data["department"] = request.department
     if request.active is not None:
         update_data["active"] = request.active
+    if request.optional_leave_quota is not None:
+        update_data["optional_leave_quota"] = request.optional_leave_quota
+    if request.region:
+        update_data["region"] = request.region
     
     if not update_data:
         raise HTTPException(status_code=400, detail="No data to update")
     
-    result = await db.users.update_one(
-        {"employee_id": employee_id, "role": "employee"},
-        {"$set": update_data}
-    )
-    
-    if result.matched_count == 0:
+    if not await store.users.update_employee(employee_id, update_data):
         raise HTTPException(status_code=404, detail="Employee not found")
     
+    user_cache.invalidate_employee(employee_id)
+    data_versions.bump(USERS)
     return {"message": "Employee updated successfully"}
 
 @app.delete("/api/hr/delete-employee/{employee_id}")
@@ -543,14 +2152,19 @@ async def delete_employee(employee_id: str, current_user: dict = Depends(get_cur
     if current_user["role"] != "hr":
         raise HTTPException(status_code=403, detail="Only HR can delete employees")
     
-    # Delete employee
-    result = await db.users.delete_one({"employee_id": employee_id, "role": "employee"})
+    await check_rollups_writable()
     
-    if result.deleted_count == 0:
+    # Delete employee
+    if not await store.users.delete_employee(employee_id):
         raise HTTPException(status_code=404, detail="Employee not found")
     
-    # Also delete their leave submissions
-    await db.leave_submissions.delete_many({"employee_id": employee_id})
+    user_cache.invalidate_employee(employee_id)
+    
+    # Also delete their leave submissions, archived ones included, taking them out of the rollups
+    submissions = await store.submissions.delete_for_employee(employee_id)
+    await apply_rollup_updates(db, removed=submissions)
+    data_versions.bump(USERS, SUBMISSIONS)
+    await notify_submissions("deleted", submissions)
     
     return {"message": "Employee and all related data deleted successfully"}
 
@@ -559,25 +2173,215 @@ async def delete_month_data(month: int, year: int, current_user: dict = Depends(
     if current_user["role"] != "hr":
         raise HTTPException(status_code=403, detail="Only HR can delete month data")
     
-    result = await db.leave_submissions.delete_many({"month": month, "year": year})
+    await check_rollups_writable(year, month)
+    deleted_count = await store.submissions.delete_month(year, month)
+    await db.monthly_rollups.delete_many({"month": month, "year": year})
+    data_versions.bump(SUBMISSIONS)
+    if EVENT_SOURCE == "routes":
+        event_bus.publish("month_deleted", {"deleted": deleted_count, "totals": await month_totals(year, month)})
     
-    return {"message": f"Deleted {result.deleted_count} submissions for {calendar.month_name[month]} {year}"}
+    return {"message": f"Deleted {deleted_count} submissions for {calendar.month_name[month]} {year}"}
+
+@app.put("/api/hr/departments/{department}/quota")
+async def set_department_quota(department: str, request: DepartmentQuotaRequest, current_user: dict = Depends(get_current_user)):
+    if current_user["role"] != "hr":
+        raise HTTPException(status_code=403, detail="Only HR can change leave quotas")
+    
+    if request.optional_leave_quota < 0:
+        raise HTTPException(status_code=400, detail="Quota cannot be negative")
+    
+    await db.department_settings.update_one(
+        {"department": department},
+        {"$set": {"optional_leave_quota": request.optional_leave_quota}},
+        upsert=True
+    )
+    data_versions.bump(SETTINGS)
+    
+    return {"message": f"Optional leave quota for {department} set to {request.optional_leave_quota}"}
+
+@app.post("/api/hr/rebuild-rollups")
+async def rebuild_rollups_route(month: Optional[int] = None, year: Optional[int] = None, current_user: dict = Depends(get_current_user)):
+    if current_user["role"] != "hr":
+        raise HTTPException(status_code=403, detail="Only HR can rebuild rollups")
+    
+    rebuilt = await rebuild_rollups(db, year=year, month=month)
+    data_versions.bump(SUBMISSIONS)
+    return {"message": f"Rebuilt {rebuilt} rollup documents"}
+
+# Archiving runs in the background; keep references so tasks aren't collected
+archive_tasks = set()
+
+async def run_archive_task(operation, year: int, month: int):
+    try:
+        moved = await operation(db, year, month)
+        print(f"{operation.__name__}: moved {moved} submissions for {calendar.month_name[month]} {year}")
+    except Exception as e:
+        print(f"{operation.__name__} failed for {calendar.month_name[month]} {year}: {e}")
+    data_versions.bump(SUBMISSIONS)
+
+def start_archive_task(operation, year: int, month: int):
+    task = asyncio.create_task(run_archive_task(operation, year, month))
+    archive_tasks.add(task)
+    task.add_done_callback(archive_tasks.discard)
+
+@app.get("/api/hr/archived-months")
+async def get_archived_months(current_user: dict = Depends(get_current_user)):
+    if current_user["role"] != "hr":
+        raise HTTPException(status_code=403, detail="Only HR can view archived months")
+    
+    months = await db.archived_months.find({}, {"_id": 0}) \
+        .sort([("year", DESCENDING), ("month", DESCENDING)]).to_list(length=None)
+    return {"archived_months": months}
+
+@app.post("/api/hr/archive-month/{month}/{year}", status_code=202)
+async def archive_month_route(month: int, year: int, current_user: dict = Depends(get_current_user)):
+    if current_user["role"] != "hr":
+        raise HTTPException(status_code=403, detail="Only HR can archive month data")
+    
+    today = datetime.now()
+    if not 1 <= month <= 12 or (year, month) >= (today.year, today.month):
+        raise HTTPException(status_code=400, detail="Only past months can be archived")
+    
+    try:
+        await db.archived_months.insert_one(
+            {"year": year, "month": month, "status": "archiving", "started_at": datetime.utcnow()}
+        )
+    except DuplicateKeyError:
+        raise HTTPException(status_code=409, detail=f"{calendar.month_name[month]} {year} is already archived")
+    
+    start_archive_task(archive_month, year, month)
+    return {"message": f"Archiving {calendar.month_name[month]} {year}"}
+
+@app.post("/api/hr/restore-month/{month}/{year}", status_code=202)
+async def restore_month_route(month: int, year: int, current_user: dict = Depends(get_current_user)):
+    if current_user["role"] != "hr":
+        raise HTTPException(status_code=403, detail="Only HR can restore month data")
+    
+    claimed = await db.archived_months.find_one_and_update(
+        {"year": year, "month": month, "status": "archived"},
+        {"$set": {"status": "restoring"}}
+    )
+    if not claimed:
+        raise HTTPException(status_code=409, detail="Month is not archived or is still being moved")
+    
+    start_archive_task(restore_month, year, month)
+    return {"message": f"Restoring {calendar.month_name[month]} {year}"}
+
+@app.get("/api/hr/calendar/{region}")
+async def get_calendar_region(region: str, current_user: dict = Depends(get_current_user)):
+    if current_user["role"] != "hr":
+        raise HTTPException(status_code=403, detail="Only HR can view calendars")
+    
+    settings = await db.calendar_regions.find_one({"region": region}, {"_id": 0})
+    return settings or {"region": region, "weekmask": DEFAULT_WEEKMASK, "holidays": []}
+
+@app.put("/api/hr/calendar/{region}")
+async def set_calendar_region(region: str, request: CalendarRegionRequest, current_user: dict = Depends(get_current_user)):
+    if current_user["role"] != "hr":
+        raise HTTPException(status_code=403, detail="Only HR can change calendars")
+    
+    if not valid_weekmask(request.weekmask):
+        raise HTTPException(status_code=400, detail="Weekmask must be 7 characters of 0/1 with at least one working day")
+    for holiday in request.holidays:
+        try:
+            datetime.strptime(holiday.date, "%Y-%m-%d")
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"Invalid holiday date: {holiday.date}")
+    
+    await db.calendar_regions.update_one(
+        {"region": region},
+        {"$set": {"weekmask": request.weekmask, "holidays": [holiday.model_dump() for holiday in request.holidays]}},
+        upsert=True
+    )
+    region_settings_cache.pop(region, None)
+    data_versions.bump(SETTINGS)
+    
+    return {"message": f"Calendar for {region} updated successfully"}
+
+@app.get("/api/hr/index-report")
+async def get_index_report(current_user: dict = Depends(get_current_user)):
+    if current_user["role"] != "hr":
+        raise HTTPException(status_code=403, detail="Only HR can view index status")
+    
+    return await ensure_indexes(db, apply=False)
 
 @app.post("/api/hr/revoke-access/{employee_id}")
 async def revoke_access(employee_id: str, current_user: dict = Depends(get_current_user)):
     if current_user["role"] != "hr":
         raise HTTPException(status_code=403, detail="Only HR can revoke access")
     
-    result = await db.users.update_one(
-        {"employee_id": employee_id, "role": "employee"},
-        {"$set": {"active": False}}
-    )
-    
-    if result.matched_count == 0:
+    if not await store.users.update_employee(employee_id, {"active": False}):
         raise HTTPException(status_code=404, detail="Employee not found")
     
+    user_cache.invalidate_employee(employee_id)
+    data_versions.bump(USERS)
     return {"message": "Employee access revoked successfully"}
 
+# Monitoring
+SLOW_QUERY_LIST_SIZE = 200
+
+@app.get("/api/hr/profiles/{profile_id}")
+async def get_profile(profile_id: str, output: str = "html", current_user: dict = Depends(get_current_user)):
+    if current_user["role"] != "hr":
+        raise HTTPException(status_code=403, detail="Only HR can view profiles")
+    if output not in ("html", "text"):
+        raise HTTPException(status_code=400, detail=f"Unsupported profile output: {output}")
+    
+    rendered = await profile_store.render(profile_id, output)
+    if rendered is None:
+        raise HTTPException(status_code=404, detail="Profile not found or expired")
+    
+    return HTMLResponse(rendered) if output == "html" else PlainTextResponse(rendered)
+
+@app.get("/api/hr/slow-queries")
+async def get_slow_queries(current_user: dict = Depends(get_current_user)):
+    if current_user["role"] != "hr":
+        raise HTTPException(status_code=403, detail="Only HR can view the slow-query log")
+    
+    queries = await db.slow_queries.find({}, {"_id": 0}).sort("at", DESCENDING).to_list(length=SLOW_QUERY_LIST_SIZE)
+    return {"threshold_ms": slow_query_log.threshold_ms, "queries": queries}
+
+@app.get("/api/metrics", include_in_schema=False)
+async def get_metrics(request: Request):
+    if METRICS_TOKEN and not secrets.compare_digest(
+        request.headers.get("authorization", ""), f"Bearer {METRICS_TOKEN}"
+    ):
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        # Several workers: merge the metric files every process writes
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
 if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8001)
\ No newline at end of file
+    import sys
+    
+    if sys.argv[1:2] == ["rebuild-rollups"]:
+        # python server.py rebuild-rollups [year [month]]
+        args = [int(arg) for arg in sys.argv[2:4]]
+        rebuilt = asyncio.run(rebuild_rollups(db, *args))
+        print(f"Rebuilt {rebuilt} rollup documents")
+    elif sys.argv[1:2] in (["archive-month"], ["restore-month"]):
+        # python server.py archive-month|restore-month year month
+        operation = archive_month if sys.argv[1] == "archive-month" else restore_month
+        year, month = int(sys.argv[2]), int(sys.argv[3])
+        print(f"Moved {asyncio.run(operation(db, year, month))} submissions")
+    elif sys.argv[1:2] == ["backfill-masks"]:
+        print(f"Day masks added to {asyncio.run(backfill_day_masks(db))} submissions")
+    elif sys.argv[1:2] == ["backfill-search-terms"]:
+        print(f"Search terms added to {asyncio.run(backfill_search_terms(db))} users")
+    elif WORKERS > 1:
+        import uvicorn
+        
+        # The workers import the app afresh; they share a startup round, the
+        # token secret (else a token from one worker fails on the others) and,
+        # for /api/metrics, a directory for the per-process metric files
+        os.environ['STARTUP_ROUND'] = uuid.uuid4().hex
+        os.environ['TOKEN_SECRET'] = TOKEN_SECRET
+        os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', tempfile.mkdtemp(prefix="leave-metrics-"))
+        uvicorn.run("server:app", host="0.0.0.0", port=8001, workers=WORKERS)
+    else:
+        import uvicorn
+        uvicorn.run(app, host="0.0.0.0", port=8001)
\ No newline at end of file
@@ -0,0 +1,609 @@
+"""Storage backends and the user and submission repositories.
+
+Routes reach users and leave submissions only through ``UserRepository`` and
+``SubmissionRepository``. Two backends implement them:
+
+``mongo``
+    Motor against a real mongod.
+``memory``
+    An in-process mongomock database, for tests and local development only.
+    mongomock is a test double: it scans collections linearly whatever the
+    indexes, runs every call synchronously on the event loop and loses its
+    data on restart. Query times grow with the data and block other
+    requests, so it is not a deployment backend.
+
+Both backends hand out a Motor-compatible database, so index management,
+migrations, rollups, archiving and the smaller collections keep working on
+it directly. The repositories hold the query logic. ``MemorySubmissionRepository``
+overrides only the queries whose operators the in-memory engine lacks.
+"""
+import re
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Any, Dict, List, NamedTuple, Optional, Set, Tuple
+
+from pymongo import ASCENDING, DESCENDING, ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from daymask import day_bit
+
+STORAGE_BACKENDS = ("mongo", "memory")
+
+# Newest month first; _id is the keyset tie-breaker for pagination
+SUBMISSION_SORT = [("year", DESCENDING), ("month", DESCENDING), ("_id", DESCENDING)]
+
+
+def submission_sort_key(submission: Dict[str, Any]) -> Tuple[int, int, Any]:
+    """SUBMISSION_SORT as a Python key; sort with reverse=True."""
+    return submission["year"], submission["month"], submission["_id"]
+
+
+def array_size(field: str) -> Dict[str, Any]:
+    return {"$size": {"$ifNull": [f"${field}", []]}}
+
+
+# Leave days as counted by the analytics routes
+LEAVE_DAYS_EXPR = {"$add": [
+    array_size("monthly_leave_dates"),
+    array_size("optional_leave_dates"),
+    array_size("total_days_off_dates"),
+]}
+
+# Per-month counts monthly_trend() reports
+TREND_COUNTERS = ("submissions", "leave_days", "optional_leave_days", "wfh_days")
+TREND_GROUP = {
+    "_id": {"year": "$year", "month": "$month"},
+    "submissions": {"$sum": 1},
+    "leave_days": {"$sum": LEAVE_DAYS_EXPR},
+    "optional_leave_days": {"$sum": array_size("optional_leave_dates")},
+    "wfh_days": {"$sum": array_size("wfh_dates")},
+}
+
+
+def month_range_filter(start: Tuple[int, int], end: Tuple[int, int]) -> Dict[str, Any]:
+    """Documents whose (year, month) lies between start and end, inclusive."""
+    (start_year, start_month), (end_year, end_month) = start, end
+    if start_year == end_year:
+        return {"year": start_year, "month": {"$gte": start_month, "$lte": end_month}}
+    return {"$or": [
+        {"year": start_year, "month": {"$gte": start_month}},
+        {"year": {"$gt": start_year, "$lt": end_year}},
+        {"year": end_year, "month": {"$lte": end_month}},
+    ]}
+
+
+def trend_by_month(groups) -> Dict[Tuple[int, int], Dict[str, int]]:
+    """Sum $group results keyed by {year, month} into (year, month) -> counts."""
+    trend = {}
+    for group in groups:
+        counts = trend.setdefault((group["_id"]["year"], group["_id"]["month"]), dict.fromkeys(TREND_COUNTERS, 0))
+        for name in TREND_COUNTERS:
+            counts[name] += group[name]
+    return trend
+
+
+# Fields day_status() reports for each person off on a day
+DAY_STATUS_FIELDS = ("user_id", "employee_name", "employee_id", "department")
+DAY_STATUS_MASKS = {
+    "monthly_leave": "monthly_leave_mask",
+    "optional_leave": "optional_leave_mask",
+    "wfh": "wfh_mask",
+}
+
+
+# Employee search matches a prefix of any of these, or of any word of the name
+SEARCH_FIELDS = ("name", "username", "employee_id")
+# Derived field; never returned to clients
+USER_PROJECTION = {"_id": 0, "search_terms": 0}
+EMPLOYEE_PROJECTION = {**USER_PROJECTION, "password": 0}
+
+
+def search_terms(user: Dict[str, Any]) -> List[str]:
+    """The lowercased values stored in a user's search_terms for prefix search."""
+    terms = set()
+    for field in SEARCH_FIELDS:
+        value = str(user.get(field) or "").strip().lower()
+        terms.add(value)
+        if field == "name":
+            terms.update(value.split())
+    terms.discard("")
+    return sorted(terms)
+
+
+def create_client(backend: str, mongo_url: str, **options):
+    if backend == "mongo":
+        import motor.motor_asyncio
+        return motor.motor_asyncio.AsyncIOMotorClient(mongo_url, **options)
+    if backend == "memory":
+        try:
+            from mongomock_motor import AsyncMongoMockClient
+        except ImportError:
+            raise RuntimeError("STORAGE_BACKEND=memory needs the mongomock-motor package")
+        return AsyncMongoMockClient()
+    raise ValueError(f"Unknown storage backend {backend!r}, expected one of {', '.join(STORAGE_BACKENDS)}")
+
+
+class UserRepository(ABC):
+    @abstractmethod
+    async def get(self, user_id: str, fields: Optional[List[str]] = None) -> Optional[Dict[str, Any]]:
+        """The user with this id, all fields (or just ``fields``) without _id."""
+
+    @abstractmethod
+    async def get_active_by_username(self, username: str) -> Optional[Dict[str, Any]]:
+        pass
+
+    @abstractmethod
+    async def get_by_username(self, username: str) -> Optional[Dict[str, Any]]:
+        pass
+
+    @abstractmethod
+    async def get_by_employee_id(self, employee_id: str) -> Optional[Dict[str, Any]]:
+        pass
+
+    @abstractmethod
+    async def taken(self, usernames: List[str], employee_ids: List[str]) -> Tuple[Set[str], Set[str]]:
+        """Which of the given usernames and employee IDs already exist."""
+
+    @abstractmethod
+    async def insert(self, user: Dict[str, Any]):
+        pass
+
+    @abstractmethod
+    async def insert_many(self, users: List[Dict[str, Any]]) -> List[int]:
+        """Insert what can be inserted; return positions rejected as duplicates."""
+
+    @abstractmethod
+    async def replace_password(self, user_id: str, current_hash: str, new_hash: str) -> bool:
+        """Swap the hash unless the password changed since current_hash was read."""
+
+    @abstractmethod
+    async def update_employee(self, employee_id: str, fields: Dict[str, Any]) -> bool:
+        pass
+
+    @abstractmethod
+    async def delete_employee(self, employee_id: str) -> bool:
+        pass
+
+    @abstractmethod
+    async def search_employees(self, query: Optional[str] = None, department: Optional[str] = None,
+                               active: Optional[bool] = None, limit: int = 100,
+                               after: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Up to ``limit`` employees ordered by employee ID, starting after the ``after`` ID.
+
+        ``query`` matches a prefix of the name, any word of it, the username or
+        the employee ID, ignoring case. Rows come without _id and password.
+        """
+
+    @abstractmethod
+    async def find_employees(self, department: Optional[str] = None, employee_ids: Optional[List[str]] = None,
+                             active: Optional[bool] = None, fields: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """Employees matching the filters, ordered by employee ID."""
+
+    @abstractmethod
+    async def count_hr(self) -> int:
+        pass
+
+    @abstractmethod
+    async def backfill_hr_usernames(self, username: str):
+        """Give HR users created before usernames existed the default one."""
+
+    @abstractmethod
+    async def headcount_by_department(self) -> Dict[Optional[str], int]:
+        """Active employees per department."""
+
+
+class SubmissionRepository(ABC):
+    @abstractmethod
+    async def upsert_month(self, key: Dict[str, Any], data: Dict[str, Any], new_id: str) -> Optional[Dict[str, Any]]:
+        """Create or replace the submission for ``key``; return what it replaced."""
+
+    @abstractmethod
+    async def page(self, filter_query: Dict[str, Any], limit: int, after: Optional[Tuple[int, int, Any]] = None,
+                   projection: Optional[Dict[str, int]] = None,
+                   include_archived: bool = False) -> List[Dict[str, Any]]:
+        """Up to ``limit`` submissions, newest month first, after the (year, month, _id) key.
+
+        Only live submissions unless ``include_archived``. Rows keep their _id
+        so the caller can build the next key.
+        """
+
+    @abstractmethod
+    async def get_month(self, user_id: str, year: int, month: int) -> Optional[Dict[str, Any]]:
+        pass
+
+    @abstractmethod
+    async def delete(self, submission_id: str) -> Optional[Dict[str, Any]]:
+        pass
+
+    @abstractmethod
+    async def delete_for_employee(self, employee_id: str) -> List[Dict[str, Any]]:
+        """Delete and return every submission of the employee."""
+
+    @abstractmethod
+    async def delete_month(self, year: int, month: int) -> int:
+        pass
+
+    @abstractmethod
+    async def is_archived(self, year: int, month: int) -> bool:
+        pass
+
+    @abstractmethod
+    async def export_cursor(self, filter_query: Dict[str, Any], year: Optional[int], month: Optional[int],
+                            batch_size: int):
+        """A cursor (to_list / close) over every matching submission, without _id, in SUBMISSION_SORT order."""
+
+    @abstractmethod
+    async def count(self, filter_query: Dict[str, Any], year: Optional[int] = None, month: Optional[int] = None) -> int:
+        pass
+
+    @abstractmethod
+    async def yearly_totals(self, year: int, user_ids: Optional[List[str]] = None) -> Dict[str, Dict[str, int]]:
+        """Per-user leave and WFH totals for a year."""
+
+    @abstractmethod
+    async def top_leave_takers(self, year: int, month: int, top: int) -> List[Dict[str, Any]]:
+        pass
+
+    @abstractmethod
+    async def day_status(self, year: int, month: int, day: int) -> Dict[str, List[Dict[str, Any]]]:
+        """Who is on monthly leave, optional leave or WFH on a day."""
+
+    @abstractmethod
+    async def monthly_trend(self, user_id: str, start: Tuple[int, int],
+                            end: Tuple[int, int]) -> Dict[Tuple[int, int], Dict[str, int]]:
+        """A user's TREND_COUNTERS per (year, month) from start to end; months without a submission are left out."""
+
+
+class MongoUserRepository(UserRepository):
+    def __init__(self, database):
+        self.users = database.users
+
+    async def get(self, user_id, fields=None):
+        projection = {"_id": 0, **{field: 1 for field in fields}} if fields else USER_PROJECTION
+        return await self.users.find_one({"id": user_id}, projection)
+
+    async def get_active_by_username(self, username):
+        return await self.users.find_one({"username": username, "active": True}, USER_PROJECTION)
+
+    async def get_by_username(self, username):
+        return await self.users.find_one({"username": username}, USER_PROJECTION)
+
+    async def get_by_employee_id(self, employee_id):
+        return await self.users.find_one({"employee_id": employee_id}, USER_PROJECTION)
+
+    async def taken(self, usernames, employee_ids):
+        taken_usernames, taken_employee_ids = set(), set()
+        async for user in self.users.find(
+            {"$or": [{"username": {"$in": usernames}}, {"employee_id": {"$in": employee_ids}}]},
+            {"username": 1, "employee_id": 1}
+        ):
+            taken_usernames.add(user.get("username"))
+            taken_employee_ids.add(user.get("employee_id"))
+        return taken_usernames, taken_employee_ids
+
+    async def insert(self, user):
+        # Copies, so neither _id nor search_terms end up in the caller's dict
+        await self.users.insert_one(dict(user, search_terms=search_terms(user)))
+
+    async def insert_many(self, users):
+        try:
+            await self.users.insert_many([dict(user, search_terms=search_terms(user)) for user in users],
+                                         ordered=False)
+        except BulkWriteError as e:
+            return [write_error["index"] for write_error in e.details.get("writeErrors", [])]
+        return []
+
+    async def replace_password(self, user_id, current_hash, new_hash):
+        result = await self.users.update_one(
+            {"id": user_id, "password": current_hash},
+            {"$set": {"password": new_hash}}
+        )
+        return result.matched_count == 1
+
+    async def update_employee(self, employee_id, fields):
+        if any(field in fields for field in SEARCH_FIELDS):
+            current = await self.users.find_one(
+                {"employee_id": employee_id, "role": "employee"}, {field: 1 for field in SEARCH_FIELDS}
+            )
+            if current is None:
+                return False
+            fields = dict(fields, search_terms=search_terms({**current, **fields}))
+        result = await self.users.update_one(
+            {"employee_id": employee_id, "role": "employee"},
+            {"$set": fields}
+        )
+        return result.matched_count == 1
+
+    async def delete_employee(self, employee_id):
+        result = await self.users.delete_one({"employee_id": employee_id, "role": "employee"})
+        return result.deleted_count == 1
+
+    async def search_employees(self, query=None, department=None, active=None, limit=100, after=None):
+        filter_query = {"role": "employee"}
+        if query and query.strip():
+            # Anchored and case-sensitive against lowercased terms, so the index bounds the scan
+            filter_query["search_terms"] = {"$regex": "^" + re.escape(query.strip().lower())}
+        if department:
+            filter_query["department"] = department
+        if active is not None:
+            filter_query["active"] = active
+        if after is not None:
+            filter_query["employee_id"] = {"$gt": after}
+        cursor = self.users.find(filter_query, EMPLOYEE_PROJECTION).sort("employee_id", ASCENDING).limit(limit)
+        return await cursor.to_list(length=None)
+
+    async def find_employees(self, department=None, employee_ids=None, active=None, fields=None):
+        filter_query = {"role": "employee"}
+        if department:
+            filter_query["department"] = department
+        if employee_ids:
+            filter_query["employee_id"] = {"$in": employee_ids}
+        if active is not None:
+            filter_query["active"] = active
+        projection = {"_id": 0, **{field: 1 for field in fields}} if fields else EMPLOYEE_PROJECTION
+        return await self.users.find(filter_query, projection).sort("employee_id", ASCENDING).to_list(length=None)
+
+    async def count_hr(self):
+        return await self.users.count_documents({"role": "hr"})
+
+    async def backfill_hr_usernames(self, username):
+        await self.users.update_many(
+            {"role": "hr", "username": {"$exists": False}},
+            {"$set": {"username": username}}
+        )
+
+    async def headcount_by_department(self):
+        headcount = {}
+        async for group in self.users.aggregate([
+            {"$match": {"role": "employee", "active": True}},
+            {"$group": {"_id": "$department", "count": {"$sum": 1}}},
+        ]):
+            headcount[group["_id"]] = group["count"]
+        return headcount
+
+
+class MergedCursor:
+    """Cursors each sorted by SUBMISSION_SORT, read as one in that order.
+
+    The rows must carry _id for the merge; it is dropped from what
+    to_list() returns.
+    """
+
+    def __init__(self, cursors: list, batch_size: int):
+        self.cursors = cursors
+        self.batch_size = batch_size
+        self._buffers = [deque() for _ in cursors]
+        self._exhausted = [False] * len(cursors)
+
+    async def _fill(self, position: int):
+        if not self._buffers[position] and not self._exhausted[position]:
+            batch = await self.cursors[position].to_list(length=self.batch_size)
+            self._buffers[position].extend(batch)
+            self._exhausted[position] = not batch
+
+    async def to_list(self, length: int) -> List[Dict[str, Any]]:
+        rows = []
+        while len(rows) < length:
+            for position in range(len(self.cursors)):
+                await self._fill(position)
+            heads = [position for position, buffer in enumerate(self._buffers) if buffer]
+            if not heads:
+                break
+            position = max(heads, key=lambda head: submission_sort_key(self._buffers[head][0]))
+            row = self._buffers[position].popleft()
+            row.pop("_id", None)
+            rows.append(row)
+        return rows
+
+    async def close(self):
+        for cursor in self.cursors:
+            await cursor.close()
+
+
+def top_leave_takers_pipeline(month: int, year: int, top: int) -> List[Dict[str, Any]]:
+    return [
+        {"$match": {"month": month, "year": year}},
+        {"$project": {
+            "_id": 0,
+            "user_id": 1,
+            "employee_name": 1,
+            "employee_id": 1,
+            "leave_days": LEAVE_DAYS_EXPR,
+        }},
+        {"$match": {"leave_days": {"$gt": 0}}},
+        {"$sort": {"leave_days": -1, "employee_name": 1}},
+        {"$limit": top},
+    ]
+
+
+class MongoSubmissionRepository(SubmissionRepository):
+    """Live submissions plus the archive of months moved out of them."""
+
+    def __init__(self, database):
+        self.live = database.leave_submissions
+        self.archive = database.leave_submissions_archive
+        self.archived_months = database.archived_months
+
+    async def collections(self, year: Optional[int] = None, month: Optional[int] = None) -> list:
+        """The live collection, plus the archive if any matching month is archived."""
+        query = {}
+        if year:
+            query["year"] = year
+        if month:
+            query["month"] = month
+        if await self.archived_months.find_one(query, {"_id": 1}):
+            return [self.live, self.archive]
+        return [self.live]
+
+    async def upsert_month(self, key, data, new_id):
+        # One atomic upsert against the unique (user_id, year, month) index
+        for attempt in range(2):
+            try:
+                return await self.live.find_one_and_update(
+                    key,
+                    {"$set": data, "$setOnInsert": {"id": new_id}},
+                    upsert=True,
+                    return_document=ReturnDocument.BEFORE
+                )
+            except DuplicateKeyError:
+                # A concurrent upsert inserted first; retrying turns this into an update
+                if attempt:
+                    raise
+
+    async def page(self, filter_query, limit, after=None, projection=None, include_archived=False):
+        collections = [self.live]
+        if include_archived:
+            collections = await self.collections(filter_query.get("year"), filter_query.get("month"))
+        if after:
+            year, month, object_id = after
+            filter_query = {"$and": [filter_query, {"$or": [
+                {"year": {"$lt": year}},
+                {"year": year, "month": {"$lt": month}},
+                {"year": year, "month": month, "_id": {"$lt": object_id}},
+            ]}]}
+        
+        # Archiving keeps _id, so both collections share one keyset order
+        rows = []
+        for collection in collections:
+            rows += await collection.find(filter_query, projection) \
+                .sort(SUBMISSION_SORT).limit(limit).to_list(length=limit)
+        rows.sort(key=submission_sort_key, reverse=True)
+        return rows[:limit]
+
+    async def get_month(self, user_id, year, month):
+        for collection in await self.collections(year, month):
+            submission = await collection.find_one({"user_id": user_id, "month": month, "year": year}, {"_id": 0})
+            if submission:
+                return submission
+        return None
+
+    async def delete(self, submission_id):
+        return await self.live.find_one_and_delete({"id": submission_id}) \
+            or await self.archive.find_one_and_delete({"id": submission_id})
+
+    async def delete_for_employee(self, employee_id):
+        submissions = []
+        for collection in (self.live, self.archive):
+            submissions += await collection.find({"employee_id": employee_id}).to_list(length=None)
+            await collection.delete_many({"employee_id": employee_id})
+        return submissions
+
+    async def delete_month(self, year, month):
+        deleted = 0
+        for collection in (self.live, self.archive):
+            deleted += (await collection.delete_many({"month": month, "year": year})).deleted_count
+        await self.archived_months.delete_one({"month": month, "year": year})
+        return deleted
+
+    async def is_archived(self, year, month):
+        return await self.archived_months.find_one({"year": year, "month": month}, {"_id": 1}) is not None
+
+    async def export_cursor(self, filter_query, year, month, batch_size):
+        collections = await self.collections(year, month)
+        if len(collections) == 1:
+            return self.live.find(filter_query, {"_id": 0}).sort(SUBMISSION_SORT).batch_size(batch_size)
+        # A month being archived can sit in both collections at once, so they're merged row by row
+        return MergedCursor([
+            collection.find(filter_query).sort(SUBMISSION_SORT).batch_size(batch_size) for collection in collections
+        ], batch_size)
+
+    async def count(self, filter_query, year=None, month=None):
+        total = 0
+        for collection in await self.collections(year, month):
+            total += await collection.count_documents(filter_query)
+        return total
+
+    async def yearly_totals(self, year, user_ids=None):
+        match = {"year": year}
+        if user_ids is not None:
+            match["user_id"] = {"$in": user_ids}
+
+        totals = {}
+        for collection in await self.collections(year):
+            async for group in collection.aggregate([
+                {"$match": match},
+                {"$group": {
+                    "_id": "$user_id",
+                    "optional_leaves_used": {"$sum": array_size("optional_leave_dates")},
+                    "monthly_leave_days": {"$sum": array_size("monthly_leave_dates")},
+                    "total_leave_days": {"$sum": LEAVE_DAYS_EXPR},
+                    "wfh_days": {"$sum": array_size("wfh_dates")},
+                    "submissions_count": {"$sum": 1},
+                }},
+            ]):
+                user_totals = totals.setdefault(group.pop("_id"), dict.fromkeys(group, 0))
+                for name, value in group.items():
+                    user_totals[name] += value
+        return totals
+
+    async def top_leave_takers(self, year, month, top):
+        takers = []
+        for collection in await self.collections(year, month):
+            takers += await collection.aggregate(top_leave_takers_pipeline(month, year, top)).to_list(length=top)
+        takers.sort(key=lambda taker: (-taker["leave_days"], taker["employee_name"]))
+        return takers[:top]
+
+    def _day_status_projection(self) -> Dict[str, int]:
+        return {"_id": 0, **{field: 1 for field in DAY_STATUS_FIELDS}, **{mask: 1 for mask in DAY_STATUS_MASKS.values()}}
+
+    def _add_day_status(self, result, submission, day: int):
+        for status, mask in DAY_STATUS_MASKS.items():
+            if submission.get(mask, 0) & day_bit(day):
+                result[status].append({field: submission.get(field) for field in DAY_STATUS_FIELDS})
+
+    async def day_status(self, year, month, day):
+        # The (year, month) index narrows to the month; $bitsAllSet picks the day
+        bit = day - 1
+        result = {status: [] for status in DAY_STATUS_MASKS}
+        for collection in await self.collections(year, month):
+            async for submission in collection.find({
+                "year": year,
+                "month": month,
+                "$or": [{mask: {"$bitsAllSet": [bit]}} for mask in DAY_STATUS_MASKS.values()]
+            }, self._day_status_projection()):
+                self._add_day_status(result, submission, day)
+        return result
+
+    async def monthly_trend(self, user_id, start, end):
+        # One aggregation, reaching into the archive only if part of the range is there
+        match = {"user_id": user_id, **month_range_filter(start, end)}
+        pipeline = [{"$match": match}]
+        if await self.archived_months.find_one(month_range_filter(start, end), {"_id": 1}):
+            pipeline.append({"$unionWith": {"coll": self.archive.name, "pipeline": [{"$match": match}]}})
+        pipeline.append({"$group": TREND_GROUP})
+        return trend_by_month(await self.live.aggregate(pipeline).to_list(length=None))
+
+
+class MemorySubmissionRepository(MongoSubmissionRepository):
+    """The in-memory engine has no bitwise query operators or $unionWith."""
+
+    async def day_status(self, year, month, day):
+        result = {status: [] for status in DAY_STATUS_MASKS}
+        for collection in await self.collections(year, month):
+            async for submission in collection.find({"year": year, "month": month}, self._day_status_projection()):
+                self._add_day_status(result, submission, day)
+        return result
+
+    async def monthly_trend(self, user_id, start, end):
+        match = {"user_id": user_id, **month_range_filter(start, end)}
+        groups = []
+        for collection in (self.live, self.archive):
+            groups += await collection.aggregate([{"$match": match}, {"$group": TREND_GROUP}]).to_list(length=None)
+        return trend_by_month(groups)
+
+
+class Storage(NamedTuple):
+    db: Any
+    users: UserRepository
+    submissions: SubmissionRepository
+
+
+REPOSITORIES = {
+    "mongo": (MongoUserRepository, MongoSubmissionRepository),
+    "memory": (MongoUserRepository, MemorySubmissionRepository),
+}
+
+
+def open_storage(backend: str, database) -> Storage:
+    user_repository, submission_repository = REPOSITORIES[backend]
+    return Storage(database, user_repository(database), submission_repository(database))
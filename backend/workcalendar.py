@@ -0,0 +1,51 @@
+"""Working-day arithmetic for a calendar month.
+
+A region is described by a numpy weekmask (Monday first, "1" = working day)
+and a list of holiday dates. Results are memoised, so each distinct
+(year, month, weekmask, holidays) combination is computed once per process.
+"""
+import calendar
+from functools import lru_cache
+from typing import Iterable, NamedTuple, Tuple
+
+import numpy as np
+
+DEFAULT_WEEKMASK = "1111100"
+
+
+class MonthCalendar(NamedTuple):
+    days_in_month: int
+    working_days: int
+    weekend_days: int
+    holidays: int  # Holidays that fall on what would otherwise be a working day
+
+
+def _month_bounds(year: int, month: int):
+    start = np.datetime64(f"{year:04d}-{month:02d}-01")
+    return start, start + np.timedelta64(calendar.monthrange(year, month)[1], "D")
+
+
+@lru_cache(maxsize=4096)
+def _month_calendar(year: int, month: int, weekmask: str, holidays: Tuple[str, ...]) -> MonthCalendar:
+    start, end = _month_bounds(year, month)
+    days_in_month = int((end - start) / np.timedelta64(1, "D"))
+    weekdays = int(np.busday_count(start, end, weekmask=weekmask))
+    working_days = int(np.busday_count(start, end, weekmask=weekmask, holidays=list(holidays)))
+    return MonthCalendar(
+        days_in_month=days_in_month,
+        working_days=working_days,
+        weekend_days=days_in_month - weekdays,
+        holidays=weekdays - working_days,
+    )
+
+
+def month_calendar(year: int, month: int, weekmask: str = DEFAULT_WEEKMASK,
+                   holidays: Iterable[str] = ()) -> MonthCalendar:
+    # Only this month's holidays matter, which keeps the memo key small
+    prefix = f"{year:04d}-{month:02d}-"
+    month_holidays = tuple(sorted({day for day in holidays if day.startswith(prefix)}))
+    return _month_calendar(year, month, weekmask, month_holidays)
+
+
+def valid_weekmask(weekmask: str) -> bool:
+    return len(weekmask) == 7 and set(weekmask) <= {"0", "1"} and "1" in weekmask
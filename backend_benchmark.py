@@ -0,0 +1,416 @@
+"""Benchmarks for the Leave Management backend.
+
+Usage:
+    python backend_benchmark.py serialization [--submissions 10000]
+    python backend_benchmark.py login [--logins 200] [--concurrency 50]
+    python backend_benchmark.py load [--in-memory] [--employees 1000] [--requests 3000]
+                                     [--save-baseline FILE] [--baseline FILE]
+
+The load benchmark drives the FastAPI app in-process over an ASGI transport,
+so it measures the application and database, not the network. It runs
+against a throwaway database on MONGO_URL, or with --in-memory against
+the in-memory storage backend (see backend/storage.py). In-memory numbers
+say nothing about a deployment: that backend is a test double whose
+queries scan whole collections.
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baseline.json")
+
+
+def make_submissions(count, year=2025):
+    """Realistic all-submissions rows, as stored in leave_submissions."""
+    rng = random.Random(42)
+    submissions = []
+    for i in range(count):
+        month = i % 12 + 1
+        days = [f"{year}-{month:02d}-{day:02d}" for day in rng.sample(range(1, 29), 8)]
+        submissions.append({
+            "id": str(uuid.UUID(int=rng.getrandbits(128))),
+            "user_id": str(uuid.UUID(int=rng.getrandbits(128))),
+            "employee_name": f"Employee {i}",
+            "employee_id": f"EMP{i:05d}",
+            "department": rng.choice(["Engineering", "Sales", "Operations", "Finance"]),
+            "month": month,
+            "year": year,
+            "monthly_leave_dates": days[:2],
+            "optional_leave_dates": days[2:3],
+            "wfh_dates": days[3:7],
+            "additional_hours": f"{days[7]}: 2 hours",
+            "pending_leaves": rng.randint(0, 10),
+            "total_days_off_dates": days[:3],
+            "calculated_total_days_off": 3,
+            "submitted_at": f"{year}-{month:02d}-28T10:00:00",
+        })
+    return submissions
+
+
+def best_of(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return result, min(timings), statistics.median(timings)
+
+
+def bench_serialization(args):
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.responses import JSONResponse, ORJSONResponse
+
+    payload = {"submissions": make_submissions(args.submissions), "next_cursor": None}
+
+    # Before: what a route returning a dict cost (encoder pass + stdlib json).
+    # After: conditional_get handing the dict straight to ORJSONResponse.
+    before, before_best, before_median = best_of(lambda: JSONResponse(jsonable_encoder(payload)).body, args.repeat)
+    after, after_best, after_median = best_of(lambda: ORJSONResponse(payload).body, args.repeat)
+
+    print(f"all-submissions payload: {args.submissions} submissions\n")
+    print(f"{'serializer':<32}{'best ms':>10}{'median ms':>12}")
+    print(f"{'jsonable_encoder + json':<32}{before_best * 1000:>10.1f}{before_median * 1000:>12.1f}")
+    print(f"{'orjson (no encoder pass)':<32}{after_best * 1000:>10.1f}{after_median * 1000:>12.1f}")
+    print(f"speed-up: {before_best / after_best:.1f}x\n")
+
+    sizes = [("identity", len(before), len(after))]
+    sizes.append(("gzip (level 9)", len(gzip.compress(before, 9)), len(gzip.compress(after, 9))))
+    try:
+        import brotli
+        sizes.append(("brotli (quality 4)", len(brotli.compress(before, quality=4)), len(brotli.compress(after, quality=4))))
+    except ImportError:
+        print("brotli not installed; skipping brotli sizes")
+
+    print(f"{'encoding':<32}{'before KiB':>12}{'after KiB':>12}")
+    for name, before_size, after_size in sizes:
+        print(f"{name:<32}{before_size / 1024:>12.1f}{after_size / 1024:>12.1f}")
+
+
+async def _heartbeat(stop, stalls, interval=0.005):
+    """Record how late the event loop wakes a sleeping task."""
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        start = loop.time()
+        await asyncio.sleep(interval)
+        stalls.append(loop.time() - start - interval)
+
+
+async def _login_storm(verify, logins, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one_login():
+        async with semaphore:
+            await verify()
+
+    stop, stalls = asyncio.Event(), []
+    heartbeat = asyncio.create_task(_heartbeat(stop, stalls))
+    start = time.perf_counter()
+    await asyncio.gather(*(one_login() for _ in range(logins)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await heartbeat
+    return logins / elapsed, max(stalls, default=0)
+
+
+def bench_login(args):
+    import auth
+    from concurrent.futures import ThreadPoolExecutor
+
+    stored = auth.hash_password("password123")
+    pool = ThreadPoolExecutor(max_workers=args.workers)
+
+    async def inline():
+        # Verifying on the event loop, as a naive async login would
+        auth.verify_password(stored, "password123")
+
+    async def pooled():
+        # What login does: verification in the password pool
+        await asyncio.get_running_loop().run_in_executor(pool, auth.verify_password, stored, "password123")
+
+    print(f"{args.logins} logins, {args.concurrency} concurrent, {args.workers} pool workers\n")
+    print(f"{'mode':<28}{'logins/s':>10}{'max loop stall ms':>20}")
+    for name, verify in (("verify on event loop", inline), ("verify in password pool", pooled)):
+        throughput, stall = asyncio.run(_login_storm(verify, args.logins, args.concurrency))
+        print(f"{name:<28}{throughput:>10.1f}{stall * 1000:>20.1f}")
+    pool.shutdown()
+
+
+# Load benchmark
+
+DEPARTMENTS = ["Engineering", "Sales", "Operations", "Finance", "Support"]
+BENCH_PASSWORD = "password123"
+
+# (route label, weight); labels are what the report groups by
+WORKLOAD = [
+    ("POST /api/login", 3),
+    ("POST /api/submit-leave", 10),
+    ("GET /api/my-submissions", 15),
+    ("GET /api/analytics/{user_id}", 15),
+    ("GET /api/leave-stats/{user_id}", 5),
+    ("GET /api/all-submissions", 15),
+    ("GET /api/hr-analytics", 10),
+    ("GET /api/hr/employees", 3),
+    ("GET /api/hr/employees?q", 2),
+    ("GET /api/hr/leave-stats", 2),
+    ("GET /api/export-excel", 1),
+]
+
+
+def _submission_doc(user, year, month, rng):
+    from daymask import submission_masks
+
+    days = [f"{year}-{month:02d}-{day:02d}" for day in rng.sample(range(1, 29), 7)]
+    submission = {
+        "id": str(uuid.UUID(int=rng.getrandbits(128))),
+        "user_id": user["id"],
+        "employee_name": user["name"],
+        "employee_id": user["employee_id"],
+        "department": user["department"],
+        "region": user.get("region"),
+        "month": month,
+        "year": year,
+        "monthly_leave_dates": days[:rng.randint(0, 2)],
+        "optional_leave_dates": days[2:2 + rng.randint(0, 1)],
+        "wfh_dates": days[3:3 + rng.randint(0, 4)],
+        "additional_hours": "",
+        "pending_leaves": rng.randint(0, 10),
+        "total_days_off_dates": [],
+        "submitted_at": f"{year}-{month:02d}-28T10:00:00",
+    }
+    submission["calculated_total_days_off"] = len(submission["monthly_leave_dates"]) + len(submission["optional_leave_dates"])
+    submission.update(submission_masks(submission))
+    return submission
+
+
+async def _seed(server, db, args, rng):
+    from auth import hash_password
+
+    # One hash shared by every seeded user; hashing thousands would dominate setup
+    password_hash = hash_password(BENCH_PASSWORD)
+    users = [{
+        "id": str(uuid.UUID(int=rng.getrandbits(128))),
+        "name": f"Employee {i}",
+        "username": f"bench{i}",
+        "employee_id": f"B{i:06d}",
+        "password": password_hash,
+        "role": "employee",
+        "department": DEPARTMENTS[i % len(DEPARTMENTS)],
+        "active": True,
+    } for i in range(args.employees)]
+    users.append({
+        "id": str(uuid.uuid4()), "name": "Bench HR", "username": "benchhr", "employee_id": "BHR",
+        "password": password_hash, "role": "hr", "department": "Human Resources", "active": True,
+    })
+
+    await server.ensure_indexes(db)
+    await db.users.insert_many(users)
+    await server.backfill_search_terms(db)
+    submissions = [
+        _submission_doc(user, args.year, month, rng)
+        for user in users[:-1]
+        for month in range(1, args.months + 1)
+    ]
+    for start in range(0, len(submissions), 5000):
+        await db.leave_submissions.insert_many(submissions[start:start + 5000])
+    await server.rebuild_rollups(db)
+    return users[:-1]
+
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))]
+
+
+def _summarise(samples, elapsed):
+    routes = {}
+    for route, latency, ok in samples:
+        routes.setdefault(route, ([], []))[0 if ok else 1].append(latency)
+    report = {}
+    for route, (latencies, failures) in sorted(routes.items()):
+        latencies.sort()
+        report[route] = {
+            "requests": len(latencies) + len(failures),
+            "errors": len(failures),
+            "p50_ms": round(_percentile(latencies, 0.50) * 1000, 2),
+            "p95_ms": round(_percentile(latencies, 0.95) * 1000, 2),
+            "p99_ms": round(_percentile(latencies, 0.99) * 1000, 2),
+            "throughput_rps": round((len(latencies) + len(failures)) / elapsed, 1),
+        }
+    return report
+
+
+async def _run_load(args):
+    import httpx
+    import server
+
+    from storage import create_client
+
+    backend = "memory" if args.in_memory else "mongo"
+    client = create_client(backend, os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+    database_name = f"leave_management_bench_{uuid.uuid4().hex[:8]}"
+    db = client[database_name]
+    # Point the routes and repositories at the throwaway database
+    server.use_database(db, backend)
+
+    rng = random.Random(args.seed)
+    try:
+        setup_start = time.perf_counter()
+        employees = await _seed(server, db, args, rng)
+        print(f"Seeded {len(employees)} employees x {args.months} months in {time.perf_counter() - setup_start:.1f}s")
+
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as http:
+            async def login(username):
+                response = await http.post("/api/login", json={"username": username, "password": BENCH_PASSWORD})
+                response.raise_for_status()
+                return {"Authorization": f"Bearer {response.json()['token']}"}
+
+            hr = await login("benchhr")
+            # A pool of signed-in employees; the login route is still exercised in the mix
+            sessions = [(employee, await login(employee["username"])) for employee in rng.sample(employees, min(50, len(employees)))]
+
+            def request_for(route):
+                employee, headers = rng.choice(sessions)
+                month = rng.randint(1, args.months)
+                if route == "POST /api/login":
+                    return "POST", "/api/login", {"json": {"username": rng.choice(employees)["username"], "password": BENCH_PASSWORD}}
+                if route == "POST /api/submit-leave":
+                    days = [f"{args.year}-{month:02d}-{day:02d}" for day in rng.sample(range(1, 29), 4)]
+                    return "POST", "/api/submit-leave", {"headers": headers, "json": {
+                        "month": month, "year": args.year, "monthly_leave_dates": days[:1], "optional_leave_dates": [],
+                        "wfh_dates": days[1:], "additional_hours": "", "pending_leaves": 0, "total_days_off_dates": [],
+                    }}
+                if route == "GET /api/my-submissions":
+                    return "GET", "/api/my-submissions", {"headers": headers, "params": {"year": args.year}}
+                if route == "GET /api/analytics/{user_id}":
+                    return "GET", f"/api/analytics/{employee['id']}", {"headers": headers, "params": {"month": month, "year": args.year}}
+                if route == "GET /api/leave-stats/{user_id}":
+                    return "GET", f"/api/leave-stats/{employee['id']}", {"headers": headers, "params": {"year": args.year}}
+                if route == "GET /api/all-submissions":
+                    return "GET", "/api/all-submissions", {"headers": hr, "params": {"month": month, "year": args.year}}
+                if route == "GET /api/hr-analytics":
+                    return "GET", "/api/hr-analytics", {"headers": hr, "params": {"month": month, "year": args.year}}
+                if route == "GET /api/hr/employees":
+                    return "GET", "/api/hr/employees", {"headers": hr}
+                if route == "GET /api/hr/employees?q":
+                    return "GET", "/api/hr/employees", {"headers": hr, "params": {"q": employee["name"].split()[-1][:2]}}
+                if route == "GET /api/hr/leave-stats":
+                    return "GET", "/api/hr/leave-stats", {"headers": hr, "params": {"year": args.year}}
+                return "GET", "/api/export-excel", {"headers": hr, "params": {"month": month, "year": args.year, "format": "csv"}}
+
+            routes = [route for route, _ in WORKLOAD]
+            weights = [weight for _, weight in WORKLOAD]
+            plan = rng.choices(routes, weights=weights, k=args.requests)
+            samples = []
+
+            async def worker(queue):
+                while queue:
+                    route = queue.pop()
+                    method, url, kwargs = request_for(route)
+                    start = time.perf_counter()
+                    response = await http.request(method, url, **kwargs)
+                    samples.append((route, time.perf_counter() - start, response.status_code < 400))
+
+            print(f"Running {args.requests} requests with concurrency {args.concurrency}...")
+            start = time.perf_counter()
+            await asyncio.gather(*(worker(plan) for _ in range(args.concurrency)))
+            elapsed = time.perf_counter() - start
+    finally:
+        await client.drop_database(database_name)
+
+    return _summarise(samples, elapsed), len(samples) / elapsed
+
+
+def _load_meta(args):
+    return {
+        "backend": "in-memory" if args.in_memory else "mongod",
+        "employees": args.employees,
+        "months": args.months,
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def bench_load(args):
+    report, overall = asyncio.run(_run_load(args))
+
+    baseline = None
+    if args.baseline and os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline["meta"] != _load_meta(args):
+            print(f"Baseline was recorded with different settings: {baseline['meta']}\n")
+
+    print(f"\n{'route':<34}{'reqs':>6}{'errs':>6}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'req/s':>8}{'p95 vs base':>13}")
+    regressions = []
+    for route, stats in report.items():
+        change = ""
+        if baseline and route in baseline["routes"]:
+            base_p95 = baseline["routes"][route]["p95_ms"]
+            ratio = stats["p95_ms"] / base_p95 if base_p95 else 1.0
+            change = f"{(ratio - 1) * 100:+.0f}%"
+            if ratio > 1 + args.tolerance:
+                regressions.append(route)
+                change += " !"
+        print(f"{route:<34}{stats['requests']:>6}{stats['errors']:>6}{stats['p50_ms']:>9.1f}{stats['p95_ms']:>9.1f}"
+              f"{stats['p99_ms']:>9.1f}{stats['throughput_rps']:>8.1f}{change:>13}")
+    print(f"\noverall throughput: {overall:.1f} req/s")
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump({"meta": _load_meta(args), "routes": report}, f, indent=2)
+            f.write("\n")
+        print(f"Baseline saved to {args.save_baseline}")
+
+    if regressions:
+        print(f"p95 regressed by more than {args.tolerance:.0%} on: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subcommands = parser.add_subparsers(dest="benchmark", required=True)
+
+    serialization = subcommands.add_parser("serialization", help="JSON encoding time and bytes on the wire")
+    serialization.add_argument("--submissions", type=int, default=10000)
+    serialization.add_argument("--repeat", type=int, default=5)
+    serialization.set_defaults(func=bench_serialization)
+
+    login = subcommands.add_parser("login", help="Password verification throughput and event loop stalls")
+    login.add_argument("--logins", type=int, default=200)
+    login.add_argument("--concurrency", type=int, default=50)
+    login.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    login.set_defaults(func=bench_login)
+
+    load = subcommands.add_parser("load", help="Concurrent request mix with per-route latency percentiles")
+    load.add_argument("--in-memory", action="store_true", help="Use the in-memory storage backend instead of MONGO_URL")
+    load.add_argument("--employees", type=int, default=1000)
+    load.add_argument("--months", type=int, default=12)
+    load.add_argument("--year", type=int, default=2025)
+    load.add_argument("--requests", type=int, default=3000)
+    load.add_argument("--concurrency", type=int, default=32)
+    load.add_argument("--seed", type=int, default=42)
+    load.add_argument("--baseline", default=DEFAULT_BASELINE, help="Compare p95 latencies against this file")
+    load.add_argument("--save-baseline", metavar="FILE", help="Write this run's results as the new baseline")
+    load.add_argument("--tolerance", type=float, default=0.25, help="Allowed p95 increase before failing")
+    load.set_defaults(func=bench_load)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
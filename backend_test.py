@@ -2,6 +2,7 @@ import requests
 import json
 import sys
 import random
+import time
 import string
 from datetime import datetime
 
@@ -241,6 +242,70 @@ class LeaveManagementTester:
             200
         )
 
+    def test_get_all_submissions_paginated(self):
+        """Test keyset pagination and field projection on all submissions (HR only)"""
+        success, response = self.run_test(
+            "Get all submissions (first page)",
+            "GET",
+            "all-submissions",
+            200,
+            params={"limit": 1, "fields": "employee_name"}
+        )
+        
+        if not success:
+            return False
+        
+        rows = response.get('submissions', [])
+        unexpected = [key for row in rows for key in row if key not in ("id", "year", "month", "employee_name")]
+        self.log_result(
+            "Verify submissions projection",
+            len(rows) <= 1 and not unexpected,
+            f"Rows: {len(rows)}, unexpected fields: {unexpected}"
+        )
+        
+        if response.get('next_cursor'):
+            success, next_page = self.run_test(
+                "Get all submissions (next page)",
+                "GET",
+                "all-submissions",
+                200,
+                params={"limit": 1, "cursor": response['next_cursor']}
+            )
+            if success and next_page.get('submissions') and rows:
+                self.log_result(
+                    "Verify next page does not repeat rows",
+                    next_page['submissions'][0]['id'] != rows[0]['id'],
+                    f"First page: {rows[0]['id']}, next page: {next_page['submissions'][0]['id']}"
+                )
+        
+        return self.run_test(
+            "Get all submissions with invalid cursor",
+            "GET",
+            "all-submissions",
+            400,
+            params={"cursor": "not-a-cursor"}
+        )[0]
+
+    def test_conditional_get(self):
+        """Test ETag / If-None-Match on all submissions (HR only)"""
+        url = f"{self.base_url}/api/all-submissions"
+        headers = {'Authorization': f'Bearer {self.token}'}
+        
+        try:
+            first = requests.get(url, headers=headers)
+            etag = first.headers.get('ETag')
+            if not etag:
+                return self.log_result("Conditional GET", False, "No ETag header returned")
+            
+            second = requests.get(url, headers={**headers, 'If-None-Match': etag})
+            return self.log_result(
+                "Conditional GET returns 304 for unchanged data",
+                second.status_code == 304,
+                f"Status: {second.status_code}"
+            )
+        except Exception as e:
+            return self.log_result("Conditional GET", False, f"Error: {str(e)}")
+
     def test_export_excel(self):
         """Test Excel export functionality (HR only)"""
         return self.run_test(
@@ -250,6 +315,43 @@ class LeaveManagementTester:
             200
         )
 
+    def test_export_job(self):
+        """Test background export job from creation to download (HR only)"""
+        success, job = self.run_test(
+            "Create export job",
+            "POST",
+            "export-jobs",
+            202,
+            data={"format": "csv", "year": 2025}
+        )
+        if not success:
+            return False
+        
+        try:
+            status = job
+            for _ in range(30):
+                if status["status"] in ("done", "failed"):
+                    break
+                time.sleep(1)
+                status = requests.get(
+                    f"{self.base_url}/api/export-jobs/{job['id']}",
+                    headers={'Authorization': f'Bearer {self.token}'}
+                ).json()
+            if status["status"] != "done":
+                return self.log_result("Export job finishes", False, f"Status: {status['status']}")
+            
+            download = requests.get(
+                f"{self.base_url}{status['download_url']}",
+                headers={'Authorization': f'Bearer {self.token}'}
+            )
+            return self.log_result(
+                "Download finished export job",
+                download.status_code == 200 and len(download.content) > 0,
+                f"Status: {download.status_code}, {status['processed']}/{status['total']} rows"
+            )
+        except Exception as e:
+            return self.log_result("Export job", False, f"Error: {str(e)}")
+
     def test_leave_stats(self, user_id, year):
         """Test leave statistics endpoint"""
         return self.run_test(
@@ -293,6 +395,49 @@ class LeaveManagementTester:
             200
         )
 
+    def test_trend_analytics(self, start, end):
+        """Test per-month trend for the whole company over a range of months"""
+        success, response = self.run_test(
+            "Get company trend",
+            "GET",
+            f"trend-analytics?start={start}&end={end}",
+            200
+        )
+        
+        if success:
+            months = response.get('months', [])
+            self.log_result(
+                "Verify trend has one entry per month",
+                len(months) == 12 and months[0]['month'] == 1 and months[-1]['month'] == 12,
+                f"{len(months)} months returned"
+            )
+        
+        return success, response
+
+    def test_all_leave_stats(self, year):
+        """Test batched leave statistics for all employees (HR only)"""
+        success, response = self.run_test(
+            "Get leave statistics for all employees",
+            "GET",
+            "hr/leave-stats",
+            200,
+            params={"year": year}
+        )
+        
+        if success:
+            employees = response.get('employees', [])
+            consistent = all(
+                emp['remaining_optional_leaves'] == max(0, emp['optional_leave_quota'] - emp['total_optional_leaves_used'])
+                for emp in employees
+            )
+            self.log_result(
+                "Verify remaining optional leaves against quota",
+                consistent,
+                f"{len(employees)} employees checked"
+            )
+        
+        return success, response
+
     def test_unauthorized_access(self):
         """Test unauthorized access to HR endpoints"""
         # First login as HR to create an employee
@@ -334,6 +479,47 @@ class LeaveManagementTester:
         
         return success and success2
 
+    def test_forged_token(self):
+        """Test that unsigned or tampered tokens are rejected"""
+        saved_token = self.token
+        
+        # The pre-signing token format must no longer be accepted
+        self.token = json.dumps({"id": self.user["id"] if self.user else "x", "role": "hr"})
+        plain_json, _ = self.run_test("Access with unsigned JSON token", "GET", "hr/employees", 401)
+        
+        tampered = False
+        if saved_token and "." in saved_token:
+            payload, signature = saved_token.split(".", 1)
+            self.token = f"{payload[:-1]}{'A' if payload[-1] != 'A' else 'B'}.{signature}"
+            tampered, _ = self.run_test("Access with tampered token", "GET", "hr/employees", 401)
+        
+        self.token = saved_token
+        return plain_json and tampered
+
+    def test_revoked_token(self):
+        """Test that an existing token stops working as soon as access is revoked"""
+        if not self.test_login("tejasartificial", "Tejas#2377"):
+            return False
+        hr_token = self.token
+        
+        username = f"user{random.randint(1000, 9999)}"
+        emp_id = f"EMP{random.randint(1000, 9999)}"
+        self.test_create_employee(username, emp_id, "password123", "Test Department")
+        
+        if not self.test_login(username, "password123"):
+            return False
+        employee_token = self.token
+        self.run_test("Employee token works before revocation", "GET", "my-submissions", 200)
+        
+        self.token = hr_token
+        self.test_revoke_access(emp_id)
+        
+        self.token = employee_token
+        result = self.run_test("Employee token rejected after revocation", "GET", "my-submissions", 401)[0]
+        
+        self.token = hr_token
+        return result
+
     # HR Management Endpoints Tests
     def test_create_employee(self, username=None, employee_id=None, password=None, department=None):
         """Test creating a new employee with username field"""
@@ -432,7 +618,7 @@ class LeaveManagementTester:
         return success, response
 
     def test_get_employees(self):
-        """Test retrieving all employees"""
+        """Test the employee list and searching it"""
         success, response = self.run_test(
             "Get all employees",
             "GET",
@@ -440,7 +626,22 @@ class LeaveManagementTester:
             200
         )
         
-        # Verify our created employee is in the list
+        if success:
+            self.log_result(
+                "Employee list is paginated",
+                "next_cursor" in response,
+                f"next_cursor: {response.get('next_cursor')}"
+            )
+        
+        # Verify our created employee is found by an employee ID prefix search
+        if success and self.created_employee_id:
+            success, response = self.run_test(
+                "Search employees by employee ID",
+                "GET",
+                "hr/employees",
+                200,
+                params={"q": self.created_employee_id.lower()}
+            )
         if success and self.created_employee_id:
             found = False
             for emp in response.get('employees', []):
@@ -787,6 +988,21 @@ class LeaveManagementTester:
         # Test HR analytics
         self.test_hr_analytics(2, 2025)
         
+        # Test twelve-month trend
+        self.test_trend_analytics("2025-01", "2025-12")
+        
+        # Test paginated submission list
+        self.test_get_all_submissions_paginated()
+        
+        # Test batched leave statistics
+        self.test_all_leave_stats(2025)
+        
+        # Test ETag revalidation
+        self.test_conditional_get()
+        
+        # Test background export job
+        self.test_export_job()
+        
         return True
 
     def run_security_tests(self):
@@ -796,6 +1012,10 @@ class LeaveManagementTester:
         # Test unauthorized access to HR endpoints
         self.test_unauthorized_access()
         
+        # Test token signing and revocation
+        self.test_forged_token()
+        self.test_revoked_token()
+        
         # Test inactive user login (already tested in authentication tests)
         
         return True
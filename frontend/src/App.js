@@ -3,6 +3,15 @@ import { PieChart, Pie, Cell, ResponsiveContainer, BarChart, Bar, XAxis, YAxis,
 import './App.css';
 
 const API_BASE_URL = process.env.REACT_APP_BACKEND_URL || 'http://localhost:8001';
+const HR_SUBMISSION_FIELDS = [
+  'employee_name', 'employee_id', 'monthly_leave_dates', 'optional_leave_dates', 'wfh_dates',
+  'additional_hours', 'pending_leaves', 'total_days_off_dates', 'calculated_total_days_off', 'submitted_at',
+].join(',');
+
+// How long to wait before reopening a dropped live-update stream
+const LIVE_RETRY_MS = 3000;
+// Typing pause before the employee list is searched again
+const EMPLOYEE_SEARCH_DEBOUNCE_MS = 300;
 
 const COLORS = {
   working: '#10b981',
@@ -43,6 +52,13 @@ function App() {
 
   // HR Management state
   const [employees, setEmployees] = useState([]);
+  const [employeesCursor, setEmployeesCursor] = useState(null);
+  const [employeeSearch, setEmployeeSearch] = useState({
+    q: '',
+    department: '',
+    active: ''  // '', 'true' or 'false'
+  });
+  const employeesRequest = useRef(0);
   const [showCreateEmployee, setShowCreateEmployee] = useState(false);
   const [showCreateHR, setShowCreateHR] = useState(false);  // Add HR creation modal state
   const [newEmployee, setNewEmployee] = useState({
@@ -62,6 +78,8 @@ function App() {
 
   // Submissions state
   const [submissions, setSubmissions] = useState([]);
+  const [submissionsCursor, setSubmissionsCursor] = useState(null);
+  const submissionsRequest = useRef(0);
   const [leaveStats, setLeaveStats] = useState(null);
   const [analytics, setAnalytics] = useState(null);
   const [hrAnalytics, setHrAnalytics] = useState(null);
@@ -69,11 +87,11 @@ function App() {
   // Refs for date inputs
   const dateInputRefs = useRef({});
 
-  // Initialize user from token
+  // Initialize user saved at login; the token itself is opaque
   useEffect(() => {
     if (token) {
       try {
-        const userData = JSON.parse(token);
+        const userData = JSON.parse(localStorage.getItem('user'));
         setUser(userData);
         if (userData.role === 'employee') {
           fetchMySubmissions();
@@ -82,7 +100,6 @@ function App() {
         } else if (userData.role === 'hr') {
           fetchAllSubmissions();
           fetchHrAnalytics(filter.month, filter.year);
-          fetchEmployees();
         }
       } catch (error) {
         console.error('Invalid token:', error);
@@ -91,6 +108,21 @@ function App() {
     }
   }, [token]);
 
+  // HR: follow live submission events for the filtered month instead of polling
+  useEffect(() => {
+    if (!token || !user || user.role !== 'hr') return undefined;
+    const controller = new AbortController();
+    followHrEvents(controller.signal);
+    return () => controller.abort();
+  }, [token, user, filter]);
+
+  // HR: reload the first page of employees whenever the search changes
+  useEffect(() => {
+    if (!token || !user || user.role !== 'hr') return undefined;
+    const timer = setTimeout(() => fetchEmployees(), EMPLOYEE_SEARCH_DEBOUNCE_MS);
+    return () => clearTimeout(timer);
+  }, [token, user, employeeSearch]);
+
   // Update data when filter changes
   useEffect(() => {
     if (user) {
@@ -121,6 +153,7 @@ function App() {
         setToken(data.token);
         setUser(data.user);
         localStorage.setItem('token', data.token);
+        localStorage.setItem('user', JSON.stringify(data.user));
         setLoginData({ username: '', password: '' });
       } else {
         alert('❌ Invalid credentials');
@@ -136,44 +169,51 @@ function App() {
     setToken(null);
     setUser(null);
     localStorage.removeItem('token');
+    localStorage.removeItem('user');
     setActiveTab('dashboard');
   };
 
-  const fetchMySubmissions = async () => {
+  // One page of a submission list: without a cursor the list restarts from
+  // the first page, with one the page is appended ("Load more")
+  const fetchSubmissionPage = async (endpoint, params, cursor) => {
+    const request = ++submissionsRequest.current;
+    // Months HR has archived stay in the history
+    params.append('include_archived', 'true');
+    if (cursor) params.append('cursor', cursor);
+    const response = await fetch(`${API_BASE_URL}/api/${endpoint}?${params}`, {
+      headers: {
+        'Authorization': `Bearer ${token}`,
+      },
+    });
+    // A newer filter has been applied since; its results win
+    if (response.ok && request === submissionsRequest.current) {
+      const data = await response.json();
+      setSubmissions(prev => (cursor ? [...prev, ...data.submissions] : data.submissions));
+      setSubmissionsCursor(data.next_cursor);
+    }
+  };
+
+  const fetchMySubmissions = async (cursor = null) => {
     try {
       const params = new URLSearchParams();
       if (filter.month) params.append('month', filter.month);
       if (filter.year) params.append('year', filter.year);
       
-      const response = await fetch(`${API_BASE_URL}/api/my-submissions?${params}`, {
-        headers: {
-          'Authorization': `Bearer ${token}`,
-        },
-      });
-      if (response.ok) {
-        const data = await response.json();
-        setSubmissions(data.submissions);
-      }
+      await fetchSubmissionPage('my-submissions', params, cursor);
     } catch (error) {
       console.error('Error fetching submissions:', error);
     }
   };
 
-  const fetchAllSubmissions = async () => {
+  const fetchAllSubmissions = async (cursor = null) => {
     try {
       const params = new URLSearchParams();
       if (filter.month) params.append('month', filter.month);
       if (filter.year) params.append('year', filter.year);
+      // Only the columns the HR table renders
+      params.append('fields', HR_SUBMISSION_FIELDS);
       
-      const response = await fetch(`${API_BASE_URL}/api/all-submissions?${params}`, {
-        headers: {
-          'Authorization': `Bearer ${token}`,
-        },
-      });
-      if (response.ok) {
-        const data = await response.json();
-        setSubmissions(data.submissions);
-      }
+      await fetchSubmissionPage('all-submissions', params, cursor);
     } catch (error) {
       console.error('Error fetching all submissions:', error);
     }
@@ -227,17 +267,100 @@ function App() {
     }
   };
 
+  // Server-Sent Events over fetch, so the request can carry the bearer token
+  const followHrEvents = async (signal) => {
+    let reconnecting = false;
+    while (!signal.aborted) {
+      try {
+        const response = await fetch(`${API_BASE_URL}/api/hr/events`, {
+          headers: {
+            'Authorization': `Bearer ${token}`,
+          },
+          signal,
+        });
+        if (!response.ok) return;
+        
+        // Catch up on whatever happened while the stream was down
+        if (reconnecting) {
+          fetchAllSubmissions();
+          fetchHrAnalytics(filter.month, filter.year);
+        }
+        
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        while (true) {
+          const { value, done } = await reader.read();
+          if (done) break;
+          buffer += decoder.decode(value, { stream: true });
+          const messages = buffer.split('\n\n');
+          buffer = messages.pop();
+          messages.forEach(handleHrEventMessage);
+        }
+      } catch (error) {
+        if (signal.aborted) return;
+        console.error('Live updates interrupted:', error);
+      }
+      reconnecting = true;
+      await new Promise(resolve => setTimeout(resolve, LIVE_RETRY_MS));
+    }
+  };
+
+  const handleHrEventMessage = (message) => {
+    let type = 'message';
+    let data = '';
+    message.split('\n').forEach(line => {
+      if (line.startsWith('event: ')) type = line.slice(7);
+      if (line.startsWith('data: ')) data += line.slice(6);
+    });
+    if (!data) return;  // Retry hints and keepalives
+    
+    const event = JSON.parse(data);
+    if (type !== 'submission' || !event.submission) {
+      // Whole months deleted, or a change without details: reload the view
+      fetchAllSubmissions();
+      fetchHrAnalytics(filter.month, filter.year);
+      return;
+    }
+    
+    const { submission, totals } = event;
+    if (submission.month !== filter.month || submission.year !== filter.year) return;
+    
+    setSubmissions(prev => {
+      const others = prev.filter(existing => existing.id !== submission.id);
+      return event.action === 'deleted' ? others : [submission, ...others];
+    });
+    setHrAnalytics(prev => prev && {
+      ...prev,
+      employees_submitted: totals.employees_submitted,
+      total_leave_days: totals.total_leave_days,
+      total_wfh_days: totals.total_wfh_days,
+      submission_rate: prev.total_employees > 0
+        ? Math.round((totals.employees_submitted / prev.total_employees) * 1000) / 10
+        : 0,
+    });
+  };
+
   // HR Management Functions
-  const fetchEmployees = async () => {
+  // Without a cursor the list restarts from the first page; with one the page is appended
+  const fetchEmployees = async (cursor = null) => {
+    const request = ++employeesRequest.current;
+    const params = new URLSearchParams();
+    Object.entries(employeeSearch).forEach(([key, value]) => {
+      if (value.trim()) params.set(key, value.trim());
+    });
+    if (cursor) params.set('cursor', cursor);
     try {
-      const response = await fetch(`${API_BASE_URL}/api/hr/employees`, {
+      const response = await fetch(`${API_BASE_URL}/api/hr/employees?${params}`, {
         headers: {
           'Authorization': `Bearer ${token}`,
         },
       });
-      if (response.ok) {
+      // A newer search has been sent since; its results win
+      if (response.ok && request === employeesRequest.current) {
         const data = await response.json();
-        setEmployees(data.employees);
+        setEmployees(prev => (cursor ? [...prev, ...data.employees] : data.employees));
+        setEmployeesCursor(data.next_cursor);
       }
     } catch (error) {
       console.error('Error fetching employees:', error);
@@ -881,6 +1004,18 @@ function App() {
                 ))
               )}
             </div>
+            {submissionsCursor && (
+              <div className="mt-6 text-center">
+                <button
+                  onClick={() => (user.role === 'hr'
+                    ? fetchAllSubmissions(submissionsCursor)
+                    : fetchMySubmissions(submissionsCursor))}
+                  className="bg-gray-100 text-gray-700 px-6 py-2 rounded-lg hover:bg-gray-200 transition-colors duration-200 font-medium"
+                >
+                  Load more
+                </button>
+              </div>
+            )}
           </div>
         )}
 
@@ -1212,6 +1347,33 @@ function App() {
               </div>
             )}
 
+            {/* Employee Search */}
+            <div className="mb-4 flex flex-col sm:flex-row gap-3">
+              <input
+                type="search"
+                value={employeeSearch.q}
+                onChange={(e) => setEmployeeSearch(prev => ({...prev, q: e.target.value}))}
+                className="flex-1 px-3 py-2 border border-gray-300 rounded-lg focus:ring-2 focus:ring-indigo-500 bg-white"
+                placeholder="Search by name, username or employee ID"
+              />
+              <input
+                type="text"
+                value={employeeSearch.department}
+                onChange={(e) => setEmployeeSearch(prev => ({...prev, department: e.target.value}))}
+                className="px-3 py-2 border border-gray-300 rounded-lg focus:ring-2 focus:ring-indigo-500 bg-white"
+                placeholder="Department"
+              />
+              <select
+                value={employeeSearch.active}
+                onChange={(e) => setEmployeeSearch(prev => ({...prev, active: e.target.value}))}
+                className="px-3 py-2 border border-gray-300 rounded-lg focus:ring-2 focus:ring-indigo-500 bg-white"
+              >
+                <option value="">All employees</option>
+                <option value="true">Active</option>
+                <option value="false">Inactive</option>
+              </select>
+            </div>
+
             {/* Employees List */}
             <div className="grid gap-4">
               {employees.length === 0 ? (
@@ -1220,7 +1382,11 @@ function App() {
                     <span className="text-4xl">👤</span>
                   </div>
                   <h3 className="text-lg font-medium text-gray-900 mb-2">No employees found</h3>
-                  <p className="text-gray-500">Create your first employee to get started</p>
+                  <p className="text-gray-500">
+                    {Object.values(employeeSearch).some(value => value.trim())
+                      ? 'No employees match the search'
+                      : 'Create your first employee to get started'}
+                  </p>
                 </div>
               ) : (
                 employees.map((employee) => (
@@ -1265,6 +1431,16 @@ function App() {
                 ))
               )}
             </div>
+            {employeesCursor && (
+              <div className="mt-6 text-center">
+                <button
+                  onClick={() => fetchEmployees(employeesCursor)}
+                  className="bg-gray-100 text-gray-700 px-6 py-2 rounded-lg hover:bg-gray-200 transition-colors duration-200 font-medium"
+                >
+                  Load more
+                </button>
+              </div>
+            )}
           </div>
         )}
 
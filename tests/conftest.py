@@ -0,0 +1,116 @@
+import os
+import sys
+import uuid
+
+import pytest
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend")
+sys.path.insert(0, BACKEND_DIR)
+
+MONGO_URL = os.environ.get("MONGO_URL", "mongodb://localhost:27017")
+
+
+@pytest.fixture
+def mongo_db_name():
+    """Name of a throwaway database on the local mongod, dropped afterwards."""
+    client = MongoClient(MONGO_URL, serverSelectionTimeoutMS=500)
+    try:
+        client.admin.command("ping")
+    except PyMongoError:
+        pytest.skip(f"mongod not reachable at {MONGO_URL}")
+
+    name = f"leave_management_test_{uuid.uuid4().hex[:8]}"
+    yield name
+    client.drop_database(name)
+    client.close()
+
+
+@pytest.fixture
+def memory_db(monkeypatch):
+    """An empty in-process database, installed as server.db with its repositories as server.store."""
+    pytest.importorskip("mongomock_motor")
+    import server
+    from storage import create_client
+
+    database = create_client("memory", server.MONGO_URL)["leave_management_test"]
+    monkeypatch.setattr(server, "db", database)
+    monkeypatch.setattr(server, "store", server.open_storage("memory", database))
+    # The in-memory engine takes no storage engine options
+    monkeypatch.setattr(server, "ARCHIVE_COMPRESSOR", "")
+    # No write is in flight when a test starts a rollup rebuild
+    monkeypatch.setattr(server, "ROLLUP_REBUILD_SETTLE_SECONDS", 0)
+    return database
+
+
+@pytest.fixture(params=["memory", "mongo"])
+def backend_db(request, monkeypatch):
+    """Like memory_db, once per storage backend; the mongo run needs a local mongod."""
+    if request.param == "memory":
+        yield request.getfixturevalue("memory_db")
+        return
+
+    import motor.motor_asyncio
+    import server
+
+    client = motor.motor_asyncio.AsyncIOMotorClient(server.MONGO_URL)
+    database = client[request.getfixturevalue("mongo_db_name")]
+    monkeypatch.setattr(server, "db", database)
+    monkeypatch.setattr(server, "store", server.open_storage("mongo", database))
+    monkeypatch.setattr(server, "ROLLUP_REBUILD_SETTLE_SECONDS", 0)
+    yield database
+    client.close()
+
+
+def _make_user(i, department="Engineering", **fields):
+    user = {
+        "id": f"user-{i}",
+        "name": f"Employee {i}",
+        "username": f"employee{i}",
+        "employee_id": f"EMP{i:04d}",
+        "password": "hash",
+        "role": "employee",
+        "department": department,
+        "active": True,
+    }
+    user.update(fields)
+    return user
+
+
+def _make_submission(user, month=2, year=2025, leave_dates=(), optional_dates=(), wfh_dates=(),
+                     days_off_dates=(), **fields):
+    from daymask import submission_masks
+
+    submission = {
+        "id": f"{user['id']}-{year}-{month}",
+        "user_id": user["id"],
+        "employee_name": user["name"],
+        "employee_id": user["employee_id"],
+        "department": user.get("department"),
+        "region": user.get("region"),
+        "month": month,
+        "year": year,
+        "monthly_leave_dates": list(leave_dates),
+        "optional_leave_dates": list(optional_dates),
+        "wfh_dates": list(wfh_dates),
+        "additional_hours": "",
+        "pending_leaves": 0,
+        "total_days_off_dates": list(days_off_dates),
+        "submitted_at": f"{year}-{month:02d}-28T10:00:00",
+    }
+    submission.update(fields)
+    submission.update(submission_masks(submission))
+    return submission
+
+
+@pytest.fixture
+def make_user():
+    """make_user(i, department="Engineering", **fields): an employee document."""
+    return _make_user
+
+
+@pytest.fixture
+def make_submission():
+    """make_submission(user, month=2, year=2025, leave_dates=(), ...): a stored submission with its day masks."""
+    return _make_submission
@@ -0,0 +1,111 @@
+import asyncio
+
+from bson import ObjectId
+
+import server
+
+
+def test_archived_months_move_out_and_stay_readable(backend_db, make_user, make_submission, monkeypatch):
+    monkeypatch.setattr(server, "ARCHIVE_BATCH_SIZE", 3)
+    monkeypatch.setattr(server, "ARCHIVE_BATCH_PAUSE_SECONDS", 0)
+
+    async def scenario():
+        db = backend_db
+        await server.ensure_archive_collection(db)
+        await server.ensure_indexes(db)
+        await db.leave_submissions.insert_many([
+            make_submission(make_user(i), month, 2024, leave_dates=[f"2024-{month:02d}-03"],
+                            optional_dates=[f"2024-{month:02d}-04"])
+            for i in range(7) for month in (1, 2)
+        ])
+        totals_before = await server.store.submissions.yearly_totals(2024)
+
+        moved = await server.archive_month(db, 2024, 1)
+        state = {
+            "moved": moved,
+            "live": await db.leave_submissions.count_documents({"month": 1}),
+            "archived": await db.leave_submissions_archive.count_documents({"month": 1}),
+            "registry": await db.archived_months.find_one({"year": 2024, "month": 1}, {"_id": 0}),
+            "totals_equal": await server.store.submissions.yearly_totals(2024) == totals_before,
+            "january_sources": len(await server.store.submissions.collections(2024, 1)),
+            "other_year_sources": len(await server.store.submissions.collections(2023)),
+        }
+        cursor, first_batch = await server.open_export_cursor({"year": 2024, "month": 1}, 1, 2024)
+        state["exportable"] = len(first_batch)
+        await cursor.close()
+
+        state["restored"] = await server.restore_month(db, 2024, 1)
+        state["live_after_restore"] = await db.leave_submissions.count_documents({"month": 1})
+        return state
+
+    state = asyncio.run(scenario())
+
+    assert state["moved"] == state["archived"] == 7
+    assert state["live"] == 0
+    assert state["registry"]["status"] == "archived"
+    assert state["registry"]["submissions"] == 7
+    assert state["totals_equal"]
+    assert (state["january_sources"], state["other_year_sources"]) == (2, 1)
+    assert state["exportable"] == 7
+    assert state["restored"] == state["live_after_restore"] == 7
+
+
+def test_submission_lists_include_archived_months_when_asked(backend_db, make_user, make_submission, monkeypatch):
+    monkeypatch.setattr(server, "ARCHIVE_BATCH_PAUSE_SECONDS", 0)
+    employee = make_user(1)
+
+    async def scenario():
+        db = backend_db
+        await server.ensure_archive_collection(db)
+        await server.ensure_indexes(db)
+        await db.leave_submissions.insert_many([make_submission(employee, month, 2024) for month in (1, 2, 3)])
+        await server.archive_month(db, 2024, 2)
+
+        mine = {"user_id": employee["id"]}
+        live = await server.fetch_submission_page(mine, 10, None, None)
+        first = await server.fetch_submission_page(mine, 2, None, None, include_archived=True)
+        rest = await server.fetch_submission_page(mine, 2, first["next_cursor"], None, include_archived=True)
+        february = await server.fetch_submission_page({"year": 2024, "month": 2}, 10, None, "id", include_archived=True)
+        return live, first, rest, february
+
+    live, first, rest, february = asyncio.run(scenario())
+
+    assert [submission["month"] for submission in live["submissions"]] == [3, 1]
+    # Pages run across the live and archive collections in one order
+    assert [submission["month"] for submission in first["submissions"] + rest["submissions"]] == [3, 2, 1]
+    assert rest["next_cursor"] is None
+    assert [submission["id"] for submission in february["submissions"]] == ["user-1-2024-2"]
+
+
+def test_exports_merge_live_and_archived_rows_in_one_order(backend_db, make_user, make_submission, monkeypatch):
+    monkeypatch.setattr(server, "EXPORT_BATCH_SIZE", 2)
+    users = [make_user(i) for i in range(4)]
+
+    def stored(user, month):
+        return make_submission(user, month, 2024, _id=ObjectId(f"{month:012x}{int(user['id'][5:]):012x}"))
+
+    async def scenario():
+        db = backend_db
+        await server.ensure_archive_collection(db)
+        # January half moved: archiving was interrupted
+        await db.archived_months.insert_one({"year": 2024, "month": 1, "status": "archiving"})
+        await db.leave_submissions.insert_many(
+            [stored(user, 2) for user in users] + [stored(user, 1) for user in users[::2]]
+        )
+        await db.leave_submissions_archive.insert_many([stored(user, 1) for user in users[1::2]])
+
+        cursor, batch = await server.open_export_cursor({"year": 2024}, None, 2024)
+        rows = []
+        while batch:
+            rows += batch
+            batch = await cursor.to_list(length=2)
+        await cursor.close()
+        return rows
+
+    rows = asyncio.run(scenario())
+
+    assert [(row["month"], row["user_id"]) for row in rows] == [
+        (2, "user-3"), (2, "user-2"), (2, "user-1"), (2, "user-0"),
+        (1, "user-3"), (1, "user-2"), (1, "user-1"), (1, "user-0"),
+    ]
+    assert all("_id" not in row for row in rows)
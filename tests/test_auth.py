@@ -0,0 +1,92 @@
+import time
+
+import pytest
+
+from auth import InvalidToken, UserCache, hash_password, is_password_hash, sign_token, verify_password, verify_token
+
+SECRET = "test-secret"
+
+
+def test_token_round_trip():
+    token = sign_token({"id": "user-1", "role": "hr"}, SECRET, 60)
+    claims = verify_token(token, SECRET)
+    assert claims["id"] == "user-1"
+    assert claims["role"] == "hr"
+
+
+@pytest.mark.parametrize("token", [
+    "",
+    "not-a-token",
+    '{"id": "user-1", "role": "hr"}',
+    sign_token({"id": "user-1"}, "other-secret", 60),
+    sign_token({"id": "user-1"}, SECRET, -1),
+])
+def test_invalid_tokens_are_rejected(token):
+    with pytest.raises(InvalidToken):
+        verify_token(token, SECRET)
+
+
+def test_tampered_payload_is_rejected():
+    payload, signature = sign_token({"id": "user-1", "role": "employee"}, SECRET, 60).split(".")
+    forged = sign_token({"id": "user-1", "role": "hr"}, SECRET, 60).split(".")[0]
+    with pytest.raises(InvalidToken):
+        verify_token(f"{forged}.{signature}", SECRET)
+
+
+def test_password_hash_round_trip():
+    stored = hash_password("Tejas#2377")
+    assert is_password_hash(stored)
+    assert "Tejas#2377" not in stored
+    assert verify_password(stored, "Tejas#2377") == (True, False)
+    assert verify_password(stored, "wrong") == (False, False)
+
+
+def test_legacy_plaintext_passwords_verify_and_ask_for_rehash():
+    assert verify_password("password123", "password123") == (True, True)
+    assert verify_password("password123", "password124")[0] is False
+
+
+def test_unknown_user_never_matches():
+    assert verify_password(None, "anything") == (False, False)
+
+
+def test_user_cache_evicts_least_recently_used():
+    cache = UserCache(max_size=2, ttl_seconds=60)
+    cache.put({"id": "a"})
+    cache.put({"id": "b"})
+    cache.get("a")
+    cache.put({"id": "c"})
+    assert cache.get("b") is None
+    assert cache.get("a") == {"id": "a"}
+    assert len(cache) == 2
+
+
+def test_user_cache_expires_entries():
+    cache = UserCache(ttl_seconds=0.01)
+    cache.put({"id": "a"})
+    time.sleep(0.02)
+    assert cache.get("a") is None
+
+
+def test_user_cache_invalidate_by_employee_id():
+    cache = UserCache()
+    cache.put({"id": "a", "employee_id": "EMP1"})
+    cache.put({"id": "b", "employee_id": "EMP2"})
+    cache.invalidate_employee("EMP1")
+    assert cache.get("a") is None
+    assert cache.get("b") is not None
+
+
+def test_user_cache_employee_index_follows_evictions_and_updates():
+    cache = UserCache(max_size=2)
+    cache.put({"id": "a", "employee_id": "EMP1"})
+    cache.put({"id": "a", "employee_id": "EMP9"})
+    cache.put({"id": "b", "employee_id": "EMP2"})
+    cache.put({"id": "c", "employee_id": "EMP3"})  # Evicts a
+    cache.invalidate_employee("EMP1")
+    cache.invalidate_employee("EMP9")
+    assert cache.get("b") is not None
+    cache.invalidate_employee("EMP2")
+    assert cache.get("b") is None
+    assert cache.get("c") is not None
+    assert cache._employee_ids == {"EMP3": "c"}
@@ -0,0 +1,48 @@
+import pytest
+
+from caching import SUBMISSIONS, USERS, DataVersions, ResponseCache, etag_matches
+
+
+def test_etag_changes_only_with_its_own_scopes():
+    versions = DataVersions()
+    etag = versions.etag([SUBMISSIONS], "/api/all-submissions", "month=2&year=2025", "hr")
+
+    versions.bump(USERS)
+    assert versions.etag([SUBMISSIONS], "/api/all-submissions", "month=2&year=2025", "hr") == etag
+
+    versions.bump(SUBMISSIONS)
+    assert versions.etag([SUBMISSIONS], "/api/all-submissions", "month=2&year=2025", "hr") != etag
+
+
+def test_etag_depends_on_request_and_viewer():
+    versions = DataVersions()
+    base = versions.etag([SUBMISSIONS], "/api/my-submissions", "", "user-1")
+    assert versions.etag([SUBMISSIONS], "/api/my-submissions", "", "user-2") != base
+    assert versions.etag([SUBMISSIONS], "/api/my-submissions", "year=2025", "user-1") != base
+
+
+def test_etags_from_another_process_never_match():
+    assert DataVersions().etag([SUBMISSIONS]) != DataVersions().etag([SUBMISSIONS])
+
+
+@pytest.mark.parametrize("header, matches", [
+    (None, False),
+    ('"abc"', True),
+    ('W/"abc"', True),
+    ('"xyz", "abc"', True),
+    ("*", True),
+    ('"xyz"', False),
+])
+def test_etag_matches(header, matches):
+    assert etag_matches(header, '"abc"') is matches
+
+
+def test_response_cache_is_bounded():
+    cache = ResponseCache(max_size=2)
+    cache.put('"a"', {"n": 1})
+    cache.put('"b"', {"n": 2})
+    cache.get('"a"')
+    cache.put('"c"', {"n": 3})
+    assert cache.get('"b"') is None
+    assert cache.get('"a"') == {"n": 1}
+    assert len(cache) == 2
@@ -0,0 +1,27 @@
+from daymask import dates_to_mask, day_bit, submission_masks
+
+
+def test_dates_to_mask_sets_one_bit_per_day_in_the_month():
+    mask = dates_to_mask(["2025-02-01", "2025-02-14", "2025-02-28", "2025-02-14"], 2025, 2)
+    assert mask == day_bit(1) | day_bit(14) | day_bit(28)
+
+
+def test_dates_outside_the_month_or_malformed_are_ignored():
+    assert dates_to_mask(["2025-03-01", "2024-02-10", "2025-02-xx", ""], 2025, 2) == 0
+
+
+def test_day_31_fits_in_31_bits():
+    assert dates_to_mask(["2025-01-31"], 2025, 1) == 1 << 30
+
+
+def test_submission_masks_and_overlap():
+    masks = submission_masks({
+        "year": 2025,
+        "month": 2,
+        "monthly_leave_dates": ["2025-02-03", "2025-02-04"],
+        "optional_leave_dates": ["2025-02-14"],
+        "wfh_dates": ["2025-02-04", "2025-02-10"],
+    })
+    assert masks["total_days_off_mask"] == 0
+    assert masks["monthly_leave_mask"] & masks["wfh_mask"] == day_bit(4)
+    assert masks["monthly_leave_mask"] & masks["optional_leave_mask"] == 0
@@ -0,0 +1,68 @@
+import asyncio
+
+import orjson
+
+import server
+from events import EventBus, event_stream
+
+
+def parse_event(chunk):
+    fields = dict(line.split(": ", 1) for line in chunk.decode().strip().split("\n"))
+    return fields["event"], orjson.loads(fields["data"])
+
+
+def test_stream_sends_published_events_and_heartbeats():
+    async def scenario():
+        bus = EventBus()
+        stream = event_stream(bus, heartbeat_seconds=0.01)
+        chunks = [await stream.__anext__()]
+        bus.publish("submission", {"action": "created"})
+        chunks.append(await stream.__anext__())
+        chunks.append(await stream.__anext__())
+        subscribed = len(bus)
+        await stream.aclose()
+        return chunks, subscribed, len(bus)
+
+    chunks, subscribed, remaining = asyncio.run(scenario())
+
+    assert chunks[0].startswith(b"retry: ")
+    assert parse_event(chunks[1]) == ("submission", {"action": "created"})
+    assert chunks[2] == b": keepalive\n\n"
+    assert (subscribed, remaining) == (1, 0)
+
+
+def test_slow_subscribers_are_dropped():
+    async def scenario():
+        bus = EventBus(max_queue=2)
+        queue = bus.subscribe()
+        for i in range(3):
+            bus.publish("submission", {"i": i})
+        return len(bus), [queue.get_nowait() for _ in range(queue.qsize())]
+
+    subscribers, queued = asyncio.run(scenario())
+
+    assert subscribers == 0
+    assert queued[-1] is None
+
+
+def test_submit_leave_publishes_the_submission_and_month_totals(memory_db, make_user):
+    async def scenario():
+        await server.ensure_indexes(memory_db)
+        queue = server.event_bus.subscribe()
+        try:
+            await server.submit_leave(server.LeaveSubmissionRequest(
+                month=2, year=2025, monthly_leave_dates=["2025-02-03"], optional_leave_dates=[],
+                wfh_dates=["2025-02-04"], additional_hours="", pending_leaves=0, total_days_off_dates=[]
+            ), current_user=make_user(1, "Sales"))
+            return queue.get_nowait()
+        finally:
+            server.event_bus.unsubscribe(queue)
+
+    _, event_type, data = asyncio.run(scenario())
+
+    assert event_type == "submission"
+    assert data["action"] == "created"
+    assert data["submission"]["employee_id"] == "EMP0001"
+    assert "wfh_mask" not in data["submission"]
+    assert data["totals"] == {"year": 2025, "month": 2, "employees_submitted": 1,
+                              "total_leave_days": 1, "total_wfh_days": 1}
@@ -0,0 +1,95 @@
+import asyncio
+import csv
+import io
+import os
+from datetime import datetime, timedelta
+
+import server
+
+HR_USER = {"id": "hr-1", "role": "hr"}
+
+
+def test_export_job_view_reports_progress_and_hides_internals():
+    job = {"_id": "x", "id": "job-1", "status": "done", "created_by": "hr-1", "heartbeat_at": None,
+           "total": 8, "processed": 2, "format": "csv"}
+
+    view = server.export_job_view(job)
+
+    assert view["progress"] == 0.25
+    assert view["download_url"] == "/api/export-jobs/job-1/download"
+    assert not {"_id", "created_by", "heartbeat_at"} & set(view)
+
+
+def test_export_job_runs_to_a_downloadable_file(backend_db, make_user, make_submission, monkeypatch, tmp_path):
+    monkeypatch.setattr(server, "EXPORT_JOB_DIR", str(tmp_path))
+    monkeypatch.setattr(server, "EXPORT_BATCH_SIZE", 3)
+
+    async def scenario():
+        db = backend_db
+        await server.ensure_indexes(db)
+        await db.leave_submissions.insert_many([
+            make_submission(make_user(i, "Sales" if i % 2 else "Engineering"), leave_dates=["2025-02-03"])
+            for i in range(10)
+        ])
+
+        created = await server.create_export_job(
+            server.ExportJobRequest(format="csv", month=2, year=2025, department="Sales"), current_user=HR_USER
+        )
+        job = await server.claim_export_job()
+        assert await server.claim_export_job() is None
+        await server.run_export_job(job)
+
+        status = await server.get_export_job(created["id"], current_user=HR_USER)
+        response = await server.download_export_job(created["id"], current_user=HR_USER)
+        return status, response
+
+    status, response = asyncio.run(scenario())
+
+    assert status["status"] == "done"
+    assert status["total"] == status["processed"] == 5
+    assert status["progress"] == 1
+    with open(response.path, newline="") as f:
+        rows = list(csv.DictReader(io.StringIO(f.read())))
+    assert len(rows) == 5
+
+
+def test_expired_jobs_lose_their_files(backend_db, monkeypatch, tmp_path):
+    monkeypatch.setattr(server, "EXPORT_JOB_DIR", str(tmp_path))
+
+    async def scenario():
+        db = backend_db
+        job = {"id": "old", "format": "csv", "status": "done", "expires_at": datetime.utcnow() - timedelta(seconds=1)}
+        await db.export_jobs.insert_one(job)
+        open(server.export_job_path(job), "w").close()
+
+        expired = await server.expire_export_jobs()
+        remaining = await db.export_jobs.count_documents({})
+        return expired, remaining, server.export_job_path(job)
+
+    expired, remaining, path = asyncio.run(scenario())
+
+    assert (expired, remaining) == (1, 0)
+    assert not os.path.exists(path)
+
+
+def test_a_job_taken_over_by_another_worker_keeps_its_result(
+    memory_db, make_user, make_submission, monkeypatch, tmp_path
+):
+    monkeypatch.setattr(server, "EXPORT_JOB_DIR", str(tmp_path))
+
+    async def scenario():
+        db = memory_db
+        await db.leave_submissions.insert_many([make_submission(make_user(i)) for i in range(3)])
+        created = await server.create_export_job(
+            server.ExportJobRequest(format="csv", month=2, year=2025), current_user=HR_USER
+        )
+        job = await server.claim_export_job()
+        # The heartbeat went stale and a second worker claimed the job meanwhile
+        await db.export_jobs.update_one({"id": job["id"]}, {"$set": {"claim": "other-worker"}})
+        await server.run_export_job(job)
+        return await server.get_export_job(created["id"], current_user=HR_USER)
+
+    status = asyncio.run(scenario())
+
+    assert status["status"] == "running"
+    assert os.listdir(tmp_path) == []
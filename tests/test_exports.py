@@ -0,0 +1,94 @@
+import csv
+import io
+import json
+from datetime import date
+
+import pytest
+from openpyxl import load_workbook
+
+import exports
+from exports import EXPORT_HEADERS, CsvExportWriter, NdjsonExportWriter, XlsxExportWriter
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+requires_pyarrow = pytest.mark.skipif(pa is None, reason="pyarrow is not installed")
+
+
+def _render(writer, batches):
+    output = b"".join(writer.write_rows(batch) for batch in batches)
+    writer.close()
+    while True:
+        chunk = writer.read_chunk()
+        if not chunk:
+            break
+        output += chunk
+    writer.discard()
+    return output
+
+
+@pytest.fixture
+def batches(make_user, make_submission):
+    submissions = [
+        make_submission(make_user(i), leave_dates=["2025-02-03", "2025-02-04"], wfh_dates=["2025-02-10"],
+                        days_off_dates=["2025-02-03", "2025-02-04"], pending_leaves=3)
+        for i in range(5)
+    ]
+    return [submissions[:3], submissions[3:]]
+
+
+def test_csv_writer_streams_every_batch(batches):
+    writer = CsvExportWriter()
+    first = writer.write_rows(batches[0])
+    assert first.startswith(",".join(EXPORT_HEADERS).encode())
+
+    rows = list(csv.reader(io.StringIO((first + _render(writer, batches[1:])).decode())))
+    assert rows[0] == EXPORT_HEADERS
+    assert len(rows) == 6
+    assert rows[1][4] == "2025-02-03, 2025-02-04"
+
+
+def test_ndjson_writer_emits_raw_documents(batches):
+    lines = _render(NdjsonExportWriter(), batches).decode().splitlines()
+    assert [json.loads(line)["id"] for line in lines] == [f"user-{i}-2025-2" for i in range(5)]
+
+
+def test_xlsx_writer_produces_readable_workbook(batches):
+    workbook = load_workbook(io.BytesIO(_render(XlsxExportWriter(), batches)), read_only=True)
+    rows = list(workbook["Leave Submissions"].iter_rows(values_only=True))
+    assert list(rows[0]) == EXPORT_HEADERS
+    assert len(rows) == 6
+    assert rows[5][1] == "EMP0004"
+
+
+@requires_pyarrow
+def test_parquet_writer_keeps_dates_and_counts(batches):
+    table = pq.read_table(io.BytesIO(_render(exports.ParquetExportWriter(), batches)))
+    assert table.num_rows == 5
+    assert table.schema.field("monthly_leave_dates").type == pa.list_(pa.date32())
+
+    row = table.slice(0, 1).to_pylist()[0]
+    assert row["monthly_leave_dates"] == [date(2025, 2, 3), date(2025, 2, 4)]
+    assert (row["monthly_leave_days"], row["wfh_days"], row["leave_days"]) == (2, 1, 4)
+
+
+@requires_pyarrow
+def test_parquet_writer_flushes_full_row_groups(batches, monkeypatch):
+    monkeypatch.setattr(exports, "PARQUET_ROW_GROUP_SIZE", 3)
+    writer = exports.ParquetExportWriter()
+
+    assert writer.write_rows(batches[0])  # A full row group is sent straight away
+    parquet = pq.ParquetFile(io.BytesIO(_render(writer, batches[1:])))
+    assert [parquet.metadata.row_group(i).num_rows for i in range(parquet.metadata.num_row_groups)] == [3, 2]
+
+
+@requires_pyarrow
+def test_arrow_stream_writer_emits_a_batch_per_write(batches):
+    writer = exports.ArrowStreamExportWriter()
+    first = writer.write_rows(batches[0])
+    reader = pa.ipc.open_stream(first + _render(writer, batches[1:]))
+
+    assert [batch.num_rows for batch in reader] == [3, 2]
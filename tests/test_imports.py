@@ -0,0 +1,153 @@
+import asyncio
+import io
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException, UploadFile
+from openpyxl import Workbook
+
+import server
+from auth import hash_password
+from imports import ImportFileError, parse_employee_file, validate_employee_rows
+
+CSV = (
+    "Name,Username,Employee ID,Password,Department\n"
+    "Asha Rao,asha,EMP0001,secret1,Engineering\n"
+    ",,,,\n"
+    "Ravi Kumar,ravi,EMP0002,secret2,\n"
+    "Asha Duplicate,asha,EMP0003,secret3,Sales\n"
+    "No Password,nopass,EMP0004,,Sales\n"
+    "Ravi Again,ravi2,EMP0002,secret5,Sales\n"
+).encode()
+
+HR = {"id": "hr-1", "role": "hr"}
+
+
+def _upload():
+    return UploadFile(io.BytesIO(CSV), filename="staff.csv")
+
+
+def test_parse_csv_normalises_headers_and_skips_blank_rows():
+    rows = parse_employee_file("staff.csv", CSV)
+    assert [row_number for row_number, _ in rows] == [2, 4, 5, 6, 7]
+    assert rows[0][1] == {
+        "name": "Asha Rao",
+        "username": "asha",
+        "employee_id": "EMP0001",
+        "password": "secret1",
+        "department": "Engineering",
+    }
+
+
+def test_parse_xlsx():
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.append(["name", "username", "employee_id", "password"])
+    sheet.append(["Asha Rao", "asha", 1001, "secret1"])
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+
+    rows = parse_employee_file("staff.xlsx", buffer.getvalue())
+    assert rows == [(2, {"name": "Asha Rao", "username": "asha", "employee_id": "1001", "password": "secret1"})]
+
+
+@pytest.mark.parametrize("filename, content", [
+    ("staff.txt", b"name,username"),
+    ("staff.csv", b""),
+    ("staff.csv", b"name,username,password\nA,a,p\n"),
+    ("staff.xlsx", b"not a workbook"),
+])
+def test_unreadable_files_are_rejected(filename, content):
+    with pytest.raises(ImportFileError):
+        parse_employee_file(filename, content)
+
+
+def test_validation_reports_missing_fields_and_in_file_duplicates():
+    valid, errors = validate_employee_rows(parse_employee_file("staff.csv", CSV))
+    assert [row_number for row_number, _ in valid] == [2, 4]
+    assert errors == [
+        {"row": 5, "error": "Duplicate username in file (row 2)"},
+        {"row": 6, "error": "Missing password"},
+        {"row": 7, "error": "Duplicate employee ID in file (row 4)"},
+    ]
+
+
+def test_logins_do_not_wait_behind_an_import(memory_db, monkeypatch):
+    release = threading.Event()
+    import_pool = ThreadPoolExecutor(max_workers=1)
+    import_pool.submit(release.wait)  # Every import hash queues behind this
+    monkeypatch.setattr(server, "import_password_pool", import_pool)
+
+    async def scenario():
+        await server.import_employees(_upload(), current_user=HR)
+        try:
+            login_hash = await asyncio.wait_for(server.run_password_task(hash_password, "secret"), timeout=5)
+        finally:
+            release.set()
+        await asyncio.gather(*server.import_job_tasks)
+        return login_hash, await memory_db.import_jobs.find_one({}, {"_id": 0})
+
+    login_hash, job = asyncio.run(scenario())
+    import_pool.shutdown()
+
+    assert login_hash.startswith("$argon2")
+    assert job["created"] == 2
+
+
+def test_import_runs_as_a_job_in_batches(memory_db, monkeypatch):
+    monkeypatch.setattr(server, "IMPORT_BATCH_SIZE", 1)
+
+    async def scenario():
+        dry_run = await server.import_employees(_upload(), dry_run=True, current_user=HR)
+        response = await server.import_employees(_upload(), current_user=HR)
+        started = json.loads(response.body)
+        await asyncio.gather(*server.import_job_tasks)
+        finished = await server.get_import_job(started["id"], current_user=HR)
+        with pytest.raises(HTTPException) as other_user:
+            await server.get_import_job(started["id"], current_user={**HR, "id": "hr-2"})
+        users = await memory_db.users.find({}, {"_id": 0, "username": 1, "password": 1}).to_list(None)
+        return dry_run, response, started, finished, other_user.value, users
+
+    dry_run, response, started, finished, other_user, users = asyncio.run(scenario())
+
+    assert dry_run["created"] == 2 and dry_run["dry_run"]
+    assert response.status_code == 202
+    assert response.headers["Location"] == f"/api/hr/import-jobs/{started['id']}"
+    assert started["status"] == "running" and started["processed"] == 0
+    assert finished["status"] == "done"
+    assert (finished["total_rows"], finished["total"], finished["processed"], finished["created"]) == (5, 2, 2, 2)
+    assert finished["progress"] == 1.0
+    assert [error["row"] for error in finished["errors"]] == [5, 6, 7]
+    assert other_user.status_code == 404
+    assert sorted(user["username"] for user in users) == ["asha", "ravi"]
+    assert all(user["password"].startswith("$argon2") for user in users)
+
+
+def test_import_job_whose_heartbeat_stopped_is_reported_interrupted(memory_db):
+    stale = datetime.utcnow() - timedelta(seconds=server.EXPORT_JOB_STALE_SECONDS + 1)
+
+    async def scenario():
+        await memory_db.import_jobs.insert_one({
+            "id": "job-1", "status": "running", "created_by": HR["id"], "created_at": stale, "heartbeat_at": stale,
+            "total_rows": 10, "total": 10, "processed": 4, "created": 4, "errors": [],
+        })
+        return await server.get_import_job("job-1", current_user=HR)
+
+    job = asyncio.run(scenario())
+
+    assert job["status"] == "failed"
+    assert "interrupted" in job["error"]
+    assert job["progress"] == 0.4
+
+
+def test_import_files_over_the_row_cap_are_rejected(memory_db, monkeypatch):
+    monkeypatch.setattr(server, "MAX_IMPORT_ROWS", 4)
+
+    with pytest.raises(HTTPException) as rejected:
+        asyncio.run(server.import_employees(_upload(), current_user=HR))
+
+    assert rejected.value.status_code == 400
+    assert asyncio.run(memory_db.import_jobs.count_documents({})) == 0
@@ -0,0 +1,205 @@
+import asyncio
+import copy
+
+import motor.motor_asyncio
+import pytest
+from fastapi import HTTPException
+from pymongo import monitoring
+
+import server
+from auth import UserCache
+
+
+def _stages(plan):
+    """Yield every stage name in an explain() plan tree."""
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            yield plan["stage"]
+        for value in plan.values():
+            yield from _stages(value)
+    elif isinstance(plan, list):
+        for item in plan:
+            yield from _stages(item)
+
+
+async def _seed(db, make_user, make_submission):
+    users = [make_user(i) for i in range(20)]
+    await db.users.insert_many(users)
+    await db.leave_submissions.insert_many([make_submission(user, month) for user in users for month in range(1, 13)])
+    return users[0]
+
+
+class _CommandRecorder(monitoring.CommandListener):
+    """Keeps every query command the client sends while recording is on."""
+
+    QUERY_COMMANDS = {"find", "aggregate", "count", "distinct", "update", "delete", "findAndModify"}
+
+    def __init__(self):
+        self.recording = False
+        self.commands = []
+
+    def started(self, event):
+        if self.recording and event.command_name in self.QUERY_COMMANDS:
+            self.commands.append(copy.deepcopy(dict(event.command)))
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+# Added by the driver; explain takes the bare command
+_SESSION_FIELDS = {"lsid", "$db", "$clusterTime", "$readPreference", "txnNumber", "readConcern", "writeConcern"}
+
+
+def _explainable(command):
+    """Split a recorded command into single statements worth explaining; unfiltered reads are skipped."""
+    command = {key: value for key, value in command.items() if key not in _SESSION_FIELDS}
+    name = next(iter(command))
+    if name in ("update", "delete"):
+        statements = command.pop(f"{name}s")
+        for statement in statements:
+            if statement["q"]:
+                yield {**command, f"{name}s": [statement]}
+    elif name == "aggregate":
+        pipeline = command["pipeline"]
+        if pipeline and pipeline[0].get("$match"):
+            yield command
+    elif command.get("filter") or command.get("query") or command.get("sort"):
+        yield command
+
+
+def _winning_stages(explain):
+    """Stage names in every winning plan of an explain() result, aggregations included."""
+    if isinstance(explain, dict):
+        for key, value in explain.items():
+            if key == "winningPlan":
+                yield from _stages(value)
+            else:
+                yield from _winning_stages(value)
+    elif isinstance(explain, list):
+        for item in explain:
+            yield from _winning_stages(item)
+
+
+def _uses_index(stages):
+    return bool({"IXSCAN", "IDHACK", "COUNT_SCAN", "DISTINCT_SCAN"} & stages) or any(
+        stage.startswith("EXPRESS_") for stage in stages
+    )
+
+
+async def _issue_route_queries(user, other):
+    """Drive the repository methods and route handlers the API serves from."""
+    hr = {"id": "hr-1", "role": "hr"}
+    await server.store.users.get_active_by_username(user["username"])  # login
+    await server.store.users.get(user["id"])  # get_current_user
+    await server.store.users.get_by_username(user["username"])  # create_employee
+    await server.store.users.get_by_employee_id(user["employee_id"])
+    await server.submit_leave(server.LeaveSubmissionRequest(
+        month=3, year=2025, monthly_leave_dates=["2025-03-03"], optional_leave_dates=[], wfh_dates=[],
+        additional_hours="", pending_leaves=0, total_days_off_dates=[],
+    ), current_user=user)
+    await server.fetch_submission_page({"user_id": user["id"]}, 10, None, None)
+    await server.fetch_submission_page({"month": 2, "year": 2025}, 10, None, None)
+    await server.get_leave_stats(user["id"], 2025, current_user=user)
+    await server.all_leave_stats(2025, "Engineering", None, True)
+    await server.get_analytics(user["id"], 2, 2025, current_user=user)
+    await server.get_day_status("2025-02-03", current_user=hr)
+    await server.hr_analytics(2, 2025, 5)
+    await server.trend_analytics((2024, 12), (2025, 3), user["id"], None)
+    await server.trend_analytics((2024, 12), (2025, 3), None, "Engineering")
+    await server.trend_analytics((2024, 12), (2025, 3), None, None)
+    await server.fetch_employee_page(None, None, None, 10, None)
+    await server.fetch_employee_page("emp", "Engineering", True, 10, None)
+    with pytest.raises(HTTPException):
+        await server.delete_submission("missing", current_user=hr)
+    await server.delete_employee(other["employee_id"], current_user=hr)
+
+
+def test_ensure_indexes_creates_then_reports_no_drift(mongo_db_name):
+    async def scenario():
+        client = motor.motor_asyncio.AsyncIOMotorClient(server.MONGO_URL)
+        db = client[mongo_db_name]
+        first = await server.ensure_indexes(db)
+        second = await server.ensure_indexes(db, apply=False)
+        client.close()
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    declared = sum(len(models) for models in server.INDEX_SPECS.values())
+    assert len(first["missing"]) == declared
+    assert first["errors"] == []
+    assert second == {"missing": [], "changed": [], "undeclared": [], "errors": []}
+
+
+def test_ensure_indexes_reports_undeclared_and_changed(mongo_db_name):
+    async def scenario():
+        client = motor.motor_asyncio.AsyncIOMotorClient(server.MONGO_URL)
+        db = client[mongo_db_name]
+        await db.users.create_index("name", name="name_adhoc")
+        await db.leave_submissions.create_index("employee_id", name="employee_id", unique=True)
+        report = await server.ensure_indexes(db)
+        info = await db.leave_submissions.index_information()
+        client.close()
+        return report, info
+
+    report, info = asyncio.run(scenario())
+    assert "users.name_adhoc" in report["undeclared"]
+    assert "leave_submissions.employee_id" in report["changed"]
+    assert not info["employee_id"].get("unique")
+
+
+def test_route_queries_use_index_scans(mongo_db_name, make_user, make_submission, monkeypatch):
+    recorder = _CommandRecorder()
+    monkeypatch.setattr(server, "user_cache", UserCache())
+    monkeypatch.setattr(server, "region_settings_cache", {})
+    monkeypatch.setattr(server, "ROLLUP_REBUILD_SETTLE_SECONDS", 0)
+
+    async def scenario():
+        client = motor.motor_asyncio.AsyncIOMotorClient(server.MONGO_URL, event_listeners=[recorder])
+        db = client[mongo_db_name]
+        monkeypatch.setattr(server, "db", db)
+        monkeypatch.setattr(server, "store", server.open_storage("mongo", db))
+        user = await _seed(db, make_user, make_submission)
+        other = await db.users.find_one({"id": "user-19"})
+        await server.ensure_indexes(db)
+        await server.rebuild_rollups(db)
+
+        recorder.recording = True
+        await _issue_route_queries(user, other)
+        recorder.recording = False
+
+        plans = []
+        for recorded in recorder.commands:
+            for command in _explainable(recorded):
+                explain = await db.command({"explain": command, "verbosity": "queryPlanner"})
+                plans.append((command, set(_winning_stages(explain))))
+        client.close()
+        return plans
+
+    plans = asyncio.run(scenario())
+
+    assert "monthly_rollups" in {command[next(iter(command))] for command, _ in plans}
+    for command, stages in plans:
+        assert _uses_index(stages), f"{command} is not using an index: {stages}"
+        assert "COLLSCAN" not in stages, f"{command} scans the collection: {stages}"
+
+
+def test_changed_indexes_are_swapped_without_a_gap_or_kept_when_the_rebuild_would_fail(memory_db):
+    async def scenario():
+        db = memory_db
+        await db.users.create_index("employee_id", name="employee_id_unique")
+        await db.users.insert_many([{"id": "a", "employee_id": "EMP1"}, {"id": "b", "employee_id": "EMP1"}])
+        await db.leave_submissions.create_index("user_id", name="employee_id")
+        report = await server.ensure_indexes(db)
+        return report, await db.users.index_information(), await db.leave_submissions.index_information()
+
+    report, users, submissions = asyncio.run(scenario())
+
+    assert {"users.employee_id_unique", "leave_submissions.employee_id"} <= set(report["changed"])
+    assert "users.employee_id_unique" in [error["index"] for error in report["errors"]]
+    # The blocked unique rebuild left the old index serving
+    assert list(users["employee_id_unique"]["key"]) == [("employee_id", 1)]
+    assert list(submissions["employee_id"]["key"]) == [("employee_id", 1)]
+    assert "employee_id_rebuild" not in submissions
@@ -0,0 +1,137 @@
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from prometheus_client import REGISTRY
+
+import server
+from metrics import UNMATCHED_ROUTE, CommandMetrics, PoolMetrics, PrometheusMiddleware
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def make_app():
+    app = FastAPI()
+    app.add_middleware(PrometheusMiddleware)
+
+    @app.get("/items/{item_id}")
+    async def get_item(item_id: str):
+        return {"id": item_id}
+
+    @app.get("/stream")
+    async def stream():
+        async def body():
+            yield b"a"
+            yield b"b"
+        return StreamingResponse(body())
+
+    return app
+
+
+def get(app, *paths, headers=None):
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return [await client.get(path, headers=headers) for path in paths]
+
+    return asyncio.run(run())
+
+
+def test_requests_are_labelled_by_route_template():
+    labels = dict(method="GET", route="/items/{item_id}", status="200")
+    before = sample("http_request_duration_seconds_count", **labels)
+
+    get(make_app(), "/items/a", "/items/b")
+
+    assert sample("http_request_duration_seconds_count", **labels) == before + 2
+    assert sample("http_requests_in_progress", method="GET", route="/items/{item_id}") == 0
+
+
+def test_unknown_paths_share_one_label():
+    labels = dict(method="GET", route=UNMATCHED_ROUTE, status="404")
+    before = sample("http_request_duration_seconds_count", **labels)
+
+    get(make_app(), "/nope/1", "/nope/2")
+
+    assert sample("http_request_duration_seconds_count", **labels) == before + 2
+
+
+def test_streamed_responses_are_timed():
+    labels = dict(method="GET", route="/stream", status="200")
+    before = sample("http_request_duration_seconds_count", **labels)
+
+    response, = get(make_app(), "/stream")
+
+    assert response.content == b"ab"
+    assert sample("http_request_duration_seconds_count", **labels) == before + 1
+
+
+def command_event(command_name, command=None, request_id=1, duration_micros=2500):
+    return SimpleNamespace(
+        command_name=command_name,
+        command=command or {},
+        request_id=request_id,
+        connection_id=("localhost", 27017),
+        duration_micros=duration_micros,
+    )
+
+
+def test_command_durations_by_collection():
+    listener = CommandMetrics()
+    labels = dict(command="find", collection="leave_submissions", outcome="success")
+    before = sample("mongodb_command_duration_seconds_sum", **labels)
+
+    listener.started(command_event("find", {"find": "leave_submissions", "filter": {}}))
+    listener.succeeded(command_event("find"))
+
+    assert sample("mongodb_command_duration_seconds_sum", **labels) == before + 0.0025
+
+
+def test_get_more_uses_the_collection_field():
+    listener = CommandMetrics()
+    labels = dict(command="getMore", collection="leave_submissions", outcome="failure")
+    before = sample("mongodb_command_duration_seconds_count", **labels)
+
+    listener.started(command_event("getMore", {"getMore": 42, "collection": "leave_submissions"}, request_id=7))
+    listener.failed(command_event("getMore", request_id=7))
+
+    assert sample("mongodb_command_duration_seconds_count", **labels) == before + 1
+
+
+def test_pool_checkouts():
+    listener = PoolMetrics()
+    event = SimpleNamespace(address=("db.test", 27017), reason="timeout")
+    address = "db.test:27017"
+
+    listener.pool_created(event)
+    listener.connection_created(event)
+    listener.connection_check_out_started(event)
+    listener.connection_checked_out(event)
+
+    assert sample("mongodb_pool_connections", address=address) == 1
+    assert sample("mongodb_pool_checked_out_connections", address=address) == 1
+    assert sample("mongodb_pool_checkout_wait_seconds_count", address=address) == 1
+
+    listener.connection_checked_in(event)
+    listener.connection_check_out_started(event)
+    listener.connection_check_out_failed(event)
+
+    assert sample("mongodb_pool_checked_out_connections", address=address) == 0
+    assert sample("mongodb_pool_checkout_failures_total", address=address, reason="timeout") == 1
+
+
+def test_metrics_endpoint(monkeypatch):
+    response, = get(server.app, "/api/metrics")
+    assert response.status_code == 200
+    assert "http_request_duration_seconds" in response.text
+    assert "mongodb_pool_max_size" in response.text
+
+    monkeypatch.setattr(server, "METRICS_TOKEN", "scrape-secret")
+    denied, = get(server.app, "/api/metrics")
+    allowed, = get(server.app, "/api/metrics", headers={"Authorization": "Bearer scrape-secret"})
+    assert denied.status_code == 401
+    assert allowed.status_code == 200
@@ -0,0 +1,146 @@
+import asyncio
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import httpx
+from fastapi import FastAPI
+
+import server
+from auth import UserCache, sign_token
+from metrics import current_route
+from profiling import ProfileStore, ProfilingMiddleware, SlowQueryLog
+
+
+async def authorize(token):
+    return token == "hr-token"
+
+
+def make_app(store):
+    app = FastAPI()
+    app.add_middleware(ProfilingMiddleware, store=store, authorize=authorize)
+
+    @app.get("/work")
+    async def work():
+        await asyncio.sleep(0.01)
+        return {"ok": True}
+
+    return app
+
+
+def get(app, headers):
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.get("/work", headers=headers)
+
+    return asyncio.run(run())
+
+
+def test_profiles_are_saved_for_any_worker_to_render(memory_db):
+    app = make_app(ProfileStore(memory_db.profiles, ttl_seconds=60))
+    response = get(app, {"X-Profile": "1", "Authorization": "Bearer hr-token"})
+
+    assert response.json() == {"ok": True}
+    profile_id = response.headers["X-Profile-Id"]
+
+    # A store on another worker shares only the collection
+    other_worker = ProfileStore(memory_db.profiles, ttl_seconds=60)
+    text = asyncio.run(other_worker.render(profile_id, "text"))
+    html = asyncio.run(other_worker.render(profile_id, "html"))
+    assert "work" in text
+    assert html.lstrip().lower().startswith("<!doctype html>")
+
+
+def test_ignores_unauthorized_or_unasked_requests(memory_db):
+    app = make_app(ProfileStore(memory_db.profiles, ttl_seconds=60))
+
+    assert "X-Profile-Id" not in get(app, {"X-Profile": "1", "Authorization": "Bearer employee-token"}).headers
+    assert "X-Profile-Id" not in get(app, {"Authorization": "Bearer hr-token"}).headers
+    assert asyncio.run(memory_db.profiles.count_documents({})) == 0
+
+
+def test_expired_profiles_are_not_rendered(memory_db):
+    store = ProfileStore(memory_db.profiles, ttl_seconds=60)
+    profile_id = get(make_app(store), {"X-Profile": "1", "Authorization": "Bearer hr-token"}).headers["X-Profile-Id"]
+
+    async def scenario():
+        await memory_db.profiles.update_one(
+            {"id": profile_id}, {"$set": {"created_at": datetime.utcnow() - timedelta(seconds=61)}}
+        )
+        return await store.render(profile_id)
+
+    assert asyncio.run(scenario()) is None
+
+
+def command_event(command_name, duration_ms, command=None, request_id=1):
+    return SimpleNamespace(
+        command_name=command_name,
+        command=command or {},
+        request_id=request_id,
+        connection_id=("localhost", 27017),
+        duration_micros=int(duration_ms * 1000),
+    )
+
+
+def test_slow_commands_are_logged_with_their_route():
+    log = SlowQueryLog(threshold_ms=50)
+    token = current_route.set("GET /api/hr/analytics")
+    try:
+        log.started(command_event("aggregate", 0, {"aggregate": "leave_submissions", "pipeline": [{"$match": {}}]}))
+    finally:
+        current_route.reset(token)
+    log.succeeded(command_event("aggregate", 120))
+
+    entry, = log.drain()
+    assert entry["route"] == "GET /api/hr/analytics"
+    assert entry["collection"] == "leave_submissions"
+    assert entry["duration_ms"] == 120
+    assert "$match" in entry["summary"]
+
+
+def test_fast_commands_and_written_documents_are_not_logged():
+    log = SlowQueryLog(threshold_ms=50)
+    log.started(command_event("find", 0, {"find": "users", "filter": {"id": "u1"}}))
+    log.succeeded(command_event("find", 5))
+    assert log.drain() == []
+
+    log.started(command_event("insert", 0, {"insert": "users", "documents": [{"password": "$argon2id$..."}]}, 2))
+    log.succeeded(command_event("insert", 80, request_id=2))
+
+    entry, = log.drain()
+    assert entry["route"] is None
+    assert "argon2" not in entry["summary"]
+
+
+def test_slow_queries_are_saved_for_every_worker_to_list(memory_db, make_user, monkeypatch):
+    log = SlowQueryLog(threshold_ms=50, ignored_collections=["slow_queries"])
+    monkeypatch.setattr(server, "slow_query_log", log)
+    for request_id, (collection, duration_ms) in enumerate([("leave_submissions", 120), ("users", 80)]):
+        log.started(command_event("find", 0, {"find": collection, "filter": {}}, request_id))
+        log.succeeded(command_event("find", duration_ms, request_id=request_id))
+    # Saving the log is itself a command; it must not be logged
+    log.started(command_event("insert", 0, {"insert": "slow_queries"}, 9))
+    log.succeeded(command_event("insert", 500, request_id=9))
+
+    async def scenario():
+        saved = await server.save_slow_queries(memory_db)
+        listed = await server.get_slow_queries(current_user=make_user(1, role="hr"))
+        return saved, listed
+
+    saved, listed = asyncio.run(scenario())
+
+    assert saved == 2
+    assert log.drain() == []
+    assert {query["collection"] for query in listed["queries"]} == {"users", "leave_submissions"}
+
+
+def test_profiling_follows_the_stored_role_not_the_token_claim(memory_db, make_user, monkeypatch):
+    async def scenario():
+        monkeypatch.setattr(server, "user_cache", UserCache(max_size=10, ttl_seconds=60))
+        await memory_db.users.insert_many([make_user(1), make_user(2, role="hr")])
+        # An employee holding a token that claims the hr role
+        forged = sign_token({"id": "user-1", "role": "hr"}, server.TOKEN_SECRET, 60)
+        genuine = sign_token({"id": "user-2", "role": "hr"}, server.TOKEN_SECRET, 60)
+        return await server.can_profile(forged), await server.can_profile(genuine)
+
+    assert asyncio.run(scenario()) == (False, True)
@@ -0,0 +1,81 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+import server
+from server import rollup_updates
+
+
+@pytest.fixture
+def submission(make_user, make_submission):
+    def build(department="Engineering", wfh=3):
+        # Repeated dates are each counted, as $size counts them
+        return make_submission(make_user(1, department), leave_dates=["2025-02-03"] * 2,
+                               optional_dates=["2025-02-14"], wfh_dates=["2025-02-10"] * wfh)
+    return build
+
+
+def _as_dict(updates):
+    return {
+        (op._filter["year"], op._filter["month"], op._filter["department"], op._filter["region"]): op._doc["$inc"]
+        for op in updates
+    }
+
+
+def test_new_submission_increments_its_rollup(submission):
+    updates = _as_dict(rollup_updates(added=[submission()]))
+    assert updates == {
+        (2025, 2, "Engineering", None): {"submissions": 1, "leave_days": 3, "optional_leave_days": 1, "wfh_days": 3},
+    }
+
+
+def test_resubmission_applies_only_the_difference(submission):
+    updates = _as_dict(rollup_updates(removed=[submission(wfh=3)], added=[submission(wfh=5)]))
+    assert updates == {
+        (2025, 2, "Engineering", None): {"submissions": 0, "leave_days": 0, "optional_leave_days": 0, "wfh_days": 2},
+    }
+
+
+def test_unchanged_resubmission_issues_no_writes(submission):
+    assert rollup_updates(removed=[submission()], added=[submission()]) == []
+
+
+def test_department_change_moves_counts_between_rollups(submission):
+    updates = _as_dict(rollup_updates(removed=[submission("Sales")], added=[submission("Engineering")]))
+    assert updates[(2025, 2, "Sales", None)]["submissions"] == -1
+    assert updates[(2025, 2, "Engineering", None)]["submissions"] == 1
+
+
+def test_writes_to_months_being_rebuilt_wait_for_the_rebuild(memory_db, make_user, monkeypatch):
+    monkeypatch.setattr(server, "ROLLUP_REBUILD_SETTLE_SECONDS", 0.2)
+    user = make_user(1)
+
+    def leave_request(month, day):
+        return server.LeaveSubmissionRequest(
+            month=month, year=2025, monthly_leave_dates=[f"2025-{month:02d}-{day:02d}"], optional_leave_dates=[],
+            wfh_dates=[], additional_hours="", pending_leaves=0, total_days_off_dates=[],
+        )
+
+    async def scenario():
+        await memory_db.users.insert_one(dict(user))
+        await server.submit_leave(leave_request(3, 3), current_user=user)
+
+        rebuild = asyncio.create_task(server.rebuild_rollups(memory_db, 2025, 3))
+        await asyncio.sleep(0.05)
+        with pytest.raises(HTTPException) as refused:
+            await server.submit_leave(leave_request(3, 4), current_user=user)
+        with pytest.raises(HTTPException):
+            await server.delete_month_data(3, 2025, current_user={**user, "role": "hr"})
+        # Other months stay writable
+        await server.submit_leave(leave_request(4, 1), current_user=user)
+        await rebuild
+
+        await server.submit_leave(leave_request(3, 4), current_user=user)
+        return refused.value, await memory_db.monthly_rollups.find({}, {"_id": 0}).sort("month").to_list(None)
+
+    refused, rollups = asyncio.run(scenario())
+
+    assert refused.status_code == 503
+    assert "Retry-After" in refused.headers
+    assert [(rollup["month"], rollup["submissions"], rollup["leave_days"]) for rollup in rollups] == [(3, 1, 1), (4, 1, 1)]
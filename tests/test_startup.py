@@ -0,0 +1,75 @@
+import asyncio
+
+import server
+from caching import SUBMISSIONS, USERS, SharedDataVersions
+
+
+def test_lock_is_held_until_released_or_expired(memory_db):
+    async def scenario():
+        database = memory_db
+        taken = [
+            await server.acquire_lock(database, "job", "a", 60),
+            await server.acquire_lock(database, "job", "b", 60),
+            await server.acquire_lock(database, "job", "a", 60),
+        ]
+        await server.release_lock(database, "job", "a")
+        taken.append(await server.acquire_lock(database, "job", "b", 60))
+        await server.acquire_lock(database, "other", "a", 0)
+        taken.append(await server.acquire_lock(database, "other", "b", 60))
+        return taken
+
+    assert asyncio.run(scenario()) == [True, False, True, True, True]
+
+
+def test_workers_of_one_round_run_the_startup_tasks_once(memory_db, monkeypatch):
+    runs = []
+    run_startup_tasks = server.run_startup_tasks
+
+    async def counting_startup_tasks():
+        runs.append(server.WORKER_ID)
+        await run_startup_tasks()
+
+    monkeypatch.setattr(server, "run_startup_tasks", counting_startup_tasks)
+
+    async def start_worker(worker_id, startup_round):
+        monkeypatch.setattr(server, "WORKER_ID", worker_id)
+        monkeypatch.setattr(server, "STARTUP_ROUND", startup_round)
+        await server.startup_event()
+        await server.shutdown_event()
+
+    async def scenario():
+        for worker_id in ("worker-1", "worker-2"):
+            await start_worker(worker_id, "round-1")
+        await start_worker("worker-3", "round-2")
+        return await memory_db.users.count_documents({"role": "hr"})
+
+    hr_users = asyncio.run(scenario())
+
+    assert runs == ["worker-1", "worker-3"]
+    assert hr_users == 1
+
+
+def test_shared_versions_follow_other_workers(memory_db):
+    async def scenario():
+        collection = memory_db.data_versions
+        first, second = SharedDataVersions(collection), SharedDataVersions(collection)
+        await first.new_epoch()
+        await first.sync()
+        await second.sync()
+        state = {"same_etag": first.etag([SUBMISSIONS]) == second.etag([SUBMISSIONS])}
+
+        first.bump(SUBMISSIONS)
+        state["own_bump_private"] = first.etag([SUBMISSIONS]) != second.etag([SUBMISSIONS])
+        await first.sync()
+        state["changed"] = await second.sync()
+        state["caught_up"] = first.etag([SUBMISSIONS, USERS]) == second.etag([SUBMISSIONS, USERS])
+        state["version"] = second.version(SUBMISSIONS)
+        return state
+
+    state = asyncio.run(scenario())
+
+    assert state["same_etag"]
+    assert state["own_bump_private"]
+    assert state["changed"] == {SUBMISSIONS}
+    assert state["caught_up"]
+    assert state["version"] == 1
@@ -0,0 +1,121 @@
+import asyncio
+
+import pytest
+
+import server
+from storage import create_client
+
+
+@pytest.fixture
+def store(backend_db):
+    """The repositories of each backend in turn; scenarios call ensure_indexes first."""
+    return server.store
+
+
+def _month_data(submission):
+    # What submit_leave $sets; the id is only set on insert
+    return {key: value for key, value in submission.items() if key != "id"}
+
+
+def test_users_repository_enforces_unique_usernames(store, make_user):
+    async def scenario():
+        await server.ensure_indexes(store.db)
+        await store.users.insert(make_user(1))
+        rejected = await store.users.insert_many([make_user(2), make_user(3, username="employee1")])
+        return {
+            "rejected": rejected,
+            "taken": await store.users.taken(["employee1", "nobody"], ["EMP0002"]),
+            "employees": [user["employee_id"] for user in await store.users.search_employees()],
+            "password_listed": any("password" in user for user in await store.users.search_employees()),
+            "replaced_stale": await store.users.replace_password("user-1", "old-hash", "new-hash"),
+            "replaced": await store.users.replace_password("user-1", "hash", "new-hash"),
+            "headcount": await store.users.headcount_by_department(),
+        }
+
+    state = asyncio.run(scenario())
+
+    assert state["rejected"] == [1]
+    taken_usernames, taken_employee_ids = state["taken"]
+    assert "employee1" in taken_usernames and "nobody" not in taken_usernames
+    assert "EMP0002" in taken_employee_ids
+    assert state["employees"] == ["EMP0001", "EMP0002"]
+    assert not state["password_listed"]
+    assert (state["replaced_stale"], state["replaced"]) == (False, True)
+    assert state["headcount"] == {"Engineering": 2}
+
+
+def test_employee_search_matches_prefixes_and_pages_by_employee_id(store, make_user):
+    users = [make_user(i, "Sales" if i % 2 else "Engineering") for i in range(1, 8)]
+    users[2]["name"] = "Priya Sharma"
+    users[4]["active"] = False
+
+    async def scenario():
+        await server.ensure_indexes(store.db)
+        await store.users.insert_many(users)
+        await store.users.update_employee("EMP0004", {"name": "Sharmila Rao"})
+        first = await server.fetch_employee_page(None, None, None, 3, None)
+        rest = await server.fetch_employee_page(None, None, None, 3, first["next_cursor"])
+        return {
+            "pages": [[user["employee_id"] for user in page["employees"]] for page in (first, rest)],
+            "last_cursor": (await server.fetch_employee_page(None, None, None, 3, rest["next_cursor"]))["next_cursor"],
+            "surname": await store.users.search_employees("SHAR"),
+            "employee_id": await store.users.search_employees("emp000", "Sales", active=True),
+            "username": await store.users.search_employees("employee7"),
+            "regex_chars": await store.users.search_employees("emp.*"),
+        }
+
+    state = asyncio.run(scenario())
+
+    assert state["pages"] == [["EMP0001", "EMP0002", "EMP0003"], ["EMP0004", "EMP0005", "EMP0006"]]
+    assert state["last_cursor"] is None
+    assert [user["name"] for user in state["surname"]] == ["Priya Sharma", "Sharmila Rao"]
+    assert not any("search_terms" in user or "password" in user for user in state["surname"])
+    assert [user["employee_id"] for user in state["employee_id"]] == ["EMP0001", "EMP0003", "EMP0007"]
+    assert [user["employee_id"] for user in state["username"]] == ["EMP0007"]
+    assert state["regex_chars"] == []
+
+
+def test_submissions_repository_matches_the_mongo_semantics(store, make_user, make_submission):
+    users = [make_user(i) for i in range(3)]
+
+    async def scenario():
+        await server.ensure_indexes(store.db)
+        for user in users:
+            for month in (1, 2):
+                key = {"user_id": user["id"], "year": 2025, "month": month}
+                data = _month_data(make_submission(user, month, leave_dates=[f"2025-{month:02d}-06"]))
+                await store.submissions.upsert_month(key, data, f"{user['id']}-{month}")
+        replaced = await store.submissions.upsert_month(
+            {"user_id": "user-0", "year": 2025, "month": 2},
+            _month_data(make_submission(users[0], 2, leave_dates=["2025-02-06", "2025-02-07"],
+                                        wfh_dates=["2025-02-10"])),
+            "unused"
+        )
+
+        first = await store.submissions.page({}, 4)
+        last = first[-1]
+        rest = await store.submissions.page({}, 4, (last["year"], last["month"], last["_id"]))
+        return {
+            "replaced_id": replaced["id"],
+            "pages": [[row["month"] for row in first], [row["month"] for row in rest]],
+            "total": await store.submissions.count({"year": 2025}),
+            "totals": await store.submissions.yearly_totals(2025, ["user-0"]),
+            "top": await store.submissions.top_leave_takers(2025, 2, 1),
+            "day": await store.submissions.day_status(2025, 2, 10),
+        }
+
+    state = asyncio.run(scenario())
+
+    assert state["replaced_id"] == "user-0-2"
+    assert state["pages"] == [[2, 2, 2, 1], [1, 1]]
+    assert state["total"] == 6
+    assert state["totals"]["user-0"]["total_leave_days"] == 3
+    assert state["totals"]["user-0"]["wfh_days"] == 1
+    assert [taker["user_id"] for taker in state["top"]] == ["user-0"]
+    assert [person["user_id"] for person in state["day"]["wfh"]] == ["user-0"]
+    assert state["day"]["monthly_leave"] == []
+
+
+def test_unknown_backend_is_rejected():
+    with pytest.raises(ValueError):
+        create_client("sqlite", server.MONGO_URL)
@@ -0,0 +1,54 @@
+import asyncio
+
+import server
+from server import LeaveSubmissionRequest
+
+CONCURRENT_SUBMITS = 300
+
+
+def _request(wfh_days):
+    return LeaveSubmissionRequest(
+        month=2,
+        year=2025,
+        monthly_leave_dates=["2025-02-03"],
+        optional_leave_dates=[],
+        wfh_dates=[f"2025-02-{day + 10:02d}" for day in range(wfh_days)],
+        additional_hours="",
+        pending_leaves=0,
+        total_days_off_dates=["2025-02-03"],
+    )
+
+
+def test_concurrent_submits_leave_one_document_per_user_month(backend_db, make_user):
+    employees = [make_user(i, "Engineering" if i % 2 else "Sales") for i in range(3)]
+
+    async def scenario():
+        db = backend_db
+        await server.ensure_indexes(db)
+        await db.users.insert_many([dict(employee) for employee in employees])
+
+        results = await asyncio.gather(*(
+            server.submit_leave(_request(i % 5), current_user=employees[i % len(employees)])
+            for i in range(CONCURRENT_SUBMITS)
+        ))
+
+        counts = {
+            employee["id"]: await db.leave_submissions.count_documents({"user_id": employee["id"], "month": 2, "year": 2025})
+            for employee in employees
+        }
+        rollups = await db.monthly_rollups.find({"year": 2025, "month": 2}, {"_id": 0}).to_list(length=None)
+        stored = await db.leave_submissions.find({}, {"_id": 0}).to_list(length=None)
+        return results, counts, rollups, stored
+
+    results, counts, rollups, stored = asyncio.run(scenario())
+
+    assert all(count == 1 for count in counts.values())
+    assert sum(result["created"] for result in results) == len(employees)
+    # Every response for a user refers to the same stored document
+    for employee in employees:
+        ids = {result["submission"]["id"] for result in results if result["submission"]["user_id"] == employee["id"]}
+        assert len(ids) == 1
+
+    # The $inc deltas must agree with what actually ended up stored
+    assert sum(rollup["submissions"] for rollup in rollups) == len(employees)
+    assert sum(rollup["wfh_days"] for rollup in rollups) == sum(len(sub["wfh_dates"]) for sub in stored)
@@ -0,0 +1,124 @@
+import asyncio
+from datetime import datetime
+
+from starlette.requests import Request
+
+import server
+
+
+def test_month_span_crosses_years():
+    assert server.month_span((2024, 11), (2025, 2)) == [(2024, 11), (2024, 12), (2025, 1), (2025, 2)]
+    assert server.year_month(server.month_number((2025, 1)) - 11) == (2024, 2)
+
+
+def test_trend_covers_every_month_for_users_departments_and_the_company(
+    memory_db, make_user, make_submission, monkeypatch
+):
+    monkeypatch.setattr(server, "ARCHIVE_BATCH_PAUSE_SECONDS", 0)
+    sales, engineering = make_user(1, "Sales"), make_user(2, "Engineering")
+
+    def month_of(user, year, month, leave_days, wfh_days=0):
+        return make_submission(
+            user, month, year,
+            leave_dates=[f"{year}-{month:02d}-{day + 1:02d}" for day in range(leave_days)],
+            optional_dates=[f"{year}-{month:02d}-20"],
+            wfh_dates=[f"{year}-{month:02d}-{day + 10:02d}" for day in range(wfh_days)],
+        )
+
+    async def scenario():
+        await memory_db.leave_submissions.insert_many([
+            month_of(sales, 2024, 12, leave_days=2, wfh_days=1),
+            month_of(sales, 2025, 2, leave_days=1),
+            month_of(engineering, 2025, 2, leave_days=3, wfh_days=2),
+            month_of(engineering, 2025, 4, leave_days=1),
+        ])
+        await server.rebuild_rollups(memory_db)
+        await server.archive_month(memory_db, 2024, 12)
+
+        start, end = (2024, 12), (2025, 3)
+        return (
+            await server.trend_analytics(start, end, "user-1", None),
+            await server.trend_analytics(start, end, None, "Engineering"),
+            await server.trend_analytics(start, end, None, None),
+        )
+
+    user, department, company = asyncio.run(scenario())
+
+    assert [(month["year"], month["month"]) for month in user["months"]] == [(2024, 12), (2025, 1), (2025, 2), (2025, 3)]
+    assert [month["leave_days"] for month in user["months"]] == [3, 0, 2, 0]
+    assert [month["optional_leave_days"] for month in user["months"]] == [1, 0, 1, 0]
+    assert user["months"][0]["wfh_days"] == 1
+    january = user["months"][1]
+    assert january["working_days"] == january["calendar_working_days"]
+
+    assert department["scope"] == "department"
+    assert [month["submissions"] for month in department["months"]] == [0, 0, 1, 0]
+    assert department["months"][2]["wfh_days"] == 2
+
+    assert company["scope"] == "company"
+    assert [month["submissions"] for month in company["months"]] == [1, 0, 2, 0]
+    february = company["months"][2]
+    assert february["working_days"] == 2 * february["calendar_working_days"] - february["leave_days"]
+
+
+def test_default_range_etag_changes_with_the_month(memory_db, make_user, monkeypatch):
+    hr = make_user(1, role="hr")
+    scope = {"type": "http", "method": "GET", "path": "/api/trend-analytics", "query_string": b"",
+             "headers": [], "server": ("test", 80), "scheme": "http"}
+
+    class FixedDatetime(datetime):
+        today = datetime(2025, 3, 31)
+
+        @classmethod
+        def now(cls, tz=None):
+            return cls.today
+
+    monkeypatch.setattr(server, "datetime", FixedDatetime)
+
+    async def etag():
+        response = await server.get_trend_analytics(Request(scope), current_user=hr)
+        return response.headers["etag"]
+
+    async def scenario():
+        march = await etag()
+        FixedDatetime.today = datetime(2025, 4, 1)
+        return march, await etag()
+
+    march, april = asyncio.run(scenario())
+
+    assert march != april
+
+
+def test_group_working_days_follow_each_submitters_region(memory_db, make_user, monkeypatch):
+    monkeypatch.setattr(server, "region_settings_cache", {})
+    home, gulf = make_user(1), make_user(2, region="gulf")
+
+    async def scenario():
+        await memory_db.users.insert_many([dict(home), dict(gulf)])
+        await memory_db.calendar_regions.insert_one({"region": "gulf", "weekmask": "1111001", "holidays": []})
+        for user, day in ((home, "2025-03-03"), (gulf, "2025-03-04")):
+            await server.submit_leave(server.LeaveSubmissionRequest(
+                month=3, year=2025, monthly_leave_dates=[day], optional_leave_dates=[], wfh_dates=[],
+                additional_hours="", pending_leaves=0, total_days_off_dates=[],
+            ), current_user=user)
+
+        per_employee = [
+            (await server.get_analytics(user["id"], 3, 2025, current_user=user))["working_days"]
+            for user in (home, gulf)
+        ]
+        hr = await server.hr_analytics(3, 2025, 0)
+        trend = await server.trend_analytics((2025, 3), (2025, 3), None, None)
+        incremental = await memory_db.monthly_rollups.find({}, {"_id": 0}).sort("region", 1).to_list(length=None)
+        await server.rebuild_rollups(memory_db)
+        rebuilt = await memory_db.monthly_rollups.find({}, {"_id": 0}).sort("region", 1).to_list(length=None)
+        return per_employee, hr, trend, incremental, rebuilt
+
+    per_employee, hr, trend, incremental, rebuilt = asyncio.run(scenario())
+
+    assert per_employee[0] != per_employee[1]
+    assert hr["working_days"] == sum(per_employee)
+    assert [department["working_days"] for department in hr["departments"]] == [sum(per_employee)]
+    assert trend["months"][0]["working_days"] == sum(per_employee)
+    # Submits stamp the region, so the $inc deltas and a rebuild agree
+    assert [rollup["region"] for rollup in incremental] == [None, "gulf"]
+    assert incremental == rebuilt
@@ -0,0 +1,42 @@
+import calendar
+from datetime import date
+
+import pytest
+
+from workcalendar import month_calendar, valid_weekmask
+
+
+@pytest.mark.parametrize("year, month", [(2025, 2), (2024, 2), (2025, 3), (2025, 6), (2026, 12)])
+def test_default_weekmask_matches_a_day_by_day_count(year, month):
+    days = calendar.monthrange(year, month)[1]
+    weekends = sum(1 for day in range(1, days + 1) if date(year, month, day).weekday() >= 5)
+
+    result = month_calendar(year, month)
+    assert result.days_in_month == days
+    assert result.weekend_days == weekends
+    assert result.working_days == days - weekends
+    assert result.holidays == 0
+
+
+def test_holidays_only_count_when_they_fall_on_a_working_day():
+    # 2025-03-01 is a Saturday, 2025-03-14 a Friday; 2025-04-18 is another month
+    result = month_calendar(2025, 3, holidays=["2025-03-01", "2025-03-14", "2025-04-18"])
+    assert result.holidays == 1
+    assert result.working_days == 20
+
+
+def test_custom_weekmask():
+    # Friday/Saturday weekend
+    result = month_calendar(2025, 3, weekmask="1111001")
+    assert result.weekend_days == 9
+    assert result.working_days == 22
+
+
+@pytest.mark.parametrize("weekmask, valid", [
+    ("1111100", True),
+    ("0000000", False),
+    ("111110", False),
+    ("11111a0", False),
+])
+def test_valid_weekmask(weekmask, valid):
+    assert valid_weekmask(weekmask) is valid